@@ -0,0 +1,10 @@
+"""
+Add the work-queue lease columns (claimed_by, claim_token, claim_expires_at)
+and their indexes to the leads table.
+"""
+from db import add_missing_columns, create_missing_indexes
+
+added = add_missing_columns('leads')
+print("Added columns:", ', '.join(added) if added else 'none')
+create_missing_indexes()
+print("Ensured lead indexes.")
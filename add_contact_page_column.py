@@ -0,0 +1,8 @@
+"""
+Add the contact_page column (the page a lead's contact details were found on,
+see contact_crawl.py) to the leads table.
+"""
+from db import add_missing_columns
+
+added = add_missing_columns('leads')
+print("Added columns:", ', '.join(added) if added else 'none')
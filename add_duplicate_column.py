@@ -0,0 +1,10 @@
+"""
+Add the duplicate_of column (set by resolve.py on merged duplicates) and its
+index to the leads table.
+"""
+from db import add_missing_columns, create_missing_indexes
+
+added = add_missing_columns('leads')
+print("Added columns:", ', '.join(added) if added else 'none')
+create_missing_indexes()
+print("Ensured lead indexes.")
@@ -0,0 +1,52 @@
+"""
+Add the dedup fingerprint column and lookup indexes to the leads table.
+Backfills fingerprints for existing rows in batches. When several existing
+rows share a fingerprint, only the oldest keeps it so the unique index can be built.
+"""
+from db import engine, create_missing_indexes
+from dedup import lead_fingerprint
+from sqlalchemy import text, inspect
+
+BATCH_SIZE = 5000
+
+with engine.connect() as conn:
+    columns = [col['name'] for col in inspect(conn).get_columns('leads')]
+    if 'fingerprint' not in columns:
+        conn.execute(text("ALTER TABLE leads ADD COLUMN fingerprint VARCHAR"))
+        conn.commit()
+        print("Added fingerprint column.")
+    else:
+        print("Column fingerprint already exists.")
+
+    # Backfill in id order so memory stays bounded on large tables
+    seen = set()
+    last_id = 0
+    filled = 0
+    duplicates = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, name, address, source_url, fingerprint FROM leads "
+                 "WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            fingerprint = row.fingerprint or lead_fingerprint(row.name, row.address, row.source_url)
+            if fingerprint in seen:
+                fingerprint = None
+                duplicates += 1
+            elif fingerprint:
+                seen.add(fingerprint)
+            if fingerprint != row.fingerprint:
+                updates.append({"id": row.id, "fingerprint": fingerprint})
+        if updates:
+            conn.execute(text("UPDATE leads SET fingerprint = :fingerprint WHERE id = :id"), updates)
+            conn.commit()
+            filled += len(updates)
+        last_id = rows[-1].id
+    print(f"Backfilled {filled} fingerprints ({duplicates} duplicate leads left without one).")
+
+create_missing_indexes()
+print("Ensured lead indexes.")
@@ -0,0 +1,21 @@
+"""
+Add the coordinate columns (lat, lon, geohash) and the geohash index to the
+leads table, and fill in geohashes for leads that already have coordinates.
+"""
+from sqlalchemy import select
+from db import Lead, UnitOfWork, add_missing_columns, create_missing_indexes
+import geo
+
+added = add_missing_columns('leads')
+print("Added columns:", ', '.join(added) if added else 'none')
+create_missing_indexes()
+print("Ensured lead indexes.")
+
+with UnitOfWork() as uow:
+    rows = uow.session.execute(
+        select(Lead.id, Lead.lat, Lead.lon)
+        .where(Lead.lat.isnot(None), Lead.lon.isnot(None), Lead.geohash.is_(None))
+    ).all()
+    for lead_id, lat, lon in rows:
+        uow.update(Lead, lead_id, geohash=geo.encode(lat, lon))
+print(f"Geohashed {len(rows)} leads.")
@@ -3,11 +3,11 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Tuple
 import os
-from db import Session, Lead
+from datetime import datetime
+from sqlalchemy.orm import Session
+from db import Lead, EmailCampaign
 from services.database import EmailCampaignService
 from .ai_client import ai_client
-import json
-import re
 
 class EmailGeneratorAgent:
     def __init__(self):
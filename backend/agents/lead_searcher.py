@@ -1,24 +1,59 @@
 import asyncio
-from typing import List
+from typing import List, Optional
 import os
 import yaml
-import requests
-from datetime import datetime
-from db import Session, Lead
-from services.database import LeadService
+from db import Lead
+from respcache import response_cache
+from quota import ametered
+import httpx
+from discovery import Query, fetch_osm_tiles, NOMINATIM_SEARCH_URL, BRAVE_SEARCH_URL, _get_json
+from geotiler import bbox_around
+from geo import place_point
+from ratelimit import make_bucket, RateLimitedClient
 
 with open('../config.yaml') as f:
     config = yaml.safe_load(f)
 
 BRAVE_API_KEY = os.getenv('BRAVE_API_KEY')
+SEARCH_CONFIG = config.get('lead_search', {})
+# Seconds per HTTP request, and per call (a tiled search makes many requests)
+REQUEST_TIMEOUT = config['places']['osm'].get('timeout', 10)
+CALL_TIMEOUTS = {'geocode': 30, 'osm': 300, 'brave': 30}
+CALL_TIMEOUTS.update(SEARCH_CONFIG.get('timeouts', {}))
+MAX_CONNECTIONS = SEARCH_CONFIG.get('max_connections', 20)
 
 class LeadSearcherAgent:
+    """
+    Finds leads for the API without blocking its event loop: every request
+    goes through one shared httpx.AsyncClient (connection pool), paced by the
+    discovery rate limits, and the place search (geocode, then OSM) runs
+    concurrently with the Brave search.
+    """
+
     def __init__(self):
-        pass
+        self._client = None
+        self.buckets = {'osm': make_bucket('osm'), 'brave': make_bucket('brave')}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use, inside the server's event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=REQUEST_TIMEOUT,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+            )
+        return self._client
+
+    def limited(self, provider: str) -> RateLimitedClient:
+        return RateLimitedClient(self.client, self.buckets[provider])
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
-    def geocode_location(self, location: str) -> Optional[dict]:
+    async def geocode_location(self, location: str) -> Optional[dict]:
         """Get lat/lon for a location string using Nominatim."""
-        url = "https://nominatim.openstreetmap.org/search"
         params = {
             "q": location,
             "format": "json",
@@ -27,22 +62,24 @@ class LeadSearcherAgent:
         }
         headers = {"User-Agent": config['places']['osm']['user_agent']}
         try:
-            resp = requests.get(url, params=params, headers=headers, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
+            # Cities are geocoded on every search; the cache answers repeats
+            data = await asyncio.wait_for(response_cache.afetch(
+                'geocode', params, lambda: _get_json(self.limited('osm'), NOMINATIM_SEARCH_URL, params, headers)
+            ), CALL_TIMEOUTS['geocode'])
             if data:
                 place = data[0]
                 return {
                     "lat": float(place['lat']),
                     "lon": float(place['lon'])
                 }
+        except asyncio.TimeoutError:
+            print(f"Geocoding timed out for '{location}'")
         except Exception as e:
             print(f"Geocoding error for '{location}': {e}")
         return None
 
-    def search_osm(self, query: str, radius_km: int = 50, center_lat: float = None, center_lon: float = None) -> List[dict]:
+    async def search_osm(self, query: str, radius_km: int = 50, center_lat: float = None, center_lon: float = None) -> List[dict]:
         """Search OpenStreetMap Nominatim for businesses."""
-        url = "https://nominatim.openstreetmap.org/search"
         params = {
             "q": query,
             "format": "json",
@@ -59,9 +96,12 @@ class LeadSearcherAgent:
             params["bounded"] = 1
         headers = {"User-Agent": config['places']['osm']['user_agent']}
         try:
-            resp = requests.get(url, params=params, headers=headers, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
+            data = await asyncio.wait_for(response_cache.afetch(
+                'osm', params, lambda: _get_json(self.limited('osm'), NOMINATIM_SEARCH_URL, params, headers)
+            ), CALL_TIMEOUTS['osm'])
+        except asyncio.TimeoutError:
+            print(f"OSM search timed out for '{query}'")
+            return []
         except Exception as e:
             print(f"OSM error: {e}")
             return []
@@ -72,30 +112,61 @@ class LeadSearcherAgent:
                 display = place.get('display_name', '')
                 name = display.split(',')[0] if display else 'Unknown'
             address = place.get('display_name')
-            website = None
+            website = phone = None
             if isinstance(place.get('extratags'), dict):
                 website = place['extratags'].get('website')
+                phone = place['extratags'].get('phone')
             results.append({
                 "name": name,
                 "address": address,
-                "website": website
+                "website": website,
+                "phone": phone,
+                "location": {"lat": place.get('lat'), "lon": place.get('lon')}
             })
         return results
 
+    async def search_osm_tiled(self, niche: str, location: str, center_lat: float, center_lon: float,
+                               radius_km: int = 50) -> List[dict]:
+        """
+        Cover the whole radius: the box is split into tiles and any tile that
+        hits Nominatim's result cap is subdivided (see geotiler.TileSearch).
+        On timeout the tiles searched so far are returned.
+        """
+        results = []
+
+        async def collect():
+            bbox = bbox_around(center_lat, center_lon, radius_km)
+            async for places in fetch_osm_tiles(self.limited('osm'), Query(niche, location), bbox=bbox):
+                results.extend(places)
+        try:
+            await asyncio.wait_for(collect(), CALL_TIMEOUTS['osm'])
+        except asyncio.TimeoutError:
+            print(f"Tiled OSM search timed out for {niche} in {location}; keeping {len(results)} places")
+        except Exception as e:
+            print(f"Tiled OSM search error: {e}")
+        return results
+
+    async def search_places(self, niche: str, location: str, radius_km: int = 50) -> List[dict]:
+        """Geocode the location, then search OSM around it (or by name if it cannot be geocoded)."""
+        center = await self.geocode_location(location)
+        if center:
+            return await self.search_osm_tiled(niche, location, center['lat'], center['lon'], radius_km)
+        return await self.search_osm(f"{niche} in {location}")
+
     async def search_brave(self, query: str, count=10) -> List[dict]:
         """Search Brave for business listings."""
         if not BRAVE_API_KEY:
             return []
-        url = "https://api.search.brave.com/res/v1/web/search"
         headers = {
             "Accept": "application/json",
             "X-Subscription-Token": BRAVE_API_KEY
         }
         params = {"q": query, "count": count}
         try:
-            resp = requests.get(url, headers=headers, params=params, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
+            data = await asyncio.wait_for(response_cache.afetch(
+                'brave', params,
+                ametered('brave', lambda: _get_json(self.limited('brave'), BRAVE_SEARCH_URL, params, headers))
+            ), CALL_TIMEOUTS['brave'])
             results = []
             for web in data.get('web', {}).get('results', []):
                 results.append({
@@ -104,40 +175,42 @@ class LeadSearcherAgent:
                     "description": web.get('description')
                 })
             return results
+        except asyncio.TimeoutError:
+            print(f"Brave search timed out for '{query}'")
+            return []
         except Exception as e:
             print(f"Brave search error: {e}")
             return []
 
     async def generate_leads(self, niche: str, location: str, business_type: str = None, radius_km: int = 50) -> List[Lead]:
-        """Generate leads from OSM and Brave search."""
+        """Generate leads from OSM and Brave search (run concurrently)."""
         all_leads = []
-        # Geocode location to get center coordinates for radius search
-        center = self.geocode_location(location)
-        center_lat = center['lat'] if center else None
-        center_lon = center['lon'] if center else None
-
-        # OSM query
-        osm_query = f"{niche} in {location}"
-        osm_results = self.search_osm(osm_query, radius_km=radius_km, center_lat=center_lat, center_lon=center_lon)
+        brave_query = f"{niche} businesses {location} contact email phone"
+        # Each search handles its own errors and timeout; cancelling this cancels both
+        osm_results, brave_results = await asyncio.gather(
+            self.search_places(niche, location, radius_km),
+            self.search_brave(brave_query, count=10)
+        )
+
         for r in osm_results:
+            lat, lon = place_point(r)
             lead = Lead(
                 name=r['name'],
                 email=None,
-                phone=None,
+                phone=r.get('phone'),
                 business_type=business_type or niche,
                 business_name=r['name'],
                 location=location,
                 address=r.get('address'),
                 niche=niche,
                 website_url=r.get('website') or '',
+                lat=lat,
+                lon=lon,
                 status='new'
             )
             all_leads.append(lead)
 
-        # Brave search for additional contacts
-        brave_query = f"{niche} businesses {location} contact email phone"
-        brave_results = await self.search_brave(brave_query, count=10)
-        # We'll store these as raw leads without full structure; enrichment will fill details
+        # Brave results are stored as raw leads without full structure; enrichment will fill details
         for r in brave_results:
             lead = Lead(
                 name=r.get('title', 'Unknown'),
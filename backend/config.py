@@ -8,8 +8,10 @@ class Settings:
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     BRAVE_API_KEY = os.getenv("BRAVE_API_KEY")
 
-    # Database
-    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///leads.db")
+    # Database: the engine comes from db.py (DATABASE_URL, else database.url in config.yaml)
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    # Read dashboard stats from the trigger-maintained counters of the leads table (see stats.py)
+    DASHBOARD_STATS_COUNTERS = os.getenv("DASHBOARD_STATS_COUNTERS", "false").lower() == "true"
 
     # Email
     SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
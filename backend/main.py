@@ -1,16 +1,23 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+import os
+os.environ.setdefault('LEAD_DB_ROLE', 'api')  # read by dbengine when the engine is created
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 from typing import List
 import asyncio
+from datetime import datetime
 from pathlib import Path
-import os
 
 from config import settings
 from services.database import create_tables, get_session, LeadService, EmailCampaignService, WebsitePrototypeService
+from db import UnitOfWork
 from agents.lead_searcher import lead_searcher
+from ingest import ingest_leads
+from resolve import dedupe_rows
+from stats import aggregate_stats, counter_stats, funnel_counts
 from agents.email_generator import email_generator
 from agents.website_builder import website_builder
 from models.lead import Lead, LeadSearchQuery, EmailCampaign, WebsitePrototype
@@ -34,6 +41,11 @@ def startup_event():
     Path(settings.WEBSITE_OUTPUT_PATH).mkdir(exist_ok=True)
     print("✅ Database initialized")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Close the lead searcher's pooled HTTP connections
+    await lead_searcher.aclose()
+
 # Health check
 @app.get("/api/health")
 def health_check():
@@ -44,8 +56,7 @@ def health_check():
 @app.post("/api/leads/search")
 async def search_leads(
     query: LeadSearchQuery,
-    background_tasks: BackgroundTasks,
-    session: Session = Depends(get_session)
+    background_tasks: BackgroundTasks
 ):
     """Search for leads in a specific niche and location (async generation)."""
     try:
@@ -55,8 +66,7 @@ async def search_leads(
             query.niche,
             query.location,
             query.business_type or query.niche,
-            query.radius_km,
-            session
+            query.radius_km
         )
         return {
             "status": "searching",
@@ -66,16 +76,23 @@ async def search_leads(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def _generate_and_save_leads(niche: str, location: str, business_type: str, radius_km: int, session: Session):
-    """Background task to generate and save leads."""
+def _save_lead_rows(rows):
+    # Web results are page titles of businesses OSM already found; keep one merged row each
+    rows = dedupe_rows(rows)
+    # One dedup query and one executemany for the whole batch
+    with UnitOfWork() as uow:
+        added = ingest_leads(uow.session, rows)
+    return rows, added
+
+async def _generate_and_save_leads(niche: str, location: str, business_type: str, radius_km: int):
+    """Background task to generate and save leads (its own session; the request's is closed by now)."""
     try:
         leads = await lead_searcher.generate_leads(niche, location, business_type, radius_km)
-        for lead in leads:
-            # Avoid duplicates by name+location
-            existing = session.query(Lead).filter_by(name=lead.name, location=lead.location).first()
-            if not existing:
-                LeadService.create_lead(session, lead)
-        print(f"✅ Generated {len(leads)} leads")
+        # Attributes the searcher set on each (unsaved) lead
+        rows = [{k: v for k, v in vars(lead).items() if not k.startswith('_')} for lead in leads]
+        # Resolution and the database write run in a worker thread so API requests keep being served
+        rows, added = await asyncio.to_thread(_save_lead_rows, rows)
+        print(f"✅ Generated {len(leads)} leads, {len(rows)} after resolution ({added} new)")
     except Exception as e:
         print(f"❌ Error generating leads: {e}")
 
@@ -93,7 +110,23 @@ def get_leads(
     leads = LeadService.search_leads(session, niche, location, business_type, status)
     return {
         "count": len(leads),
-        "leads": leads
+        "leads": [lead.to_dict() for lead in leads]
+    }
+
+@app.get("/api/leads/near")
+def get_leads_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    km: float = Query(5, gt=0, le=500),
+    limit: int = 100,
+    niche: str = None,
+    session: Session = Depends(get_session)
+):
+    """Leads within km of a point, nearest first."""
+    results = LeadService.get_leads_near(session, lat, lon, km, limit, niche)
+    return {
+        "count": len(results),
+        "leads": [{**lead.to_dict(), "distance_km": round(distance, 3)} for lead, distance in results]
     }
 
 @app.get("/api/leads/{lead_id}")
@@ -102,7 +135,7 @@ def get_lead(lead_id: int, session: Session = Depends(get_session)):
     lead = LeadService.get_lead(session, lead_id)
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
-    return lead
+    return lead.to_dict()
 
 @app.put("/api/leads/{lead_id}")
 def update_lead(
@@ -114,7 +147,8 @@ def update_lead(
     lead = LeadService.update_lead(session, lead_id, **lead_data)
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
-    return lead
+    session.commit()
+    return lead.to_dict()
 
 @app.delete("/api/leads/{lead_id}")
 def delete_lead(lead_id: int, session: Session = Depends(get_session)):
@@ -122,6 +156,7 @@ def delete_lead(lead_id: int, session: Session = Depends(get_session)):
     success = LeadService.delete_lead(session, lead_id)
     if not success:
         raise HTTPException(status_code=404, detail="Lead not found")
+    session.commit()
     return {"status": "deleted"}
 
 # ============= WEBSITE BUILDER ENDPOINTS =============
@@ -156,6 +191,7 @@ async def create_website(
             prototype_url=website_url,
             status="website_created"
         )
+        session.commit()  # prototype row and lead update in one transaction
         return {
             "status": "created",
             "website_url": website_url,
@@ -170,7 +206,7 @@ def get_lead_websites(lead_id: int, session: Session = Depends(get_session)):
     prototypes = WebsitePrototypeService.get_lead_prototypes(session, lead_id)
     return {
         "count": len(prototypes),
-        "websites": prototypes
+        "websites": [prototype.to_dict() for prototype in prototypes]
     }
 
 # ============= EMAIL ENDPOINTS =============
@@ -199,6 +235,7 @@ async def send_email_to_lead(
                 email_sent_date=datetime.utcnow(),
                 status="contacted"
             )
+            session.commit()  # campaign row and lead update in one transaction
             return {"status": "sent", "message": f"Email sent to {lead.email}"}
         else:
             raise HTTPException(status_code=500, detail="Failed to send email")
@@ -208,34 +245,28 @@ async def send_email_to_lead(
 @app.get("/api/emails/{lead_id}")
 def get_lead_emails(lead_id: int, session: Session = Depends(get_session)):
     """Get email campaigns for a lead."""
-    from sqlmodel import select
     statement = select(EmailCampaign).where(EmailCampaign.lead_id == lead_id)
-    campaigns = session.exec(statement).all()
+    campaigns = session.execute(statement).scalars().all()
     return {
         "count": len(campaigns),
-        "campaigns": campaigns
+        "campaigns": [campaign.to_dict() for campaign in campaigns]
     }
 
 # ============= DASHBOARD ENDPOINTS =============
 
 @app.get("/api/dashboard/stats")
-def get_dashboard_stats(session: Session = Depends(get_session)):
-    """Get dashboard statistics."""
-    all_leads = LeadService.get_all_leads(session, 0, 10000)
-    status_counts = {}
-    for lead in all_leads:
-        status_counts[lead.status] = status_counts.get(lead.status, 0) + 1
-    emails_sent = sum(1 for lead in all_leads if lead.email_sent)
-    websites_created = sum(1 for lead in all_leads if lead.prototype_created)
-    total = len(all_leads)
-    conversion_rate = (websites_created / total * 100) if total > 0 else 0
-    return {
-        "total_leads": total,
-        "emails_sent": emails_sent,
-        "websites_created": websites_created,
-        "status_breakdown": status_counts,
-        "conversion_rate": round(conversion_rate, 1)
-    }
+def get_dashboard_stats(funnel_days: int = 30, session: Session = Depends(get_session)):
+    """Get dashboard statistics (GROUP BY aggregates, or counters when enabled)."""
+    if settings.DASHBOARD_STATS_COUNTERS:
+        # O(number of statuses) rows regardless of table size
+        stats = counter_stats(session)
+        stats["funnel"] = funnel_counts(session, funnel_days)
+    else:
+        stats = aggregate_stats(session, Lead)
+    total = stats["total_leads"]
+    conversion_rate = (stats["websites_created"] / total * 100) if total > 0 else 0
+    stats["conversion_rate"] = round(conversion_rate, 1)
+    return stats
 
 # ============= STATIC FILES =============
 
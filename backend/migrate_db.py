@@ -1,42 +1,97 @@
 """
-Migrate existing leads.db to new schema with additional fields.
+Migrate an existing database to the shared schema.
+Adds missing columns to leads and moves rows of the old backend-only `lead`
+table into `leads` (deduplicated by fingerprint and email); email campaigns and
+website prototypes are re-pointed at the moved leads, matched by fingerprint
+or email. If a referenced old lead matches neither, it stops before touching
+them. The old table is kept as lead_legacy. Safe to re-run.
 """
 import os
-from sqlalchemy import create_engine, text, inspect
+import sys
+# Add parent directory to path to import db from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# Use the same DB as config: sqlite:///leads.db in workspace root
-DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'leads.db'))
-DATABASE_URL = f"sqlite:///{DB_PATH}"
-engine = create_engine(DATABASE_URL)
+from sqlalchemy import text, inspect, select, Column, Integer, MetaData, Table
+from db import engine, init_db, add_missing_columns, create_missing_indexes, Session, Lead
+from dedup import lead_fingerprint
+from ingest import ingest_leads
 
-def add_column_if_not_exists(conn, column_name, column_type="VARCHAR"):
-    try:
-        conn.execute(text(f"ALTER TABLE leads ADD COLUMN {column_name} {column_type}"))
-        conn.commit()
-        print(f"Added column {column_name}")
-    except Exception as e:
-        print(f"Column {column_name} may already exist or error: {e}")
+BATCH_SIZE = 1000
+
+init_db()
+added = add_missing_columns('leads')
+print(f"Added columns to leads: {', '.join(added)}" if added else "leads columns up to date")
+create_missing_indexes()
 
-with engine.connect() as conn:
-    inspector = inspect(engine)
-    existing_columns = [col['name'] for col in inspector.get_columns('leads')]
-    print("Existing columns:", existing_columns)
+def _lead_ids(session, column, values):
+    """{value: leads.id} for the given values of a unique leads column."""
+    values = list(values)
+    found = {}
+    for start in range(0, len(values), 500):
+        chunk = values[start:start + 500]
+        found.update(session.query(column, Lead.id).filter(column.in_(chunk)).all())
+    return found
 
-    new_columns = {
-        'business_type': 'VARCHAR',
-        'business_name': 'VARCHAR',
-        'location': 'VARCHAR',
-        'website_url': 'VARCHAR',
-        'email_sent': 'BOOLEAN',
-        'email_sent_date': 'DATETIME',
-        'prototype_created': 'BOOLEAN',
-        'notes': 'VARCHAR',
-        'updated_at': 'DATETIME'
-    }
-    for col, col_type in new_columns.items():
-        if col not in existing_columns:
-            add_column_if_not_exists(conn, col, col_type)
-        else:
-            print(f"Column {col} already exists")
+if inspect(engine).has_table('lead'):
+    lead_columns = {c.name for c in Lead.__table__.columns} - {'id'}
+    legacy_columns = [col['name'] for col in inspect(engine).get_columns('lead')]
+    copy_columns = [c for c in legacy_columns if c in lead_columns]
+    # Typed view of the old table so values come back as Python datetimes etc.
+    legacy = Table('lead', MetaData(), Column('id', Integer, primary_key=True),
+                   *[Column(c, Lead.__table__.c[c].type) for c in copy_columns])
+    id_map = {}
+    moved = 0
+    session = Session()
+    try:
+        last_id = 0
+        while True:
+            rows = session.execute(
+                select(legacy).where(legacy.c.id > last_id).order_by(legacy.c.id).limit(BATCH_SIZE)
+            ).mappings().all()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            batch = []
+            for row in rows:
+                values = {c: row[c] for c in copy_columns if row[c] is not None}
+                values['fingerprint'] = values.get('fingerprint') or lead_fingerprint(
+                    values.get('name'), values.get('address'), values.get('website_url'))
+                batch.append(values)
+                id_map[row['id']] = (values['fingerprint'], values.get('email'))
+            moved += ingest_leads(session, batch)
+        # Old lead id -> id of the same business in leads: by fingerprint, else by email
+        # (ingest skips a row whose email another lead already has)
+        by_fingerprint = _lead_ids(session, Lead.fingerprint, {fp for fp, _ in id_map.values() if fp})
+        by_email = _lead_ids(session, Lead.email, {email for _, email in id_map.values() if email})
+        new_ids = {}
+        for old, (fp, email) in id_map.items():
+            new = by_fingerprint.get(fp) or by_email.get(email)
+            if new is not None:
+                new_ids[old] = new
+        tables = [table for table in ('emailcampaign', 'websiteprototype') if inspect(engine).has_table(table)]
+        referenced = set()
+        for table in tables:
+            referenced.update(session.execute(text(f"SELECT DISTINCT lead_id FROM {table}")).scalars())
+        unmapped = sorted(old for old in referenced & id_map.keys() if old not in new_ids)
+        if unmapped:
+            session.rollback()
+            raise SystemExit(f"Old lead ids {', '.join(map(str, unmapped))} have campaigns or prototypes but no "
+                             f"matching lead in leads (no name and no email?); fix them in the lead table and re-run")
+        remap = [{"old": old, "new": new} for old, new in new_ids.items()]
+        for table in tables:
+            if engine.dialect.name == 'postgresql':
+                session.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_lead_id_fkey"))
+            if remap:
+                # Remap through negative ids so old and new id ranges cannot collide
+                session.execute(text(f"UPDATE {table} SET lead_id = -:new WHERE lead_id = :old"), remap)
+                session.execute(text(f"UPDATE {table} SET lead_id = -lead_id WHERE lead_id < 0"))
+            if engine.dialect.name == 'postgresql':
+                session.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {table}_lead_id_fkey "
+                                     f"FOREIGN KEY (lead_id) REFERENCES leads (id) NOT VALID"))
+        session.execute(text("ALTER TABLE lead RENAME TO lead_legacy"))
+        session.commit()
+    finally:
+        session.close()
+    print(f"Moved {moved} leads from the old lead table ({len(id_map)} rows); kept it as lead_legacy")
 
 print("Migration complete.")
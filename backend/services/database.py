@@ -1,23 +1,32 @@
-from sqlmodel import Session, create_engine, SQLModel, select
-from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Iterator, List, Optional, Tuple
 from datetime import datetime
-from config import settings
-from models.lead import Lead, LeadSearchQuery, EmailCampaign, WebsitePrototype
 
-engine = create_engine(settings.DATABASE_URL, echo=True, connect_args={"check_same_thread": False})
+# Same engine, pool and models as the pipeline and the Flask dashboard
+import db
+import geo
+from db import Lead, EmailCampaign, WebsitePrototype
 
 def create_tables():
-    SQLModel.metadata.create_all(engine)
+    db.init_db()
 
-def get_session() -> Session:
-    return Session(engine)
+def get_session() -> Iterator[Session]:
+    """
+    One session per request. Services only flush; the endpoint commits once,
+    so all writes of a request go out in a single transaction.
+    """
+    session = db.Session()
+    try:
+        yield session
+    finally:
+        session.close()
 
 class LeadService:
     @staticmethod
     def create_lead(session: Session, lead: Lead) -> Lead:
         session.add(lead)
-        session.commit()
-        session.refresh(lead)
+        session.flush()
         return lead
 
     @staticmethod
@@ -27,7 +36,7 @@ class LeadService:
     @staticmethod
     def get_all_leads(session: Session, skip: int = 0, limit: int = 100) -> List[Lead]:
         statement = select(Lead).offset(skip).limit(limit)
-        return session.exec(statement).all()
+        return session.execute(statement).scalars().all()
 
     @staticmethod
     def search_leads(
@@ -46,7 +55,19 @@ class LeadService:
             statement = statement.where(Lead.business_type == business_type)
         if status:
             statement = statement.where(Lead.status == status)
-        return session.exec(statement).all()
+        return session.execute(statement).scalars().all()
+
+    @staticmethod
+    def get_leads_near(
+        session: Session,
+        lat: float,
+        lon: float,
+        km: float,
+        limit: Optional[int] = None,
+        niche: Optional[str] = None
+    ) -> List[Tuple[Lead, float]]:
+        """(lead, distance_km) pairs within km, nearest first (geohash prefix scans, see geo.py)."""
+        return geo.leads_near(session, lat, lon, km, limit, niche)
 
     @staticmethod
     def update_lead(session: Session, lead_id: int, **kwargs) -> Optional[Lead]:
@@ -56,9 +77,7 @@ class LeadService:
                 if hasattr(lead, key):
                     setattr(lead, key, value)
             lead.updated_at = datetime.utcnow()
-            session.add(lead)
-            session.commit()
-            session.refresh(lead)
+            session.flush()
         return lead
 
     @staticmethod
@@ -66,7 +85,7 @@ class LeadService:
         lead = session.get(Lead, lead_id)
         if lead:
             session.delete(lead)
-            session.commit()
+            session.flush()
             return True
         return False
 
@@ -74,14 +93,13 @@ class EmailCampaignService:
     @staticmethod
     def create_campaign(session: Session, campaign: EmailCampaign) -> EmailCampaign:
         session.add(campaign)
-        session.commit()
-        session.refresh(campaign)
+        session.flush()
         return campaign
 
     @staticmethod
     def get_pending_campaigns(session: Session) -> List[EmailCampaign]:
         statement = select(EmailCampaign).where(EmailCampaign.status == "pending")
-        return session.exec(statement).all()
+        return session.execute(statement).scalars().all()
 
     @staticmethod
     def update_campaign_status(session: Session, campaign_id: int, status: str):
@@ -89,18 +107,16 @@ class EmailCampaignService:
         if campaign:
             campaign.status = status
             campaign.sent_at = datetime.utcnow()
-            session.add(campaign)
-            session.commit()
+            session.flush()
 
 class WebsitePrototypeService:
     @staticmethod
     def create_prototype(session: Session, prototype: WebsitePrototype) -> WebsitePrototype:
         session.add(prototype)
-        session.commit()
-        session.refresh(prototype)
+        session.flush()
         return prototype
 
     @staticmethod
     def get_lead_prototypes(session: Session, lead_id: int) -> List[WebsitePrototype]:
         statement = select(WebsitePrototype).where(WebsitePrototype.lead_id == lead_id)
-        return session.exec(statement).all()
+        return session.execute(statement).scalars().all()
@@ -0,0 +1,90 @@
+"""
+Benchmark the JS-fallback cost per page: a fresh Chromium per page (the old
+scrape_website fallback) against the shared browser pool (browser_pool.py).
+Run from the repository root: python benchmarks/bench_browser_pool.py [--pages 40] [--threads 4]
+Needs playwright with Chromium installed. Pages come from a local HTTP server
+and reference images, a web font and a video, which the pool never downloads.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from browser_pool import BrowserPool
+
+PAGE = ("<html><head><style>@font-face {font-family: f; src: url(/font.woff2)} body {font-family: f}</style>"
+        "</head><body>" + "".join(f'<img src="/img{i}.png">' for i in range(20)) +
+        '<video src="/clip.mp4" autoplay></video><p id="c"></p>'
+        "<script>document.getElementById('c').textContent = 'info' + '@' + 'example.com'</script></body></html>")
+ASSET = b"\0" * 200000
+served = {'assets': 0}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/page'):
+            body, kind = PAGE.encode(), 'text/html'
+        else:
+            served['assets'] += 1
+            body, kind = ASSET, 'application/octet-stream'
+        self.send_response(200)
+        self.send_header('Content-Type', kind)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def fresh_browser(url):
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.goto(url, timeout=15000)
+        html = page.content()
+        browser.close()
+    return html
+
+
+def run(label, render, urls, threads):
+    served['assets'] = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pages = list(pool.map(render, urls))
+    elapsed = time.perf_counter() - start
+    found = sum('info@example.com' in html for html in pages)
+    print(f"{label:<22} {elapsed:>8.1f} {elapsed / len(urls) * 1000:>10.0f} {found:>9}/{len(urls)} "
+          f"{served['assets']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=40)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_port}/page{i}" for i in range(args.pages)]
+
+    print(f"{'':<22} {'time (s)':>8} {'ms/page':>10} {'JS ran':>11} {'assets':>7}")
+    # A browser per page: one at a time, like the old fallback on one worker thread
+    run("browser per page", fresh_browser, urls, 1)
+    pool = BrowserPool(max_pages=args.threads, max_memory_mb=0)
+    pool.render(urls[0])  # launch outside the timing
+    run("pool, 1 thread", pool.render, urls, 1)
+    run(f"pool, {args.threads} threads", pool.render, urls, args.threads)
+    print(pool.stats)
+    pool.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark contact extraction on a corpus of business pages: the old separate
+regex passes (first email, first Indian mobile number) against the
+single-pass extractor (contact_extract.py).
+Run from the repository root: python benchmarks/bench_contact_extract.py [--pages 3000]
+The corpus is generated with one planted email and phone per page in the forms
+small-business sites use (plain text, mailto:/tel: links, JSON-LD, HTML
+entities, "name [at] domain [dot] com", international and local numbers),
+among scripts, styles, prices, dates, tracking IDs, and long numbers in tag
+attributes and text (app ids, data-ids, order and invoice numbers). --save DIR writes it
+out (pages plus truth.json) and --corpus DIR reads a saved one back.
+Reports MB/s and recall of the best email and phone, and how often a page
+without contact details yields one anyway.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import contact_extract
+
+WORDS = ("smile bright pearl city care family sunrise lotus golden royal green star prime elite modern "
+         "classic urban metro orchid harmony crystal silver ocean river valley summit noble").split()
+TLDS = ['com', 'in', 'co.uk', 'de', 'com.au']
+FILLER = ("We have been serving the neighbourhood since {year}. Our team of {n} specialists offers "
+          "same-day appointments, {pct}% off the first visit and flexible payment plans. Open Monday "
+          "to Saturday, {h}:00 to {h2}:00. Order #{order} ships in 2-3 days. ")
+EMAIL_FORMS = ['text', 'mailto', 'jsonld', 'entity', 'obfuscated']
+PHONE_FORMS = ['tel', 'keyword', 'international', 'mobile', 'jsonld']
+
+OLD_EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+OLD_PHONE_RE = re.compile(r'(?:\+?91)?[6-9]\d{9}')
+
+
+def old_extract(html):
+    """The extraction before contact_extract: first likely email, first Indian mobile number."""
+    emails = OLD_EMAIL_RE.findall(html)
+    email = next((e for e in emails if 'contact' in e or 'info' in e or 'hello' in e), emails[0] if emails else None)
+    phone = next((re.sub(r'[^\d+]', '', p) for p in OLD_PHONE_RE.findall(html)), None)
+    return email, phone
+
+
+def new_extract(html):
+    email, phone, _, _ = contact_extract.best(html)
+    return email, phone
+
+
+def make_page(rng, planted):
+    name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} Clinic"
+    domain = f"{name.lower().replace(' ', '')}.{rng.choice(TLDS)}"
+    parts = ["<!doctype html><html><head><meta charset='utf-8'>",
+             f"<title>{name}</title><style>" + "".join(f".c{i} {{margin: {i}px; color: #{rng.randrange(16 ** 6):06x}}}"
+                                                      for i in range(rng.randint(50, 200))) + "</style>",
+             f"<script>window.dataLayer=[{{'gtm':'GTM-{rng.randrange(10 ** 9)}','ts':{rng.randrange(10 ** 12)}}}];"
+             f"var asset='logo@2x.png';</script></head><body>",
+             "<nav>" + "".join(f"<a href='/{w}'>{w.title()}</a>" for w in rng.sample(WORDS, 8)) + "</nav>"]
+    for _ in range(rng.randint(10, 60)):
+        parts.append("<p>" + FILLER.format(year=rng.randint(1980, 2020), n=rng.randint(2, 40), pct=rng.randint(5, 50),
+                                           h=rng.randint(7, 10), h2=rng.randint(17, 21),
+                                           order=rng.randrange(10 ** 7)) + "</p>")
+    # Long numbers outside scripts that are not phones: app and element ids, order and invoice numbers
+    parts.append(f'<meta property="fb:app_id" content="{rng.randrange(10 ** 14, 10 ** 15)}" />'
+                 f'<div class="gallery" data-id="{rng.randrange(10 ** 11, 10 ** 12)}" data-width="1200">'
+                 f'<img src="/img/{rng.randrange(10 ** 9, 10 ** 10)}.jpg" width="640"></div>')
+    parts.append(f"<p>Order #{rng.randint(2015, 2024)}{rng.randrange(10 ** 7):07d} shipped. "
+                 f"Invoice {rng.randrange(10 ** 11, 10 ** 12)} is attached.</p>")
+    parts.append(f"<p>Last updated {rng.randint(2015, 2024)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}.</p>")
+    truth = {'email': None, 'phone': None}
+    if planted:
+        user = rng.choice(['info', 'contact', 'hello', 'dr.' + rng.choice(WORDS), 'appointments'])
+        email = f"{user}@{domain}"
+        form = rng.choice(EMAIL_FORMS)
+        if form == 'text':
+            parts.append(f"<p>Write to us: {email}</p>")
+        elif form == 'mailto':
+            parts.append(f"<a href=\"mailto:{email}\">Email us</a>")
+        elif form == 'entity':
+            parts.append(f"<p>Email: {email.replace('@', '&#64;')}</p>")
+        elif form == 'obfuscated':
+            parts.append(f"<p>Email: {email.replace('@', ' [at] ').replace('.', ' [dot] ')}</p>")
+        truth['email'] = email
+
+        phone_form = rng.choice(PHONE_FORMS)
+        if phone_form == 'mobile':
+            digits = f"9{rng.randrange(10 ** 9):09d}"
+            shown, truth['phone'] = rng.choice([digits, f"{digits[:5]} {digits[5:]}"]), digits
+        elif phone_form == 'international':
+            local = f"20 {rng.randrange(10 ** 4):04d} {rng.randrange(10 ** 4):04d}"
+            shown, truth['phone'] = f"+44 {local}", "+44" + local.replace(' ', '')
+        else:
+            area, number = rng.randint(200, 999), rng.randrange(10 ** 7)
+            shown, truth['phone'] = f"({area}) {number // 10 ** 4:03d}-{number % 10 ** 4:04d}", f"{area}{number:07d}"
+        if phone_form == 'tel':
+            parts.append(f"<a href=\"tel:{truth['phone']}\">{shown}</a>")
+        elif phone_form == 'keyword':
+            parts.append(f"<p>Call us on {shown}</p>")
+        elif phone_form != 'jsonld':
+            parts.append(f"<footer><p>{name} &middot; {shown}</p></footer>")
+        if 'jsonld' in (form, phone_form):
+            ld = {'@context': 'https://schema.org', '@type': 'Dentist', 'name': name}
+            if form == 'jsonld':
+                ld['email'] = email
+            if phone_form == 'jsonld':
+                ld['telephone'] = shown
+            parts.append(f"<script type=\"application/ld+json\">{json.dumps(ld)}</script>")
+    parts.append("</body></html>")
+    return "\n".join(parts), truth
+
+
+def make_corpus(count, rng):
+    # A fifth of the pages (menus, galleries, blog posts) have no contact details
+    return [make_page(rng, rng.random() >= 0.2) for _ in range(count)]
+
+
+def save_corpus(corpus, path):
+    os.makedirs(path, exist_ok=True)
+    truth = {}
+    for i, (html, page_truth) in enumerate(corpus):
+        name = f"page{i:05d}.html"
+        with open(os.path.join(path, name), 'w', encoding='utf-8') as f:
+            f.write(html)
+        truth[name] = page_truth
+    with open(os.path.join(path, 'truth.json'), 'w') as f:
+        json.dump(truth, f)
+
+
+def load_corpus(path):
+    with open(os.path.join(path, 'truth.json')) as f:
+        truth = json.load(f)
+    corpus = []
+    for name in sorted(truth):
+        with open(os.path.join(path, name), encoding='utf-8', errors='replace') as f:
+            corpus.append((f.read(), truth[name]))
+    return corpus
+
+
+def phone_digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def run(label, extract, corpus, size):
+    start = time.perf_counter()
+    results = [extract(html) for html, _ in corpus]
+    elapsed = time.perf_counter() - start
+    emails = phones = email_hits = phone_hits = spurious = 0
+    for (email, phone), (_, truth) in zip(results, corpus):
+        if truth['email']:
+            emails += 1
+            email_hits += (email or '').lower() == truth['email'].lower()
+        if truth['phone']:
+            phones += 1
+            phone_hits += phone_digits(phone) == phone_digits(truth['phone'])
+        if not truth['email'] and not truth['phone'] and (email or phone):
+            spurious += 1
+    blank = sum(1 for _, truth in corpus if not truth['email'] and not truth['phone'])
+    print(f"{label:<14} {elapsed:>8.2f} {size / elapsed / 1e6:>8.1f} {email_hits / emails:>13.1%} "
+          f"{phone_hits / phones:>13.1%} {spurious:>6}/{blank}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=3000)
+    parser.add_argument('--corpus', help="read a saved corpus from this directory")
+    parser.add_argument('--save', help="write the generated corpus to this directory")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = make_corpus(args.pages, random.Random(11))
+        if args.save:
+            save_corpus(corpus, args.save)
+    size = sum(len(html.encode('utf-8')) for html, _ in corpus)
+    print(f"{len(corpus)} pages, {size / 1e6:.1f} MB")
+    print(f"{'':<14} {'time (s)':>8} {'MB/s':>8} {'email recall':>13} {'phone recall':>13} {'spurious':>10}")
+    run("old regexes", old_extract, corpus, size)
+    run("single pass", new_extract, corpus, size)
+
+
+if __name__ == '__main__':
+    main()
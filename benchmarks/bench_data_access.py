@@ -0,0 +1,110 @@
+"""
+Benchmark per-request data-access overhead of the FastAPI backend.
+Run from the repository root: python benchmarks/bench_data_access.py [--requests 2000] [--leads 5000]
+"legacy" is the old setup: a second engine with echo=True (statements logged
+to stdout, here discarded), and services that commit and refresh after every
+write. "shared" is db.py: the process engine without echo, services that only
+flush and one commit per request. Also compares per-row commits with a
+UnitOfWork batch for a bulk status update.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+# Add parent directory to path to import db from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from dbengine import make_engine
+from db import Base, Lead, WebsitePrototype, UnitOfWork
+
+
+def setup(url, leads):
+    engine = make_engine(url, role='api')
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Lead), [
+            {"name": f"Clinic {i}", "fingerprint": f"fp{i}", "status": "new", "niche": "dental clinics"}
+            for i in range(leads)
+        ])
+    engine.dispose()
+
+
+def create_website_request(session, lead_id, commit_each):
+    """What POST /api/websites/create does: a prototype row plus a lead update."""
+    lead = session.get(Lead, lead_id)
+    prototype = WebsitePrototype(lead_id=lead.id, template_type="modern", website_url=f"/sites/{lead.id}")
+    session.add(prototype)
+    if commit_each:
+        session.commit()
+        session.refresh(prototype)
+        lead = session.get(Lead, lead_id)
+    lead.status = "website_created"
+    lead.prototype_url = prototype.website_url
+    session.commit()
+    if commit_each:
+        session.refresh(lead)
+
+
+def time_requests(factory, ids, commit_each):
+    start = time.perf_counter()
+    for lead_id in ids:
+        session = factory()
+        try:
+            create_website_request(session, lead_id, commit_each)
+        finally:
+            session.close()
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--leads', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        setup(url, args.leads)
+        ids = [random.randrange(1, args.leads + 1) for _ in range(args.requests)]
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            # echo's log handler binds sys.stdout when the engine is created
+            legacy_engine = make_engine(url, role='api', echo=True)
+            legacy = time_requests(sessionmaker(bind=legacy_engine), ids, commit_each=True)
+            legacy_engine.dispose()
+
+        shared_engine = make_engine(url, role='api')
+        shared = time_requests(sessionmaker(bind=shared_engine), ids, commit_each=False)
+
+        print(f"{'setup':<34}{'us/request':>12}")
+        print(f"{'legacy (echo, commit per write)':<34}{legacy:>12.0f}")
+        print(f"{'shared (one commit per request)':<34}{shared:>12.0f}")
+        print(f"overhead removed: {(legacy - shared) / legacy * 100:.0f}%\n")
+
+        factory = sessionmaker(bind=shared_engine)
+        batch = random.sample(range(1, args.leads + 1), min(1000, args.leads))
+        session = factory()
+        start = time.perf_counter()
+        for lead_id in batch:
+            session.get(Lead, lead_id).status = "emailed"
+            session.commit()
+        per_row = time.perf_counter() - start
+        session.close()
+        start = time.perf_counter()
+        with UnitOfWork(factory()) as uow:
+            for lead_id in batch:
+                uow.update(Lead, lead_id, status="contacted")
+        batched = time.perf_counter() - start
+        uow.session.close()
+        print(f"{len(batch)} status updates: commit per row {per_row * 1000:.0f} ms, "
+              f"UnitOfWork {batched * 1000:.0f} ms")
+        shared_engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
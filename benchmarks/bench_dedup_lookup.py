@@ -0,0 +1,78 @@
+"""
+Benchmark dedup lookup cost as the leads table grows.
+Run from the repository root: python benchmarks/bench_dedup_lookup.py [--sizes 10000,100000,500000]
+Compares the indexed fingerprint lookup against the old unindexed (name, address) filter.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+# Add parent directory to path to import db from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, insert, select
+from db import Base, Lead
+from dedup import lead_fingerprint
+
+LOOKUPS = 2000
+
+
+def make_row(i):
+    name = f"Clinic {i}"
+    address = f"{i} Main Road, Sector {i % 97}, Mumbai"
+    return {
+        "name": name,
+        "address": address,
+        "source_url": f"https://clinic{i}.example.com",
+        "niche": "dental clinics",
+        "status": "new",
+        "fingerprint": lead_fingerprint(name, address),
+    }
+
+
+def time_lookups(conn, stmt_for, count):
+    ids = [random.randrange(count) for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for i in ids:
+        conn.execute(stmt_for(i)).first()
+    return (time.perf_counter() - start) / LOOKUPS * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,50000,100000,500000')
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        print(f"{'rows':>10} {'fingerprint (us)':>18} {'name+address (us)':>19}")
+        inserted = 0
+        with engine.connect() as conn:
+            for size in sizes:
+                rows = [make_row(i) for i in range(inserted, size)]
+                for start in range(0, len(rows), 10000):
+                    conn.execute(insert(Lead.__table__), rows[start:start + 10000])
+                conn.commit()
+                inserted = size
+
+                def by_fingerprint(i):
+                    row = make_row(i)
+                    return select(Lead.id).where(Lead.fingerprint == row['fingerprint'])
+
+                def by_name_address(i):
+                    row = make_row(i)
+                    return select(Lead.id).where(Lead.name == row['name'], Lead.address == row['address'])
+
+                fp_us = time_lookups(conn, by_fingerprint, size)
+                # The unindexed scan is O(n); skip it on big tables to keep the run short
+                na_us = time_lookups(conn, by_name_address, size) if size <= 100000 else float('nan')
+                print(f"{size:>10} {fp_us:>18.1f} {na_us:>19.1f}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
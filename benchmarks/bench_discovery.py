@@ -0,0 +1,58 @@
+"""
+Benchmark discovery wall-clock time against a simulated provider.
+Run from the repository root: python benchmarks/bench_discovery.py [--queries 200] [--rate 5] [--latency 0.3]
+The provider answers after `latency` seconds (httpx mock transport, no network).
+The old loop spent latency + a 1 s sleep per query, one query at a time. The
+executor's time should approach queries / rate.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+from discovery import Query, run_queries
+from ratelimit import TokenBucket
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=5, help="provider requests per second")
+    parser.add_argument('--burst', type=float, default=5)
+    parser.add_argument('--latency', type=float, default=0.3, help="seconds per response")
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    async def handler(request):
+        await asyncio.sleep(args.latency)
+        return httpx.Response(200, json=[{"name": request.url.params['q'], "display_name": "x", "osm_id": 1}])
+
+    async def fetch(client, query):
+        resp = await client.get("https://provider.test/search", params={"q": query.location})
+        return resp.json()
+
+    async def run():
+        queries = [Query("dentists", f"City {i}") for i in range(args.queries)]
+        buckets = {'bench': TokenBucket(args.rate, args.burst)}
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            count = 0
+            async for _, _, places in run_queries(queries, 'bench', args.concurrency, client, buckets, fetch):
+                count += len(places)
+        return count
+
+    started = time.perf_counter()
+    count = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    serial = args.queries * (args.latency + 1)
+    floor = max(args.queries - args.burst, 0) / args.rate
+    print(f"{args.queries} queries, {count} results")
+    print(f"serial loop with 1 s sleeps (estimate): {serial:8.1f} s")
+    print(f"executor at {args.rate:g} req/s:            {elapsed:8.1f} s  (rate-limit floor {floor:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark enrichment throughput against simulated websites.
+Run from the repository root: python benchmarks/bench_enrich_pool.py [--leads 400] [--domains 200] [--latency 0.3]
+Each lead's lookup is one request to its site that takes `latency` seconds
+(no network). The old loop spent latency + a 2 s sleep per lead, one lead at
+a time; workqueue.drain_pool with ratelimit.DomainThrottle should scale with
+the concurrency while keeping every site's requests `interval` seconds apart.
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+import threading
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# A scratch database, set before db is imported
+TMP = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP.name, 'bench.db')}"
+
+from sqlalchemy import insert, update
+from db import engine, init_db, Lead
+from ratelimit import DomainThrottle, host_of
+from workqueue import drain_pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leads', type=int, default=400)
+    parser.add_argument('--domains', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.3, help="seconds per site request")
+    parser.add_argument('--interval', type=float, default=2.0, help="seconds between requests to one site")
+    parser.add_argument('--concurrency', default='1,4,16,32')
+    args = parser.parse_args()
+
+    init_db()
+    with engine.begin() as conn:
+        conn.execute(insert(Lead.__table__), [{
+            'name': f"Clinic {i}", 'status': 'new', 'fingerprint': f"fp{i}",
+            'source_url': f"https://site{i % args.domains}.example/branch{i}",
+        } for i in range(args.leads)])
+
+    old = args.leads * (args.latency + 2)
+    print(f"{args.leads} leads on {args.domains} sites; old serial loop: {old:.0f}s ({args.leads / old:.2f} leads/s)")
+    print(f"{'threads':>8} {'time (s)':>9} {'leads/s':>8} {'min gap per site (s)':>21}")
+    for concurrency in [int(c) for c in args.concurrency.split(',')]:
+        with engine.begin() as conn:
+            conn.execute(update(Lead).values(email=None, phone=None, claimed_by=None, claim_token=None, claim_expires_at=None))
+        throttle = DomainThrottle(args.interval)
+        hits = {}
+        lock = threading.Lock()
+
+        def fetch(lead):
+            throttle.wait(lead['source_url'])
+            with lock:
+                hits.setdefault(host_of(lead['source_url']), []).append(time.monotonic())
+            time.sleep(args.latency)
+            return {'email': f"lead{lead['id']}@{host_of(lead['source_url'])}", 'phone': '+15550100'}
+
+        def apply(session, lead, found):
+            lead.email, lead.phone = found['email'], found['phone']
+            return True
+
+        start = time.perf_counter()
+        done = drain_pool('enrich', fetch, apply, worker_id='bench', concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+        gaps = [b - a for times in hits.values() for a, b in zip(times, times[1:])]
+        print(f"{concurrency:>8} {elapsed:>9.1f} {done / elapsed:>8.1f} {min(gaps, default=0):>21.2f}")
+
+
+if __name__ == '__main__':
+    main()
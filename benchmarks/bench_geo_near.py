@@ -0,0 +1,99 @@
+"""
+Benchmark "leads within N km" queries on synthetic lead coordinates.
+Run from the repository root: python benchmarks/bench_geo_near.py [--points 1000000] [--radii 1,5,25]
+Compares geohash prefix scans plus haversine filtering (geo.ids_near) against
+loading every lead's coordinates and filtering them all, and times the
+endpoint's query (geo.leads_near: the nearest 100 leads as full rows).
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+# Add parent directory to path to import db from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from db import Base, Lead
+import geo
+
+QUERIES = 50
+# Points spread over a 200 x 200 km region around Mumbai
+CENTER = (19.07, 72.87)
+SPREAD_DEG = 0.9
+
+
+def make_rows(start, count, rng):
+    rows = []
+    for i in range(start, start + count):
+        lat = CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+        lon = CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+        rows.append({
+            "name": f"Clinic {i}",
+            "niche": "dental clinics",
+            "status": "new",
+            "fingerprint": f"fp{i}",
+            "lat": lat,
+            "lon": lon,
+            "geohash": geo.encode(lat, lon),
+        })
+    return rows
+
+
+def full_scan(session, lat, lon, km):
+    hits = []
+    for lead_id, plat, plon in session.execute(select(Lead.id, Lead.lat, Lead.lon)):
+        if geo.haversine_km(lat, lon, plat, plon) <= km:
+            hits.append(lead_id)
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=1000000)
+    parser.add_argument('--radii', default='1,5,25')
+    args = parser.parse_args()
+    radii = [float(r) for r in args.radii.split(',')]
+    rng = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            for offset in range(0, args.points, 50000):
+                conn.execute(insert(Lead.__table__), make_rows(offset, min(50000, args.points - offset), rng))
+        print(f"Inserted {args.points} leads in {time.perf_counter() - start:.1f}s")
+
+        centers = [(CENTER[0] + rng.uniform(-0.5, 0.5), CENTER[1] + rng.uniform(-0.5, 0.5))
+                   for _ in range(QUERIES)]
+        print(f"{'km':>6} {'cells':>6} {'matches':>8} {'geohash (ms)':>13} {'full scan (ms)':>15} "
+              f"{'nearest 100 (ms)':>17}")
+        with Session(engine) as session:
+            for km in radii:
+                matches = 0
+                begin = time.perf_counter()
+                for lat, lon in centers:
+                    matches += len(geo.ids_near(session, lat, lon, km))
+                geohash_ms = (time.perf_counter() - begin) / QUERIES * 1000
+                begin = time.perf_counter()
+                for lat, lon in centers:
+                    geo.leads_near(session, lat, lon, km, limit=100)
+                    session.expunge_all()
+                leads_ms = (time.perf_counter() - begin) / QUERIES * 1000
+                # The full scan reads every row; time a couple of queries only
+                begin = time.perf_counter()
+                for lat, lon in centers[:2]:
+                    full = full_scan(session, lat, lon, km)
+                scan_ms = (time.perf_counter() - begin) / 2 * 1000
+                assert sorted(lead_id for lead_id, _ in geo.ids_near(session, *centers[1], km)) == sorted(full)
+                cells = len(geo.covering_cells(*centers[0], km))
+                print(f"{km:>6g} {cells:>6} {matches / QUERIES:>8.0f} {geohash_ms:>13.1f} {scan_ms:>15.1f} "
+                      f"{leads_ms:>17.1f}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark entity resolution (resolve.Resolver) on synthetic cross-source leads.
+Run from the repository root: python benchmarks/bench_resolve.py [--records 1000000]
+Each business appears once as a place (name, coordinates, phone) and, for a
+share of them, again as a web result (page title, website, no coordinates).
+Reports wall time, candidate pairs against the n^2/2 an all-pairs comparison
+needs, and pairwise precision/recall against the known duplicates.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from itertools import combinations
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import geo
+from resolve import Resolver
+
+WORDS = ("smile bright pearl city care family apollo sunrise lotus golden royal green star prime "
+         "elite modern classic urban metro national global orchid harmony unity crystal silver "
+         "ocean river valley summit crown noble grace hope vital pure fresh maple cedar willow "
+         "aspen falcon eagle phoenix jasmine saffron indigo amber coral ivory onyx topaz zenith "
+         "horizon beacon anchor compass meadow harbor canyon glacier").split()
+KINDS = ["dental clinic", "dental care", "dentistry", "cafe", "bistro", "salon", "fitness", "law office"]
+SURNAMES = ("shah patel mehta rao iyer khan singh gupta joshi nair das roy kapoor verma bose menon "
+            "reddy pillai sharma kulkarni desai chopra malhotra saxena agarwal bhat hegde naidu "
+            "chatterjee banerjee mukherjee ghosh sen dutta kaur gill sandhu arora batra").split()
+SUFFIXES = [" - Home", " | Official Website", " - Best {kind} in {city}", ": Book Appointment", ""]
+CITIES = [(f"City {i}", 8 + (i % 20) * 1.3, 70 + (i // 20) * 1.1) for i in range(200)]
+
+
+def make_records(count, rng):
+    records, entity_of = [], []
+    entity = 0
+    while len(records) < count:
+        city, clat, clon = rng.choice(CITIES)
+        kind = rng.choice(KINDS)
+        name = f"{rng.choice(SURNAMES).title()} {rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {kind.title()}"
+        lat, lon = clat + rng.uniform(-0.3, 0.3), clon + rng.uniform(-0.3, 0.3)
+        phone = f"+91 9{rng.randrange(10 ** 9):09d}"
+        records.append({'name': name, 'niche': kind, 'location': city, 'lat': lat, 'lon': lon,
+                        'geohash': geo.encode(lat, lon), 'phone': phone, 'status': 'new'})
+        entity_of.append(entity)
+        if rng.random() < 0.3 and len(records) < count:
+            title = name + rng.choice(SUFFIXES).format(kind=kind, city=city)
+            if rng.random() < 0.3:
+                title = title.replace(' ', '  ').lower()
+            records.append({'name': title, 'niche': kind, 'location': city, 'status': 'new',
+                            'website_url': f"https://{name.lower().replace(' ', '')}.example/"})
+            entity_of.append(entity)
+        entity += 1
+    return records, entity_of
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000000)
+    args = parser.parse_args()
+    rng = random.Random(7)
+    records, entity_of = make_records(args.records, rng)
+
+    start = time.perf_counter()
+    resolver = Resolver(records)
+    clusters = resolver.cluster()
+    elapsed = time.perf_counter() - start
+
+    found = set()
+    for members in clusters:
+        found.update(combinations(members, 2))
+    by_entity = {}
+    for i, entity in enumerate(entity_of):
+        by_entity.setdefault(entity, []).append(i)
+    truth = set()
+    for members in by_entity.values():
+        truth.update(combinations(members, 2))
+    true_positives = len(found & truth)
+    precision = true_positives / len(found) if found else 1.0
+    recall = true_positives / len(truth) if truth else 1.0
+
+    n = len(records)
+    s = resolver.stats
+    print(f"records          {n}")
+    print(f"time             {elapsed:.1f}s ({elapsed / n * 1e6:.1f} us/record)")
+    print(f"blocks           {s['blocks']}")
+    print(f"candidate pairs  {s['candidates']} (all pairs: {n * (n - 1) // 2:.3g})")
+    print(f"clusters         {len(clusters)}")
+    print(f"precision        {precision:.4f}")
+    print(f"recall           {recall:.4f}")
+
+
+if __name__ == '__main__':
+    main()
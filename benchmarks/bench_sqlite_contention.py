@@ -0,0 +1,133 @@
+"""
+Multi-process SQLite contention benchmark.
+Run from the repository root: python benchmarks/bench_sqlite_contention.py [--writers 4 --readers 4 --seconds 5]
+Writer processes update leads the way enrichment does; reader processes run
+dashboard-style queries. Reports lock-wait time (time to BEGIN IMMEDIATE for
+writers, end-to-end query time for readers, which block on writers in the
+rollback journal) and "database is locked" errors, for the rollback journal
+and for the WAL settings from dbengine.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+# Add parent directory to path to import db from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlite3
+from sqlalchemy import insert
+import dbengine
+from db import Base, Lead
+
+ROWS = 20000
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def _open(url, pragmas):
+    dbengine.DB_CONFIG['sqlite'] = pragmas
+    engine = dbengine.make_engine(url, role='worker')
+    raw = engine.raw_connection()
+    raw.driver_connection.isolation_level = None  # issue BEGIN ourselves
+    return engine, raw
+
+
+def writer(url, pragmas, seconds, queue):
+    engine, raw = _open(url, pragmas)
+    cursor = raw.cursor()
+    waits, errors = [], 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            # BEGIN IMMEDIATE blocks until the write lock is ours: that is the lock wait
+            cursor.execute("BEGIN IMMEDIATE")
+            waits.append(time.perf_counter() - start)
+            for _ in range(20):
+                cursor.execute("UPDATE leads SET phone = ?, status = 'new' WHERE id = ?",
+                               (str(random.randrange(10 ** 9)), random.randrange(1, ROWS)))
+            cursor.execute("COMMIT")
+        except sqlite3.OperationalError:
+            errors += 1
+            try:
+                cursor.execute("ROLLBACK")
+            except sqlite3.OperationalError:
+                pass
+    raw.close()
+    engine.dispose()
+    queue.put(('writer', waits, errors))
+
+
+def reader(url, pragmas, seconds, queue):
+    engine, raw = _open(url, pragmas)
+    cursor = raw.cursor()
+    waits, errors = [], 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            cursor.execute("SELECT status, COUNT(*) FROM leads GROUP BY status").fetchall()
+            cursor.execute("SELECT id, name, status FROM leads WHERE id > ? ORDER BY id LIMIT 100",
+                           (random.randrange(ROWS),)).fetchall()
+            waits.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            errors += 1
+    raw.close()
+    engine.dispose()
+    queue.put(('reader', waits, errors))
+
+
+def run(label, pragmas, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        dbengine.DB_CONFIG['sqlite'] = pragmas
+        engine = dbengine.make_engine(url)
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(insert(Lead.__table__), [
+                {"name": f"Clinic {i}", "status": "new", "fingerprint": str(i)} for i in range(ROWS)
+            ])
+        engine.dispose()
+
+        queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=writer, args=(url, pragmas, args.seconds, queue))
+                 for _ in range(args.writers)]
+        procs += [multiprocessing.Process(target=reader, args=(url, pragmas, args.seconds, queue))
+                  for _ in range(args.readers)]
+        for p in procs:
+            p.start()
+        results = [queue.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+    for kind in ('writer', 'reader'):
+        waits = [w for k, ws, _ in results if k == kind for w in ws]
+        errors = sum(e for k, _, e in results if k == kind)
+        print(f"{label:<10} {kind:<7} ops={len(waits):>7} "
+              f"p50={_percentile(waits, 0.5) * 1000:>8.2f}ms p99={_percentile(waits, 0.99) * 1000:>8.2f}ms "
+              f"total_wait={sum(waits):>7.2f}s locked_errors={errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--busy-timeout-ms', type=int, default=5000)
+    args = parser.parse_args()
+    wal = dict(dbengine.sqlite_settings(), busy_timeout_ms=args.busy_timeout_ms)
+
+    run('delete', {'journal_mode': 'delete', 'synchronous': 'full', 'busy_timeout_ms': args.busy_timeout_ms}, args)
+    run('wal', wal, args)
+
+
+if __name__ == '__main__':
+    main()
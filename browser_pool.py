@@ -0,0 +1,230 @@
+"""
+Long-lived headless Chromium for scraping JS-rendered sites.
+One browser runs on a background thread with its own event loop (Playwright's
+async API), and any thread calls render(url) to get a page's HTML, so a
+fallback costs page-load time instead of a browser launch. Pages are opened
+in a few reused browser contexts, each recycled after context_pages pages;
+at most max_pages pages are open at once; images, fonts and media are never
+downloaded. The browser is replaced after browser_pages pages, or when its
+processes use more than max_memory_mb (measured with psutil, if installed).
+Playwright is optional: without it render() raises BrowserUnavailable.
+
+Settings: enrich.browser in config.yaml.
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+import yaml
+
+with open('config.yaml') as f:
+    config = yaml.safe_load(f)
+
+BROWSER_CONFIG = config.get('enrich', {}).get('browser', {})
+
+
+class BrowserUnavailable(Exception):
+    """Playwright (or its Chromium) is not installed."""
+
+
+class BrowserPool:
+    def __init__(self, max_pages=4, context_pages=50, browser_pages=500, max_memory_mb=1024,
+                 block=('image', 'font', 'media'), timeout=15):
+        self.max_pages = max_pages
+        self.context_pages = context_pages
+        self.browser_pages = browser_pages
+        self.max_memory_mb = max_memory_mb
+        self.block = set(block or ())
+        self.timeout = timeout
+        self.stats = {'pages': 0, 'launches': 0, 'restarts': 0, 'failures': 0}
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Used on the pool's loop only
+        self._playwright = None
+        self._browser = None
+        self._served = 0  # pages served by the current browser
+        self._idle = []  # [context, pages served] ready for reuse
+        self._open = {}  # browser -> pages open on it
+        self._slots = None
+        self._launch_lock = None
+
+    @classmethod
+    def from_config(cls, settings=None):
+        settings = BROWSER_CONFIG if settings is None else settings
+        return cls(**{k: v for k, v in settings.items()
+                      if k in ('max_pages', 'context_pages', 'browser_pages', 'max_memory_mb', 'block', 'timeout')})
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            try:
+                import playwright.async_api  # noqa: F401
+            except ImportError:
+                raise BrowserUnavailable("playwright is not installed (pip install playwright; playwright install chromium)")
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name='browser-pool', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def render(self, url, timeout=None):
+        """HTML of the page after it loads (blocks the calling thread; safe from any thread)."""
+        self._ensure_loop()
+        timeout = timeout or self.timeout
+        future = asyncio.run_coroutine_threadsafe(self._render(url, timeout), self._loop)
+        try:
+            # Waiting for a free page slot counts too; leave room for it
+            return future.result(timeout=timeout * 4 + 30)
+        except concurrent.futures.TimeoutError:
+            future.cancel()  # closes the page
+            raise
+
+    def close(self):
+        """Close the browser and stop the pool's thread; a later render() starts a new one."""
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=30)
+        except Exception as e:
+            print(f"Browser pool shutdown error: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=5)
+        loop.close()
+
+    async def _render(self, url, timeout):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pages)
+            self._launch_lock = asyncio.Lock()
+        async with self._slots:
+            browser = await self._current_browser()
+            slot = self._idle.pop() if self._idle else [await self._new_context(browser), 0]
+            self._open[browser] = self._open.get(browser, 0) + 1
+            page = None
+            try:
+                page = await slot[0].new_page()
+                await page.goto(url, timeout=timeout * 1000)
+                html = await page.content()
+                self.stats['pages'] += 1
+                return html
+            except Exception:
+                self.stats['failures'] += 1
+                raise
+            finally:
+                if page is not None:
+                    await _quietly(page.close())
+                slot[1] += 1
+                self._open[browser] -= 1
+                if browser is self._browser and slot[1] < self.context_pages:
+                    self._idle.append(slot)
+                else:
+                    await _quietly(slot[0].close())
+                if browser is self._browser:
+                    self._served += 1
+                    if self._served >= self.browser_pages or self._over_memory():
+                        self._retire()
+                await self._close_retired()
+
+    async def _current_browser(self):
+        async with self._launch_lock:
+            if self._browser is not None and not self._browser.is_connected():
+                # Crashed: its contexts are gone too
+                self._retire()
+            if self._browser is None:
+                try:
+                    if self._playwright is None:
+                        from playwright.async_api import async_playwright
+                        self._playwright = await async_playwright().start()
+                    self._browser = await self._playwright.chromium.launch(
+                        headless=True, args=['--disable-dev-shm-usage'])
+                except Exception as e:
+                    raise BrowserUnavailable(f"Chromium could not be launched: {e}")
+                self._served = 0
+                self.stats['launches'] += 1
+            return self._browser
+
+    async def _new_context(self, browser):
+        context = await browser.new_context(java_script_enabled=True, ignore_https_errors=True)
+        if self.block:
+            await context.route('**/*', self._route)
+        return context
+
+    async def _route(self, route):
+        if route.request.resource_type in self.block:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _retire(self):
+        """Stop handing out the current browser; it is closed once its open pages finish."""
+        if self._browser is None:
+            return
+        self._open.setdefault(self._browser, 0)
+        self._browser = None
+        idle, self._idle = self._idle, []
+        for context, _ in idle:
+            asyncio.ensure_future(_quietly(context.close()))
+        self.stats['restarts'] += 1
+
+    async def _close_retired(self):
+        for browser, count in list(self._open.items()):
+            if browser is not self._browser and count == 0:
+                del self._open[browser]
+                await _quietly(browser.close())
+
+    def _over_memory(self):
+        """True when the pool's child processes (Chromium, the driver) use more than max_memory_mb."""
+        if not self.max_memory_mb:
+            return False
+        try:
+            import psutil
+        except ImportError:
+            return False
+        rss = 0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss > self.max_memory_mb * 1024 * 1024
+
+    async def _shutdown(self):
+        for context, _ in self._idle:
+            await _quietly(context.close())
+        self._idle = []
+        if self._browser is not None:
+            self._open.setdefault(self._browser, 0)
+            self._browser = None
+        for browser in list(self._open):
+            await _quietly(browser.close())
+        self._open = {}
+        if self._playwright is not None:
+            await _quietly(self._playwright.stop())
+            self._playwright = None
+        # Bound to this loop; a restarted pool makes new ones
+        self._slots = self._launch_lock = None
+
+
+async def _quietly(awaitable):
+    try:
+        await awaitable
+    except Exception:
+        pass
+
+
+# Shared by every scraping thread in the process; Chromium starts on first use
+browser_pool = BrowserPool.from_config()
+
+if __name__ == '__main__':
+    import sys
+    import time
+    if len(sys.argv) < 2:
+        print("Usage: python browser_pool.py <url> [url ...]")
+        sys.exit(1)
+    for url in sys.argv[1:]:
+        start = time.perf_counter()
+        html = browser_pool.render(url)
+        print(f"{url}: {len(html)} bytes in {time.perf_counter() - start:.2f}s")
+    print(browser_pool.stats)
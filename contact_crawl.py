@@ -0,0 +1,159 @@
+"""
+Budgeted contact crawl of a business website.
+Small sites rarely put their email and phone on the homepage; they are on
+/contact, /about or in the footer of a subpage. The crawl fetches the
+homepage (or the page that had the details last time), ranks same-site links
+by how likely they lead to contact details, and follows the best ones within
+a budget per site: pages, bytes and seconds (enrich.crawl). It stops as soon
+as it has a verified email (a mailto: link, or an address on the site's own
+domain) and a phone, and reports the page each came from, so re-enrichment
+can go straight back there.
+
+Usage: python contact_crawl.py <url> [--hint URL]
+"""
+import re
+import sys
+import time
+import heapq
+import argparse
+from collections import namedtuple
+from html import unescape
+from urllib.parse import urljoin, urldefrag, urlparse
+import requests
+import yaml
+from ratelimit import domain_throttle, host_of
+import contact_extract
+
+with open('config.yaml') as f:
+    config = yaml.safe_load(f)
+
+CRAWL_CONFIG = config['enrich'].get('crawl', {})
+MAX_PAGES = CRAWL_CONFIG.get('max_pages', 6)
+MAX_BYTES = CRAWL_CONFIG.get('max_bytes', 2000000)
+MAX_SECONDS = CRAWL_CONFIG.get('max_seconds', 30)
+REQUEST_TIMEOUT = config['enrich'].get('scrape_timeout', 10)
+USER_AGENT = config['places']['osm']['user_agent']
+
+ANCHOR_RE = re.compile(r'<a\s[^>]*?href\s*=\s*["\']([^"\'#][^"\']*)["\'][^>]*>(.*?)</a>', re.I | re.S)
+TAG_RE = re.compile(r'<[^>]+>')
+# (pattern over the link's URL and text, score); the best match counts
+LINK_HINTS = [
+    (re.compile(r'contact|kontakt|contacto|reach[\s_-]?us|get[\s_-]?in[\s_-]?touch|enquir|inquir', re.I), 10),
+    (re.compile(r'impressum|imprint|legal[\s_-]?notice', re.I), 8),
+    (re.compile(r'about|who[\s_-]?we[\s_-]?are|our[\s_-]?story', re.I), 5),
+    (re.compile(r'locat|find[\s_-]?us|branch|visit|direction', re.I), 4),
+    (re.compile(r'team|staff|doctor|people', re.I), 2),
+]
+SKIP_LINK_RE = re.compile(
+    r'\.(?:jpe?g|png|gif|svg|webp|pdf|docx?|zip|mp[34]|css|js|ico|xml)(?:[?#]|$)'
+    r'|/(?:wp-content|wp-json|cart|checkout|login|signin|account|feed)\b'
+    r'|privacy|terms|cookie', re.I)
+HTML_TYPES = ('text/html', 'application/xhtml')
+
+# errors: pages that could not be fetched (network errors, HTTP errors)
+CrawlResult = namedtuple('CrawlResult', ['email', 'phone', 'email_page', 'phone_page', 'pages', 'bytes', 'verified',
+                                         'errors'])
+
+
+def extract_contacts(html, site_host=None):
+    """(email, phone, email verified) found in a page."""
+    email, phone, _, verified = contact_extract.best(html, site_host)
+    return email, phone, verified
+
+
+def rank_links(html, base_url, site_host):
+    """Same-site links scored by contact likelihood, best first: [(score, url)]."""
+    ranked = {}
+    for href, text in ANCHOR_RE.findall(html):
+        url = urldefrag(urljoin(base_url, unescape(href.strip())))[0]
+        if urlparse(url).scheme not in ('http', 'https') or host_of(url) != site_host:
+            continue
+        if SKIP_LINK_RE.search(url):
+            continue
+        label = f"{urlparse(url).path} {TAG_RE.sub(' ', text)}"
+        score = max((points for pattern, points in LINK_HINTS if pattern.search(label)), default=0)
+        if score and score > ranked.get(url, 0):
+            ranked[url] = score
+    return sorted(((score, url) for url, score in ranked.items()), reverse=True)
+
+
+def fetch_page(url, max_bytes, timeout):
+    """(html, final url) of a page, reading at most max_bytes; html is None if it is not an HTML page."""
+    domain_throttle.wait(url)
+    with requests.get(url, timeout=timeout, stream=True, headers={'User-Agent': USER_AGENT}) as resp:
+        resp.raise_for_status()
+        if not resp.headers.get('Content-Type', 'text/html').lower().startswith(HTML_TYPES):
+            return None, resp.url
+        chunks, size = [], 0
+        for chunk in resp.iter_content(16384):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                break
+        return b''.join(chunks).decode(resp.encoding or 'utf-8', errors='replace'), resp.url
+
+
+def crawl_contacts(start_url, hint_url=None, max_pages=None, max_bytes=None, max_seconds=None,
+                   fetch=fetch_page, extract=extract_contacts):
+    """
+    Crawl a site for an email and a phone within the budget. hint_url (the
+    page that had them last time) is fetched first. Unverified emails are
+    kept only if nothing better turns up.
+    """
+    max_pages = max_pages or MAX_PAGES
+    max_bytes = max_bytes or MAX_BYTES
+    deadline = time.monotonic() + (max_seconds or MAX_SECONDS)
+    site_host = host_of(start_url)
+    email = phone = email_page = phone_page = None
+    verified = False
+    pages = used = errors = 0
+    seen = set()
+    # Max-heap of (-score, order, url); the hint and the homepage go first
+    queue = []
+    order = 0
+    for url, score in ((hint_url, 100), (start_url, 50)):
+        if url and host_of(url) == site_host:
+            heapq.heappush(queue, (-score, order, url))
+            order += 1
+    while queue and pages < max_pages and used < max_bytes:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        neg_score, _, url = heapq.heappop(queue)
+        if url in seen:
+            continue
+        seen.add(url)
+        try:
+            html, final_url = fetch(url, max_bytes - used, min(REQUEST_TIMEOUT, remaining))
+        except Exception as e:
+            print(f"Crawl error {url}: {e}")
+            errors += 1
+            continue
+        pages += 1
+        seen.add(final_url)
+        if not html:
+            continue
+        used += len(html)
+        page_email, page_phone, page_verified = extract(html, site_host)
+        if page_email and (not email or (page_verified and not verified)):
+            email, email_page, verified = page_email, final_url, page_verified
+        if page_phone and not phone:
+            phone, phone_page = page_phone, final_url
+        if verified and phone:
+            break
+        # Links found deeper in the site rank a little lower than the same link on the homepage
+        for score, link in rank_links(html, final_url, site_host):
+            if link not in seen:
+                heapq.heappush(queue, (-(score - (0 if url == start_url else 1)), order, link))
+                order += 1
+    return CrawlResult(email, phone, email_page, phone_page, pages, used, verified, errors)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crawl a website for contact details.")
+    parser.add_argument('url')
+    parser.add_argument('--hint', help="page to try first")
+    args = parser.parse_args(sys.argv[1:])
+    started = time.monotonic()
+    result = crawl_contacts(args.url, args.hint)
+    print(f"{result} in {time.monotonic() - started:.1f}s")
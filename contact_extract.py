@@ -0,0 +1,283 @@
+"""
+Single-pass contact extraction from HTML or plain text.
+One precompiled pattern walks the document once and recognises, in order:
+schema.org JSON-LD blocks (email, telephone, PostalAddress), other scripts
+and styles (skipped), <address> tags, mailto: and tel: links, other tags
+(whose attributes are never read as text), plain and HTML-entity emails,
+obfuscated "name [at] domain [dot] com" emails, phone numbers in local or
+international format, street-address lines, and the words that announce a
+phone ("Phone:", "Call us"). Every hit becomes a candidate with a confidence
+that depends on where it was found. Repeats of the same value add to it.
+Candidates are returned best first. An email is verified only by where it
+was found (a mailto: link, JSON-LD) or by being on the site's own domain.
+
+Usage: python contact_extract.py <file.html|url> [--host example.com]
+"""
+import re
+import sys
+import json
+import argparse
+from collections import namedtuple
+from html import unescape
+from urllib.parse import unquote
+
+Candidate = namedtuple('Candidate', ['kind', 'value', 'confidence', 'source', 'verified'])
+Contacts = namedtuple('Contacts', ['emails', 'phones', 'addresses'])
+
+# Candidates below this are not returned by best(), and repeats do not lift them
+MIN_CONFIDENCE = 0.3
+
+_LOCAL = r"[A-Za-z0-9._%+-]{1,64}+"
+_DOMAIN = r"[A-Za-z0-9-]{1,63}(?:\.[A-Za-z0-9-]{1,63})*\.[A-Za-z]{2,24}"
+_AT = r"(?:\s*[\[({]\s*at\s*[\])}]\s*|\s+at\s+)"
+_DOT = r"(?:\s*[\[({]\s*dot\s*[\])}]\s*|\s+dot\s+)"
+
+CONTACT_RE = re.compile(
+    # JSON-LD structured data
+    r"<script[^>]*?application/ld\+json[^>]*>(?P<ld>.*?)</script\s*>"
+    # Other scripts and styles hold no contact details worth the false positives
+    r"|<(?P<skip>script|style|noscript|svg)\b[^>]*>.*?</(?P=skip)\s*>"
+    r"|<address\b[^>]*>(?P<address_tag>.*?)</address\s*>"
+    r"|mailto:(?P<mailto>[^\"'?\s<>]+)"
+    r"|tel:(?P<tel>[+\d(][\d\s().%/-]*\d)"
+    # Any other tag: attribute values (app ids, data-ids, sizes) are never read as text.
+    # Links inside it are picked out of the tag (see scan)
+    r"|(?P<tag><[A-Za-z!/][^>]*>)"
+    # Emails, also with the @ as an HTML entity
+    rf"|(?<![\w.%+-])(?P<email>{_LOCAL}(?P<entity>@|&\#0*64;|&\#x0*40;|&commat;){_DOMAIN})(?![\w-])"
+    # The last label must be an alphabetic TLD, so "open at 10 dot 30" is not an email
+    rf"|(?<![\w.%+-])(?P<obfuscated>{_LOCAL}(?:{_DOT}{_LOCAL})*{_AT}(?:[A-Za-z0-9-]{{1,63}}{_DOT})+[A-Za-z]{{2,24}})(?![\w-])"
+    r"|(?<![\w+/=-])(?<!\d\.)(?P<phone>(?:\+|00)?\(?\d[\d\s().-]{6,18}\d)(?![\w/=-]|\.\d|\s?%)"
+    r"|(?<!\w)(?P<street>\d{1,5}[,\s]\s*[A-Za-z][\w .'-]{1,50}?\s(?:street|st|road|rd|avenue|ave|lane|ln|block|sector|phase|marg|nagar|floor)\b[^<>\n]{0,80})"
+    r"|\b(?P<keyword>phone|telephone|tel|call(?:\s+us)?|mobile|mob|whatsapp|ph|fax)\b",
+    re.I | re.S | re.A,
+)
+PHONE_DIGITS_RE = re.compile(r'\d')
+LINK_RE = re.compile(r'mailto:(?P<mailto>[^"\'?\s<>]+)|tel:(?P<tel>[+\d(][\d\s().%/-]*\d)', re.I)
+TAG_RE = re.compile(r'<[^>]+>')
+SPACE_RE = re.compile(r'\s+')
+OBFUSCATION_RE = re.compile(_AT + '|' + _DOT, re.I | re.A)
+TLD_RE = re.compile(r'.\.[a-z]{2,24}$')
+DATE_RE = re.compile(r'^\d{4}[-./]\d{1,2}[-./]\d{1,2}$|^\d{1,2}[-./]\d{1,2}[-./]\d{4}$')
+
+# Placeholder, tracking and asset "domains" that are never contact addresses
+IGNORED_EMAIL_DOMAINS = {'example.com', 'example.org', 'domain.com', 'email.com', 'yourdomain.com',
+                         'sentry.io', 'sentry-next.wixpress.com', 'wixpress.com', 'godaddy.com'}
+ASSET_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.css', '.js', '.ico')
+ROLE_ACCOUNTS = {'info', 'contact', 'hello', 'enquiry', 'enquiries', 'office', 'reception', 'admin',
+                 'appointments', 'booking', 'bookings', 'mail', 'sales', 'support'}
+NO_REPLY = ('noreply', 'no-reply', 'donotreply', 'do-not-reply', 'mailer-daemon')
+
+# Confidence by where a value was found
+EMAIL_SOURCES = {'jsonld': 0.9, 'mailto': 0.85, 'entity': 0.65, 'obfuscated': 0.65, 'text': 0.55}
+# A long digit run nothing announces (order numbers, ids) ranks below MIN_CONFIDENCE and is never returned
+PHONE_SOURCES = {'jsonld': 0.9, 'tel': 0.85, 'keyword': 0.7, 'international': 0.5, 'mobile': 0.5, 'text': 0.2}
+# Sources that verify an email on their own; otherwise only the site's own domain does
+VERIFYING_SOURCES = ('jsonld', 'mailto')
+ADDRESS_SOURCES = {'jsonld': 0.9, 'address_tag': 0.7, 'street': 0.4}
+# How far after "Phone:" a number still counts as announced
+KEYWORD_REACH = 40
+
+
+def normalize_email(value):
+    email = unquote(unescape(value)).strip().strip('.').lower()
+    if email.count('@') != 1:
+        return None
+    local, domain = email.split('@')
+    if not local or not TLD_RE.search(domain) or domain in IGNORED_EMAIL_DOMAINS or domain.endswith(ASSET_SUFFIXES):
+        return None
+    return email
+
+
+def normalize_phone(value, min_digits=8):
+    """Digits with a leading + for international numbers ('00' becomes '+'); None if not a phone."""
+    raw = unquote(value).strip()
+    digits = ''.join(PHONE_DIGITS_RE.findall(raw))
+    if raw.startswith('00'):
+        digits, plus = digits[2:], True
+    else:
+        plus = raw.startswith('+')
+    if not min_digits <= len(digits) <= 15:
+        return None
+    return ('+' if plus else '') + digits
+
+
+def _clean_text(html):
+    return SPACE_RE.sub(' ', unescape(TAG_RE.sub(' ', html))).strip(' ,')
+
+
+def _postal_address(value):
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, dict):
+        parts = [value.get(k) for k in ('streetAddress', 'addressLocality', 'addressRegion', 'postalCode')]
+        country = value.get('addressCountry')
+        parts.append(country.get('name') if isinstance(country, dict) else country)
+        return ', '.join(str(p).strip() for p in parts if p) or None
+    return None
+
+
+class ContactExtractor:
+    """Collects candidates for one document; extract() runs the pass."""
+
+    def __init__(self, site_host=None):
+        self.site_host = (site_host or '').lower()
+        self._found = {'email': {}, 'phone': {}, 'address': {}}
+
+    def add(self, kind, value, confidence, source, verified=False):
+        seen = self._found[kind].get(value)
+        if seen is None:
+            self._found[kind][value] = [confidence, source, 1, verified]
+        else:
+            if confidence > seen[0]:
+                seen[0], seen[1] = confidence, source
+            seen[2] += 1
+            seen[3] = seen[3] or verified
+
+    def add_email(self, raw, source):
+        email = normalize_email(raw)
+        if not email:
+            return
+        confidence = EMAIL_SOURCES[source]
+        local, domain = email.split('@')
+        own_domain = bool(self.site_host) and (domain == self.site_host or self.site_host.endswith('.' + domain)
+                                               or domain.endswith('.' + self.site_host))
+        if own_domain:
+            confidence += 0.25
+        if local in ROLE_ACCOUNTS:
+            confidence += 0.05
+        if local.startswith(NO_REPLY):
+            confidence = 0.1
+        verified = (source in VERIFYING_SOURCES or own_domain) and not local.startswith(NO_REPLY)
+        self.add('email', email, min(confidence, 1.0), source, verified)
+
+    def add_phone(self, raw, source, min_digits=8):
+        phone = normalize_phone(raw, min_digits)
+        if phone:
+            self.add('phone', phone, PHONE_SOURCES[source], source)
+
+    def add_address(self, raw, source):
+        address = _clean_text(raw)
+        if 8 <= len(address) <= 200:
+            self.add('address', address, ADDRESS_SOURCES[source], source)
+
+    def add_jsonld(self, body):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            # Not valid JSON: scan it like any other text
+            self.scan(body)
+            return
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                for key, value in item.items():
+                    if key == 'email' and isinstance(value, str):
+                        self.add_email(value.replace('mailto:', ''), 'jsonld')
+                    elif key in ('telephone', 'faxNumber') and isinstance(value, str):
+                        if key == 'telephone':
+                            self.add_phone(value, 'jsonld', min_digits=6)
+                    elif key == 'address':
+                        address = _postal_address(value)
+                        if address:
+                            self.add('address', address, ADDRESS_SOURCES['jsonld'], 'jsonld')
+                        elif isinstance(value, (list, dict)):
+                            stack.append(value)
+                    elif isinstance(value, (list, dict)):
+                        stack.append(value)
+
+    def scan(self, text):
+        """The single pass over a document."""
+        keyword_end = -KEYWORD_REACH - 1
+        fax = False
+        for m in CONTACT_RE.finditer(text):
+            group = m.lastgroup
+            if group == 'ld':
+                self.add_jsonld(m.group('ld'))
+            elif group == 'skip':
+                continue
+            elif group == 'address_tag':
+                self.add_address(m.group('address_tag'), 'address_tag')
+                # Contact details inside the tag still count
+                self.scan(m.group('address_tag'))
+            elif group == 'mailto':
+                self.add_email(m.group('mailto'), 'mailto')
+            elif group == 'tel':
+                self.add_phone(m.group('tel'), 'tel', min_digits=6)
+            elif group == 'tag':
+                tag = m.group('tag')
+                if ':' in tag:
+                    for link in LINK_RE.finditer(tag):
+                        if link.group('mailto'):
+                            self.add_email(link.group('mailto'), 'mailto')
+                        else:
+                            self.add_phone(link.group('tel'), 'tel', min_digits=6)
+            elif group == 'email':
+                self.add_email(m.group('email'), 'text' if m.group('entity') == '@' else 'entity')
+            elif group == 'obfuscated':
+                self.add_email(OBFUSCATION_RE.sub(lambda o: '@' if 'at' in o.group().lower() else '.',
+                                                  m.group('obfuscated')), 'obfuscated')
+            elif group == 'phone':
+                raw = m.group('phone')
+                if DATE_RE.match(raw.strip()):
+                    continue
+                if m.start() - keyword_end <= KEYWORD_REACH:
+                    if not fax:
+                        self.add_phone(raw, 'keyword')
+                elif raw.startswith(('+', '00')):
+                    self.add_phone(raw, 'international')
+                else:
+                    digits = ''.join(PHONE_DIGITS_RE.findall(raw))
+                    if len(digits) == 10 and digits[0] in '6789':
+                        self.add_phone(raw, 'mobile')  # Indian mobile numbers
+                    elif len(digits) >= 10:
+                        self.add_phone(raw, 'text')
+            elif group == 'street':
+                self.add_address(m.group('street'), 'street')
+            elif group == 'keyword':
+                keyword_end = m.end()
+                fax = m.group('keyword').lower() == 'fax'
+
+    def result(self):
+        ranked = {}
+        for kind, found in self._found.items():
+            # Repeats rank a value higher, but never lift it over MIN_CONFIDENCE or make it verified
+            candidates = [Candidate(kind, value, min(1.0, confidence + 0.05 * (count - 1))
+                                    if confidence >= MIN_CONFIDENCE else confidence, source, verified)
+                          for value, (confidence, source, count, verified) in found.items()]
+            candidates.sort(key=lambda c: c.confidence, reverse=True)
+            ranked[kind] = candidates
+        return Contacts(ranked['email'], ranked['phone'], ranked['address'])
+
+
+def extract(text, site_host=None):
+    """Ranked email, phone and address candidates in a document (HTML or plain text)."""
+    extractor = ContactExtractor(site_host)
+    extractor.scan(text)
+    return extractor.result()
+
+
+def best(text, site_host=None):
+    """(email, phone, address, email verified) from the best candidates of each kind."""
+    contacts = extract(text, site_host)
+    picks = [next((c for c in candidates if c.confidence >= MIN_CONFIDENCE), None)
+             for candidates in contacts]
+    email, phone, address = (c.value if c else None for c in picks)
+    return email, phone, address, bool(picks[0]) and picks[0].verified
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extract contact candidates from a page.")
+    parser.add_argument('source')
+    parser.add_argument('--host')
+    args = parser.parse_args(sys.argv[1:])
+    if args.source.startswith(('http://', 'https://')):
+        import requests
+        page = requests.get(args.source, timeout=10).text
+    else:
+        with open(args.source, encoding='utf-8', errors='replace') as f:
+            page = f.read()
+    for candidate in (c for kind in extract(page, args.host) for c in kind):
+        print(f"{candidate.kind:<8} {candidate.confidence:.2f} {candidate.source:<14} {candidate.value}")
@@ -1,7 +1,8 @@
 import openai
 import yaml
 import os
-from db import Session, Lead
+from sqlalchemy import func
+from db import Session, Lead, ConversationMessage, STREAM_BATCH_SIZE
 from datetime import datetime
 import json
 
@@ -10,15 +11,42 @@ with open('config.yaml') as f:
 
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
-def get_ai_response(lead, user_message):
-    # Build a conversation context
-    history = lead.conversation_history or []
-    # Add user message
-    history.append({"role": "user", "content": user_message})
-    # System prompt
-    system = f"You are an AI assistant helping a lead interested in {config['niche']}. Be friendly, concise, and persuasive. Goal: move toward conversion."
-    messages = [{"role": "system", "content": system}] + history
+def append_message(session, lead_id, role, content):
+    """
+    Append one message to a lead's conversation and update the denormalized
+    last_message_role/last_message_at on the lead. Caller commits.
+    """
+    last_seq = session.query(func.max(ConversationMessage.seq)).filter(
+        ConversationMessage.lead_id == lead_id
+    ).scalar() or 0
+    now = datetime.utcnow()
+    session.add(ConversationMessage(lead_id=lead_id, seq=last_seq + 1, role=role, content=content, created_at=now))
+    session.query(Lead).filter(Lead.id == lead_id).update(
+        {Lead.last_message_role: role, Lead.last_message_at: now},
+        synchronize_session=False
+    )
+
+def load_history(session, lead_id):
+    """Return the conversation as a list of {"role", "content"} dicts in order."""
+    rows = session.query(ConversationMessage.role, ConversationMessage.content).filter(
+        ConversationMessage.lead_id == lead_id
+    ).order_by(ConversationMessage.seq).all()
+    return [{"role": role, "content": content} for role, content in rows]
+
+def get_ai_response(lead, user_message=None):
+    """
+    Reply to a lead. If user_message is given it is stored first; otherwise the
+    stored conversation is expected to end with the user's message.
+    """
+    session = Session()
     try:
+        if user_message is not None:
+            append_message(session, lead.id, 'user', user_message)
+            session.commit()
+        history = load_history(session, lead.id)
+        # System prompt
+        system = f"You are an AI assistant helping a lead interested in {config['niche']}. Be friendly, concise, and persuasive. Goal: move toward conversion."
+        messages = [{"role": "system", "content": system}] + history
         response = openai.chat.completions.create(
             model=config['ai']['model'],
             messages=messages,
@@ -26,33 +54,33 @@ def get_ai_response(lead, user_message):
             temperature=0.7
         )
         ai_reply = response.choices[0].message.content.strip()
-        history.append({"role": "assistant", "content": ai_reply})
-        # Update lead
-        session = Session()
-        lead_obj = session.query(Lead).filter_by(id=lead.id).first()
-        if lead_obj:
-            lead_obj.conversation_history = history
-            if lead_obj.status == 'prototype_sent':
-                lead_obj.status = 'in_conversation'
-            session.commit()
-        session.close()
+        # One small row per turn instead of rewriting the whole history
+        append_message(session, lead.id, 'assistant', ai_reply)
+        session.query(Lead).filter(Lead.id == lead.id, Lead.status == 'prototype_sent').update(
+            {Lead.status: 'in_conversation'}, synchronize_session=False
+        )
+        session.commit()
         return ai_reply
     except Exception as e:
         print(f"OpenAI error: {e}")
+        session.rollback()
         return "Sorry, I'm having trouble connecting right now."
+    finally:
+        session.close()
 
 def handle_conversation():
     session = Session()
-    # Find leads in conversation or with prototype sent
-    leads = session.query(Lead).filter(Lead.status.in_(['in_conversation', 'prototype_sent'])).all()
+    # Leads in conversation or with prototype sent whose last message came from the user
+    # (index lookup on last_message_role/status)
+    leads = session.query(Lead.id).filter(
+        Lead.last_message_role == 'user',
+        Lead.status.in_(['in_conversation', 'prototype_sent'])
+    ).yield_per(STREAM_BATCH_SIZE)
     for lead in leads:
         # In a real system, we'd fetch new incoming messages from email or chat
-        # For demo, we'll just simulate: if last message is from user, we reply
-        history = lead.conversation_history or []
-        if history and history[-1]['role'] == 'user':
-            reply = get_ai_response(lead, history[-1]['content'])
-            print(f"Replied to lead {lead.id}: {reply}")
-            # Here we would send the reply via email or chat
+        reply = get_ai_response(lead)
+        print(f"Replied to lead {lead.id}: {reply}")
+        # Here we would send the reply via email or chat
     session.close()
 
 if __name__ == '__main__':
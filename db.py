@@ -1,24 +1,36 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, JSON
+"""
+Data-access layer shared by the pipeline, the Flask dashboard and the FastAPI
+backend: the models, the process-wide engine and session factory, and
+UnitOfWork for batching writes into one transaction.
+"""
+from sqlalchemy import event, inspect, text, update, Column, Integer, Float, String, Text, DateTime, Boolean, JSON, ForeignKey, Index
 from sqlalchemy.orm import declarative_base, sessionmaker
-from datetime import datetime
-import os
+from datetime import date, datetime
+import time
 from dotenv import load_dotenv
-import yaml
+from dedup import lead_fingerprint
+import geo
+from dbengine import make_engine, database_url, config
 
 load_dotenv()
 
-with open('config.yaml') as f:
-    config = yaml.safe_load(f)
-
-# Ensure data directory exists for SQLite
-import os
-db_url = config['database']['url']
-if db_url.startswith('sqlite:///'):
-    db_path = db_url.replace('sqlite:///', '')
-    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
-engine = create_engine(db_url)
+# One engine (and pool) per process: WAL mode, busy timeout and per-role pool sizing
+engine = make_engine(database_url())
 Session = sessionmaker(bind=engine)
-Base = declarative_base()
+# Rows per fetch for large scans; yield_per streams through a server-side cursor on Postgres
+STREAM_BATCH_SIZE = config['database'].get('stream_batch_size', 500)
+
+class _Model:
+    def to_dict(self, fields=None):
+        """Column values as a JSON-ready dict (datetimes as ISO strings)."""
+        names = fields or [c.key for c in self.__mapper__.column_attrs]
+        result = {}
+        for name in names:
+            value = getattr(self, name)
+            result[name] = value.isoformat() if isinstance(value, (datetime, date)) else value
+        return result
+
+Base = declarative_base(cls=_Model)
 
 class Lead(Base):
     __tablename__ = 'leads'
@@ -27,8 +39,8 @@ class Lead(Base):
     email = Column(String, unique=True)
     phone = Column(String)
     address = Column(String)
-    source_url = Column(String)
-    niche = Column(String)
+    source_url = Column(String, index=True)
+    niche = Column(String, index=True)
     business_type = Column(String)
     business_name = Column(String)
     location = Column(String)
@@ -37,17 +49,255 @@ class Lead(Base):
     email_sent_date = Column(DateTime)
     prototype_created = Column(Boolean, default=False)
     prototype_url = Column(String)
-    status = Column(String, default='new')  # new, contacted, qualified, website_created
+    status = Column(String, default='new', index=True)  # new, contacted, qualified, website_created, duplicate
     notes = Column(String)
     last_contacted = Column(DateTime)
     reply_count = Column(Integer, default=0)
-    conversation_history = Column(JSON, default=list)
+    conversation_history = Column(JSON, default=list)  # legacy; messages live in conversation_messages
+    last_message_role = Column(String)  # denormalized from the newest ConversationMessage
+    last_message_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    fingerprint = Column(String, unique=True, index=True)  # see dedup.lead_fingerprint
+    lat = Column(Float)
+    lon = Column(Float)
+    geohash = Column(String)  # from lat/lon; radius queries scan its prefixes (see geo.py)
+    contact_page = Column(String)  # page the website's contact details were found on (see contact_crawl.py)
+    duplicate_of = Column(Integer, index=True)  # survivor's id when status is 'duplicate' (see resolve.py)
+    # Work-queue lease (see workqueue.py)
+    claimed_by = Column(String)
+    claim_token = Column(String, index=True)
+    claim_expires_at = Column(DateTime, index=True)
+
+    __table_args__ = (
+        # "awaiting a reply" lookups: last_message_role='user' AND status IN (...)
+        Index('ix_leads_last_message_role_status', 'last_message_role', 'status'),
+        # Radius queries: geohash prefix range scans that read lat/lon from the index alone
+        Index('ix_leads_geohash_lat_lon', 'geohash', 'lat', 'lon'),
+    )
+
+class ConversationMessage(Base):
+    __tablename__ = 'conversation_messages'
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer, ForeignKey('leads.id'), nullable=False)
+    seq = Column(Integer, nullable=False)  # 1-based position within the lead's conversation
+    role = Column(String, nullable=False)  # user, assistant
+    content = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_conversation_messages_lead_seq', 'lead_id', 'seq', unique=True),
+    )
+
+class EmailCampaign(Base):
+    __tablename__ = 'emailcampaign'
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer, ForeignKey('leads.id'), nullable=False, index=True)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # pending, sent, opened, clicked
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+class WebsitePrototype(Base):
+    __tablename__ = 'websiteprototype'
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer, ForeignKey('leads.id'), nullable=False, index=True)
+    template_type = Column(String, nullable=False)
+    website_url = Column(String, nullable=False)
+    website_content = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    customizations = Column(String)
+
+class TableVersion(Base):
+    """Change counter per table, bumped by triggers; used for dashboard ETags."""
+    __tablename__ = 'table_versions'
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ProviderSlot(Base):
+    """Request pacing for a provider shared by every process (see ratelimit.SharedTokenBucket)."""
+    __tablename__ = 'provider_slots'
+    provider = Column(String, primary_key=True)
+    next_at = Column(Float, nullable=False, default=0)  # theoretical arrival time, unix seconds
+
+class ProviderQuota(Base):
+    """Calls made to a metered provider API in one budget period (see quota.py)."""
+    __tablename__ = 'provider_quota'
+    provider = Column(String, primary_key=True)
+    period = Column(String, primary_key=True)  # day:YYYY-MM-DD or month:YYYY-MM (UTC)
+    used = Column(Integer, nullable=False, default=0)
+
+class SearchHistory(Base):
+    """Last run and refresh schedule of a discovery query (see search_history.py)."""
+    __tablename__ = 'search_history'
+    key = Column(String, primary_key=True)  # provider + normalized query
+    provider = Column(String, index=True)
+    niche = Column(String)
+    location = Column(String)
+    term = Column(String)
+    runs = Column(Integer, nullable=False, default=0)
+    unproductive_runs = Column(Integer, nullable=False, default=0)  # in a row; sets the backoff
+    last_run_at = Column(DateTime)
+    last_found = Column(Integer)
+    last_new = Column(Integer)
+    digest = Column(String)  # of the fingerprints of the places last returned
+    next_run_at = Column(DateTime, index=True)
+
+class EnrichmentCacheEntry(Base):
+    """Contacts found for a website domain or a business name, shared by all leads (see enrichcache.py)."""
+    __tablename__ = 'enrichment_cache'
+    source = Column(String, primary_key=True)  # site, hunter, brave
+    key = Column(String, primary_key=True)  # registrable domain, or normalized name + location for brave
+    email = Column(String)
+    phone = Column(String)
+    address = Column(String)
+    contact_page = Column(String)
+    found = Column(Boolean, nullable=False, default=False)  # False: negative entry, nothing was found
+    provenance = Column(JSON)  # where the contacts came from (url, query, method)
+    fetched_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)
+    hits = Column(Integer, nullable=False, default=0)  # lookups served from this entry
+    fetches = Column(Integer, nullable=False, default=0)  # lookups that had to (re)fetch
+
+# Tables whose writes bump a change counter (see install_change_tracking)
+TRACKED_TABLES = ['leads']
+
+@event.listens_for(Lead, 'before_insert')
+def _set_fingerprint(mapper, connection, target):
+    if not target.fingerprint:
+        target.fingerprint = lead_fingerprint(target.name, target.address, target.source_url)
+    if target.lat is not None and target.lon is not None and not target.geohash:
+        target.geohash = geo.encode(target.lat, target.lon)
+
+class UnitOfWork:
+    """
+    One transaction for a batch of writes. add() stages new objects and
+    update() queues primary-key updates, which are sent as one executemany per
+    model and column set on flush. Commits once on exit, rolls back on error.
+
+        with UnitOfWork() as uow:
+            for lead_id in ids:
+                uow.update(Lead, lead_id, status='emailed')
+    """
+    def __init__(self, session=None):
+        self._owns_session = session is None
+        self.session = session or Session()
+        self._updates = {}
+
+    def add(self, obj):
+        self.session.add(obj)
+        return obj
+
+    def update(self, model, pk, **values):
+        pk_name = model.__mapper__.primary_key[0].key
+        self._updates.setdefault((model, tuple(sorted(values))), []).append({pk_name: pk, **values})
+
+    def flush(self):
+        for (model, _), rows in self._updates.items():
+            self.session.execute(update(model), rows)
+        self._updates.clear()
+        self.session.flush()
+
+    def commit(self):
+        self.flush()
+        self.session.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.session.rollback()
+        finally:
+            if self._owns_session:
+                self.session.close()
+        return False
 
 def init_db():
+    import stats  # registers the counter tables on Base
     Base.metadata.create_all(engine)
+    install_change_tracking()
+    if stats.STAT_COUNTERS:
+        stats.install_stat_counters()
+
+def install_change_tracking():
+    """
+    Install triggers that bump a table's change counter on every write, including
+    bulk inserts and raw SQL. SQLite keeps the counter in table_versions (writers
+    are serialized anyway); Postgres uses a sequence so writers never contend on it.
+    Counters start at the current time in ms so a reset table never reuses an old value.
+    """
+    start = int(time.time() * 1000)
+    with engine.begin() as conn:
+        for table in TRACKED_TABLES:
+            if engine.dialect.name == 'sqlite':
+                conn.execute(text("INSERT OR IGNORE INTO table_versions (name, version) VALUES (:name, :version)"),
+                             {"name": table, "version": start})
+                for op in ('INSERT', 'UPDATE', 'DELETE'):
+                    conn.execute(text(
+                        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{op.lower()} AFTER {op} ON {table} "
+                        f"BEGIN UPDATE table_versions SET version = version + 1 WHERE name = '{table}'; END"
+                    ))
+            elif engine.dialect.name == 'postgresql':
+                conn.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {table}_version_seq START WITH {start}"))
+                conn.execute(text(
+                    f"CREATE OR REPLACE FUNCTION bump_{table}_version() RETURNS trigger AS $$ "
+                    f"BEGIN PERFORM nextval('{table}_version_seq'); RETURN NULL; END $$ LANGUAGE plpgsql"
+                ))
+                conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_version ON {table}"))
+                conn.execute(text(
+                    f"CREATE TRIGGER trg_{table}_version AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                    f"FOR EACH STATEMENT EXECUTE FUNCTION bump_{table}_version()"
+                ))
+
+def get_table_version(session, table='leads'):
+    """Current change counter for a tracked table, or None if the backend has no tracking."""
+    if engine.dialect.name == 'sqlite':
+        return session.execute(
+            text("SELECT version FROM table_versions WHERE name = :name"), {"name": table}
+        ).scalar()
+    if engine.dialect.name == 'postgresql':
+        return session.execute(text(f"SELECT last_value FROM {table}_version_seq")).scalar()
+    return None
+
+def add_missing_columns(table_name='leads'):
+    """
+    ALTER TABLE ADD COLUMN for model columns missing from an existing table.
+    Only plain nullable columns can be added this way; returns their names.
+    """
+    table = Base.metadata.tables[table_name]
+    existing_columns = {col['name'] for col in inspect(engine).get_columns(table_name)}
+    added = []
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}"))
+            added.append(column.name)
+    return added
+
+def create_missing_indexes():
+    """
+    Create model indexes missing from existing tables (create_all only covers new tables).
+    Indexes on columns a migration has not added yet are skipped.
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if all(col.name in existing_columns for col in index.columns):
+                index.create(engine, checkfirst=True)
 
 if __name__ == '__main__':
-    init_db()
-    print("Database initialized at:", config['database']['url'])
+    # Go through the importable module so tables other modules register
+    # on its Base (e.g. stats.py) are created too
+    import db
+    db.init_db()
+    print("Database initialized at:", engine.url.render_as_string(hide_password=True))
@@ -0,0 +1,94 @@
+"""
+Shared SQLAlchemy engine factory.
+The scheduler (main.py), the Flask dashboard (server.py) and the FastAPI backend
+all open leads.db; this puts SQLite in WAL mode with a busy timeout so readers
+never wait on writers, and sizes the connection pool per process type.
+The process type comes from LEAD_DB_ROLE (scheduler, web, api, worker).
+"""
+import os
+import yaml
+from sqlalchemy import create_engine, event
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(ROOT_DIR, 'config.yaml')
+
+with open(CONFIG_PATH) as f:
+    config = yaml.safe_load(f)
+
+DB_CONFIG = config.get('database', {})
+SQLITE_DEFAULTS = {'journal_mode': 'wal', 'busy_timeout_ms': 5000, 'synchronous': 'normal'}
+POOL_DEFAULTS = {'size': 5, 'overflow': 10}
+
+
+def process_role():
+    return os.getenv('LEAD_DB_ROLE', 'default')
+
+
+def pool_settings(role=None):
+    pools = DB_CONFIG.get('pool', {})
+    settings = dict(POOL_DEFAULTS)
+    settings.update(pools.get(role or process_role(), {}))
+    return settings
+
+
+def sqlite_settings():
+    settings = dict(SQLITE_DEFAULTS)
+    settings.update(DB_CONFIG.get('sqlite', {}))
+    return settings
+
+
+def _is_memory_sqlite(url):
+    return url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in url
+
+
+def database_url():
+    """DATABASE_URL from the environment, else database.url from config.yaml."""
+    return os.getenv('DATABASE_URL') or DB_CONFIG['url']
+
+
+def resolve_url(url):
+    """
+    Anchor relative SQLite paths at the repository root, so processes started
+    from another directory (the backend runs from backend/) open the same file.
+    """
+    if url.startswith('sqlite:///') and not _is_memory_sqlite(url):
+        db_path = url[len('sqlite:///'):]
+        if not os.path.isabs(db_path):
+            return 'sqlite:///' + os.path.join(ROOT_DIR, db_path)
+    return url
+
+
+def make_engine(url=None, role=None, **kwargs):
+    """
+    Create an engine for url (default: database_url()).
+    SQLite connections get journal_mode, synchronous and busy_timeout pragmas.
+    """
+    url = resolve_url(url or database_url())
+    is_sqlite = url.startswith('sqlite')
+    if is_sqlite and not _is_memory_sqlite(url):
+        db_path = url.replace('sqlite:///', '')
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    if not (is_sqlite and _is_memory_sqlite(url)):
+        pool = pool_settings(role)
+        kwargs.setdefault('pool_size', pool['size'])
+        kwargs.setdefault('max_overflow', pool['overflow'])
+    if is_sqlite:
+        pragmas = sqlite_settings()
+        connect_args = kwargs.setdefault('connect_args', {})
+        # Pooled connections are handed between threads by Flask/FastAPI
+        connect_args.setdefault('check_same_thread', False)
+        connect_args.setdefault('timeout', pragmas['busy_timeout_ms'] / 1000.0)
+    else:
+        kwargs.setdefault('pool_pre_ping', True)
+    engine = create_engine(url, **kwargs)
+
+    if is_sqlite:
+        @event.listens_for(engine, 'connect')
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA journal_mode={pragmas['journal_mode']}")
+            cursor.execute(f"PRAGMA synchronous={pragmas['synchronous']}")
+            cursor.execute(f"PRAGMA busy_timeout={int(pragmas['busy_timeout_ms'])}")
+            cursor.close()
+
+    return engine
@@ -0,0 +1,50 @@
+"""
+Normalization helpers used to deduplicate leads.
+A fingerprint is a short hash of the canonical business name plus the address
+(or, when no address is known, the provider place id / source url).
+"""
+import hashlib
+import re
+import unicodedata
+
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(value):
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    if not value:
+        return ''
+    value = str(value)
+    if not value.isascii():
+        value = unicodedata.normalize('NFKD', value)
+        value = ''.join(c for c in value if not unicodedata.combining(c))
+    value = value.lower().replace('&', ' and ')
+    value = _PUNCT_RE.sub(' ', value)
+    return _SPACE_RE.sub(' ', value).strip()
+
+
+def normalize_name(name):
+    return normalize_text(name)
+
+
+def normalize_address(address):
+    return normalize_text(address)
+
+
+def lead_fingerprint(name, address=None, place_ref=None):
+    """
+    Build the dedup fingerprint for a lead.
+    Uses the address when known, otherwise the place id or source url.
+    Returns None when there is nothing to identify the business by.
+    """
+    canonical_name = normalize_name(name)
+    if not canonical_name:
+        return None
+    if address:
+        key = f"{canonical_name}|addr:{normalize_address(address)}"
+    elif place_ref:
+        key = f"{canonical_name}|ref:{str(place_ref).strip().lower()}"
+    else:
+        key = f"{canonical_name}|"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
@@ -0,0 +1,278 @@
+"""
+Concurrent lead discovery.
+Runs many (niche, location) queries at once over async HTTP. Every request
+first takes a token from its provider's bucket (ratelimit.py), so total time
+is set by each provider's rate limit rather than a fixed sleep per query.
+Results are ingested as each query finishes. Responses go through the
+response cache (respcache.py); cache hits do not use a token. Queries that
+ran recently are skipped until search_history.py says they are due again.
+
+Usage: python discovery.py "dental clinics" "Mumbai, India" "Pune, India" [--provider osm|yelp|brave|extract] [--force]
+"""
+import os
+import sys
+import time
+import asyncio
+import inspect
+import argparse
+from collections import namedtuple
+import httpx
+from sqlalchemy import select, func
+from db import Session, Lead
+from ingest import ingest_leads
+from place_finder import (config, PROVIDER, NOMINATIM_SEARCH_URL, osm_place, place_rows, iter_yelp_pages,
+                          find_places_extract)
+from ratelimit import make_bucket, RateLimitedClient
+from respcache import response_cache
+from quota import ledger, ametered, QuotaExceeded
+from search_history import due_queries, record_run, result_digest
+from geotiler import Tile, TileSearch
+
+DISCOVERY_CONFIG = config.get('discovery', {})
+CONCURRENCY = DISCOVERY_CONFIG.get('concurrency', 16)
+TIMEOUT = config['places']['osm'].get('timeout', 10)
+BRAVE_SEARCH_URL = "https://api.search.brave.com/res/v1/web/search"
+TILING = config['places']['osm'].get('tiling', {})
+# Providers that spend another provider's rate budget
+BUCKET_FOR = {'osm_tiles': 'osm'}
+# Where queries go once a metered provider's quota is used up
+FALLBACK = config.get('quotas', {}).get('fallback', {})
+
+# term is what is searched for (defaults to niche); location may be None for free-form terms
+Query = namedtuple('Query', ['niche', 'location', 'term'], defaults=[None])
+
+async def _get_json(client, url, params, headers=None):
+    resp = await client.get(url, params=params, headers=headers)
+    resp.raise_for_status()
+    return resp.json()
+
+def query_text(query):
+    term = query.term or query.niche
+    return f"{term} in {query.location}" if query.location else term
+
+async def fetch_osm(client, query, max_results=None, tile=None):
+    params = {
+        "q": query_text(query),
+        "format": "json",
+        "limit": max_results or config['places']['osm']['max_results'],
+        "addressdetails": 1,
+        "extratags": 1
+    }
+    if tile is not None:
+        # The tile bounds the search, so only the term is searched for
+        params["q"] = query.term or query.niche
+        params["viewbox"] = tile.viewbox()
+        params["bounded"] = 1
+    headers = {"User-Agent": config['places']['osm']['user_agent']}
+    data = await response_cache.afetch('osm', params, lambda: _get_json(client, NOMINATIM_SEARCH_URL, params, headers))
+    return [osm_place(r) for r in data]
+
+async def geocode_bbox(client, location):
+    """Bounding box of a place name from Nominatim, as a Tile (None if not found)."""
+    params = {"q": location, "format": "json", "limit": 1}
+    headers = {"User-Agent": config['places']['osm']['user_agent']}
+    data = await response_cache.afetch('geocode', params, lambda: _get_json(client, NOMINATIM_SEARCH_URL, params, headers))
+    if not data or 'boundingbox' not in data[0]:
+        return None
+    south, north, west, east = (float(v) for v in data[0]['boundingbox'])
+    return Tile(south, west, north, east, 0)
+
+async def fetch_osm_tiles(client, query, max_results=None, bbox=None):
+    """
+    Cover the query's whole area: geocode the location to a bounding box and
+    search it tile by tile (see geotiler.TileSearch), yielding new places per tile.
+    """
+    bbox = bbox or await geocode_bbox(client, query.location)
+    if bbox is None:
+        raise ValueError(f"Could not geocode {query.location}")
+    cap = max_results or config['places']['osm']['max_results']
+    search = TileSearch(lambda tile: fetch_osm(client, query, cap, tile), bbox, cap,
+                        TILING.get('grid', 2), TILING.get('max_depth', 4))
+    async for places in search.run():
+        yield places
+    print(f"Tiled search for {query_text(query)}:\n{search.format_report()}")
+
+def fetch_yelp(client, query, max_results=None):
+    # Async generator: one list of places per result page (see place_finder.iter_yelp_pages)
+    return iter_yelp_pages(client, query.term or query.niche, query.location, max_results=max_results)
+
+async def fetch_brave(client, query, max_results=None):
+    api_key = os.getenv('BRAVE_API_KEY')
+    if not api_key:
+        raise ValueError("BRAVE_API_KEY not set")
+    params = {"q": f"{query_text(query)} contact", "count": min(max_results or 20, 20)}
+    headers = {"Accept": "application/json", "X-Subscription-Token": api_key}
+    data = await response_cache.afetch('brave', params,
+                                       ametered('brave', lambda: _get_json(client, BRAVE_SEARCH_URL, params, headers)))
+    return [{
+        'name': r.get('title'),
+        'address': None,
+        'website': r.get('url'),
+        'place_id': r.get('url'),
+        'location': None
+    } for r in data.get('web', {}).get('results', []) if r.get('title')]
+
+async def fetch_extract(client, query, max_results=None):
+    # Local OSM extract index: no HTTP, so the client (and its bucket) goes unused
+    return await asyncio.to_thread(find_places_extract, query.term or query.niche, query.location,
+                                   None, max_results)
+
+PROVIDERS = {
+    'osm': fetch_osm,
+    'osm_tiles': fetch_osm_tiles,
+    'yelp': fetch_yelp,
+    'brave': fetch_brave,
+    'extract': fetch_extract,
+}
+
+def prioritize(queries):
+    """
+    Order queries by expected yield: (niche, location) pairs with the fewest
+    stored leads first, so untouched locations get the quota before ones
+    that were already searched. Ties keep their order.
+    """
+    pairs = {(q.niche, q.location) for q in queries if q.location}
+    if not pairs:
+        return list(queries)
+    session = Session()
+    try:
+        counts = {(niche, location): n for niche, location, n in session.execute(
+            select(Lead.niche, Lead.location, func.count())
+            .where(Lead.niche.in_({n for n, _ in pairs}), Lead.location.in_({l for _, l in pairs}))
+            .group_by(Lead.niche, Lead.location))}
+    finally:
+        session.close()
+    return sorted(queries, key=lambda q: counts.get((q.niche, q.location), 0))
+
+def serving_provider(provider):
+    """The provider that will serve new queries: provider, or its FALLBACK while its quota is exhausted."""
+    if FALLBACK.get(provider) and ledger.exhausted(provider):
+        print(f"{provider} quota exhausted; using {FALLBACK[provider]}")
+        return FALLBACK[provider]
+    return provider
+
+async def run_queries(queries, provider=None, concurrency=None, client=None, buckets=None, fetch=None):
+    """
+    Run queries concurrently and yield (query, provider, places) as results
+    arrive; provider is the one that served the query.
+    A provider returns either a list of places or an async generator of
+    pages, which are passed on one page at a time. At most `concurrency`
+    queries are in flight and each HTTP request waits for a token from the
+    provider's bucket first. A failed query is reported and skipped; one
+    that runs out of the provider's quota is retried on its FALLBACK provider.
+    """
+    provider = provider or PROVIDER
+    if fetch is None:
+        provider = await asyncio.to_thread(serving_provider, provider)
+    fetch = fetch or PROVIDERS[provider]
+    buckets = buckets if buckets is not None else {}
+    semaphore = asyncio.Semaphore(concurrency or CONCURRENCY)
+    results = asyncio.Queue()
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(timeout=TIMEOUT)
+
+    def limited_client(name):
+        bucket_name = BUCKET_FOR.get(name, name)
+        return RateLimitedClient(client, buckets.setdefault(bucket_name, make_bucket(bucket_name)))
+
+    limited = limited_client(provider)
+
+    async def emit(name, fetch, client, query):
+        result = fetch(client, query)
+        if inspect.isasyncgen(result):
+            async for places in result:
+                await results.put((query, name, places))
+        else:
+            await results.put((query, name, await result))
+
+    async def one(query):
+        async with semaphore:
+            try:
+                try:
+                    await emit(provider, fetch, limited, query)
+                except QuotaExceeded as e:
+                    fallback = FALLBACK.get(provider)
+                    if not fallback:
+                        raise
+                    print(f"{e}; {query_text(query)} goes to {fallback}")
+                    await emit(fallback, PROVIDERS[fallback], limited_client(fallback), query)
+            except Exception as e:
+                print(f"{provider} query failed for {query_text(query)}: {e}")
+            finally:
+                await results.put((query, None, None))  # query finished
+
+    tasks = [asyncio.create_task(one(q)) for q in queries]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            query, name, places = await results.get()
+            if places is None:
+                remaining -= 1
+            else:
+                yield query, name, places
+    finally:
+        for task in tasks:
+            task.cancel()
+        if own_client:
+            await client.aclose()
+
+async def discover(queries, provider=None, concurrency=None, force=False):
+    """
+    Run queries and ingest each result batch as it arrives. Returns (found, added).
+    Queries that ran recently are skipped until their refresh time
+    (search_history.py) unless force is set; completed queries are recorded.
+    """
+    # Whose history decides what is due: the provider that will serve the queries
+    provider = await asyncio.to_thread(serving_provider, provider or PROVIDER)
+    found = added = 0
+    session = Session()
+    try:
+        if not force:
+            due = await asyncio.to_thread(due_queries, session, provider, queries)
+            if len(due) < len(queries):
+                print(f"Skipping {len(queries) - len(due)} of {len(queries)} queries that are not due for a refresh")
+            queries = due
+        # Per query: [places found, new leads, fingerprints, provider that served it] across its pages
+        runs = {}
+        async for query, served_by, places in run_queries(prioritize(queries), provider, concurrency):
+            run = runs.setdefault(query, [0, 0, [], served_by])
+            if served_by != run[3]:
+                # Fell back mid-query: only the fallback's results describe the run
+                run[:] = [0, 0, [], served_by]
+            run[0] += len(places)
+            found += len(places)
+            if places:
+                rows = place_rows(places, query.niche, query.location)
+                run[2].extend(row['fingerprint'] for row in rows)
+                # Dedup and insert off the event loop so requests keep flowing
+                new = await asyncio.to_thread(ingest_leads, session, rows)
+                run[1] += new
+                added += new
+                print(f"{query_text(query)}: {len(places)} found, {new} new")
+        # Failed queries are not recorded, so they are retried next time. Runs a fallback
+        # provider served are recorded under it, so the original provider's schedule is untouched
+        for query, (query_found, query_new, fingerprints, served_by) in runs.items():
+            await asyncio.to_thread(record_run, session, served_by, query, query_found, query_new,
+                                    result_digest(fingerprints))
+    finally:
+        session.close()
+    return found, added
+
+def discover_leads(queries, provider=None, concurrency=None, force=False):
+    """Blocking entry point for the scheduler and scripts."""
+    started = time.monotonic()
+    found, added = asyncio.run(discover(queries, provider, concurrency, force))
+    print(f"Discovery: {len(queries)} queries, {found} places, {added} new leads "
+          f"in {time.monotonic() - started:.1f}s")
+    return added
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run discovery queries concurrently.")
+    parser.add_argument('niche')
+    parser.add_argument('locations', nargs='+')
+    parser.add_argument('--provider', choices=sorted(PROVIDERS))
+    parser.add_argument('--concurrency', type=int)
+    parser.add_argument('--force', action='store_true', help="run queries that are not due for a refresh too")
+    args = parser.parse_args(sys.argv[1:])
+    discover_leads([Query(args.niche, loc) for loc in args.locations], args.provider, args.concurrency, args.force)
@@ -4,6 +4,7 @@ from email.mime.multipart import MIMEMultipart
 import yaml
 import os
 from db import Session, Lead
+from workqueue import drain
 from datetime import datetime
 import re
 import requests
@@ -128,15 +129,13 @@ def send_initial_email(lead, niche=None):
     session.close()
     return success
 
-def email_leads():
-    session = Session()
-    leads = session.query(Lead).filter_by(status='new').all()
-    for lead in leads:
-        if lead.email:
-            send_initial_email(lead)
-        else:
-            print(f"Skipping lead {lead.id} (no email)")
-    session.close()
+def email_leads(worker_id=None):
+    """
+    Send initial emails to new leads that have an address.
+    Leads are claimed in leased batches (see workqueue.py), so several
+    processes can run this at once without emailing a lead twice.
+    """
+    return drain('email', lambda session, lead: send_initial_email(lead), worker_id=worker_id)
 
 if __name__ == '__main__':
     email_leads()
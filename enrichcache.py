@@ -0,0 +1,202 @@
+"""
+Enrichment results shared across leads.
+Chains and multi-branch clinics share one website, so the contacts found for
+it are cached per registrable domain (site crawls, Hunter) and per
+normalized business name plus location (Brave). Entries live in the
+enrichment_cache table, so every worker on the database shares them. Each
+entry records where its contacts came from. Found contacts are kept for
+enrich.cache.ttl seconds, and "nothing found" for negative_ttl. A lookup
+that raises (a network error, quota.QuotaExceeded) is not cached. Each entry
+counts the lookups it served (hits) and the fetches that filled it, which
+gives the hit rate per source.
+
+Usage: python enrichcache.py [stats] | clear [source]
+"""
+import sys
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from sqlalchemy import select, update, delete, func, case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from db import engine, config, EnrichmentCacheEntry
+from dedup import normalize_name, normalize_text
+from ratelimit import host_of
+from resolve import LISTING_DOMAINS
+
+CACHE_CONFIG = config['enrich'].get('cache', {})
+TTL = CACHE_CONFIG.get('ttl', 30 * 86400)
+NEGATIVE_TTL = CACHE_CONFIG.get('negative_ttl', 7 * 86400)
+CONTACT_FIELDS = ('email', 'phone', 'address', 'contact_page')
+
+# Public suffixes with two labels; the registrable domain is one label more
+MULTI_PART_SUFFIXES = {
+    'co.in', 'net.in', 'org.in', 'firm.in', 'gen.in', 'ind.in', 'co.uk', 'org.uk', 'ltd.uk', 'plc.uk', 'me.uk',
+    'com.au', 'net.au', 'org.au', 'co.nz', 'org.nz', 'co.za', 'com.sg', 'com.my', 'com.br', 'com.mx', 'com.ar',
+    'com.tr', 'co.jp', 'co.kr', 'com.cn', 'com.hk', 'com.pk', 'com.bd', 'com.ng', 'co.ke', 'com.ph', 'co.id',
+}
+# Hosts where every user has their own site under one domain; the full host and path identify it
+SHARED_HOSTS = LISTING_DOMAINS | {
+    'wixsite.com', 'business.site', 'blogspot.com', 'wordpress.com', 'github.io', 'weebly.com',
+    'square.site', 'godaddysites.com', 'webflow.io', 'netlify.app', 'vercel.app', 'sites.google.com',
+}
+
+
+def domain_key(url):
+    """Registrable domain of a URL (clinic.co.in for www.branch.clinic.co.in); None if there is none."""
+    host = host_of(url) if '://' in url else url.lower().split('/')[0].split(':')[0]
+    if host.startswith('www.'):
+        host = host[4:]
+    if not host or '.' not in host:
+        return None
+    if any(host == d or host.endswith('.' + d) for d in SHARED_HOSTS):
+        # Pages on listing and site-builder hosts belong to different businesses
+        path = urlparse(url).path.strip('/') if '://' in url else ''
+        return f"{host}/{path}" if path else host
+    if host.replace('.', '').isdigit():
+        return host
+    labels = host.split('.')
+    size = 3 if '.'.join(labels[-2:]) in MULTI_PART_SUFFIXES and len(labels) > 2 else 2
+    return '.'.join(labels[-size:])
+
+
+def name_key(name, location=None):
+    """Key for a business-name lookup: normalized name, plus the location it was searched in."""
+    name = normalize_name(name)
+    if not name:
+        return None
+    location = normalize_text(location)
+    return f"{name}|{location}" if location else name
+
+
+class EnrichmentCache:
+    def __init__(self, ttl=None, negative_ttl=None):
+        self.ttl = ttl if ttl is not None else TTL
+        self.negative_ttl = negative_ttl if negative_ttl is not None else NEGATIVE_TTL
+        self._ready = False
+        # One fetch per key at a time in this process; other threads wait for it and get a hit.
+        # {(source, key): [lock, threads using it]}, dropped when the last one is done
+        self._key_locks = {}
+        self._locks_lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        self.counts = {}  # {source: {'hits': n, 'misses': n}} for lookups made by this process
+
+    def _ensure_table(self):
+        if not self._ready:
+            EnrichmentCacheEntry.__table__.create(engine, checkfirst=True)
+            self._ready = True
+
+    def _count(self, source, outcome):
+        with self._counts_lock:
+            counts = self.counts.setdefault(source, {'hits': 0, 'misses': 0})
+            counts[outcome] += 1
+
+    def get(self, source, key, now=None):
+        """Contacts of an unexpired entry ({} for a negative one), or None if there is none."""
+        self._ensure_table()
+        table = EnrichmentCacheEntry.__table__
+        with engine.begin() as conn:
+            row = conn.execute(
+                select(*(table.c[field] for field in CONTACT_FIELDS))
+                .where(table.c.source == source, table.c.key == key, table.c.expires_at > (now or datetime.utcnow()))
+            ).first()
+            if row is None:
+                return None
+            conn.execute(update(table).where(table.c.source == source, table.c.key == key)
+                         .values(hits=table.c.hits + 1))
+        return {field: value for field, value in zip(CONTACT_FIELDS, row) if value}
+
+    def set(self, source, key, contacts, provenance=None, now=None):
+        """Store what a fetch found; an entry without any contact is a negative one."""
+        self._ensure_table()
+        now = now or datetime.utcnow()
+        contacts = {field: contacts.get(field) or None for field in CONTACT_FIELDS}
+        found = any(contacts[field] for field in ('email', 'phone', 'address'))
+        values = dict(contacts, found=found, provenance=provenance, fetched_at=now,
+                      expires_at=now + timedelta(seconds=self.ttl if found else self.negative_ttl))
+        table = EnrichmentCacheEntry.__table__
+        with engine.begin() as conn:
+            if engine.dialect.name in ('sqlite', 'postgresql'):
+                dialect_insert = sqlite_insert if engine.dialect.name == 'sqlite' else pg_insert
+                statement = dialect_insert(table).values(source=source, key=key, hits=0, fetches=1, **values)
+                conn.execute(statement.on_conflict_do_update(
+                    index_elements=[table.c.source, table.c.key],
+                    set_=dict(values, fetches=table.c.fetches + 1)))
+                return
+            updated = conn.execute(update(table).where(table.c.source == source, table.c.key == key)
+                                   .values(fetches=table.c.fetches + 1, **values)).rowcount
+            if not updated:
+                conn.execute(table.insert().values(source=source, key=key, hits=0, fetches=1, **values))
+
+    def lookup(self, source, key, fetch):
+        """
+        Cached contacts for (source, key), calling fetch() on a miss. fetch
+        returns (contacts, provenance); contacts is a dict of CONTACT_FIELDS.
+        Without a key nothing is cached.
+        """
+        if not key:
+            contacts, _ = fetch()
+            return {field: value for field, value in contacts.items() if value}
+        with self._locks_lock:
+            entry = self._key_locks.setdefault((source, key), [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                contacts = self.get(source, key)
+                if contacts is not None:
+                    self._count(source, 'hits')
+                    return contacts
+                self._count(source, 'misses')
+                contacts, provenance = fetch()
+                self.set(source, key, contacts, provenance)
+        finally:
+            with self._locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[(source, key)]
+        return {field: value for field, value in contacts.items() if value}
+
+    def stats(self):
+        """Per source: entries, found, expired, hits, fetches and hit rate over the entries' lifetime."""
+        self._ensure_table()
+        table = EnrichmentCacheEntry.__table__
+        now = datetime.utcnow()
+        statement = select(
+            table.c.source, func.count(), func.sum(case((table.c.found, 1), else_=0)),
+            func.sum(case((table.c.expires_at <= now, 1), else_=0)), func.sum(table.c.hits), func.sum(table.c.fetches),
+        ).group_by(table.c.source)
+        result = {}
+        with engine.connect() as conn:
+            for source, entries, found, expired, hits, fetches in conn.execute(statement):
+                lookups = (hits or 0) + (fetches or 0)
+                result[source] = {'entries': entries, 'found': found or 0, 'expired': expired or 0,
+                                  'hits': hits or 0, 'fetches': fetches or 0,
+                                  'hit_rate': (hits or 0) / lookups if lookups else 0.0}
+        return result
+
+    def summary(self):
+        """One line of this process's hits and misses per source."""
+        with self._counts_lock:
+            parts = [f"{source} {c['hits']}/{c['hits'] + c['misses']} hits" for source, c in sorted(self.counts.items())]
+        return ', '.join(parts) or 'no lookups'
+
+    def clear(self, source=None):
+        self._ensure_table()
+        statement = delete(EnrichmentCacheEntry)
+        if source:
+            statement = statement.where(EnrichmentCacheEntry.source == source)
+        with engine.begin() as conn:
+            return conn.execute(statement).rowcount
+
+
+# Process-wide cache used by every enrichment path
+enrichment_cache = EnrichmentCache()
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    if command == 'clear':
+        print(f"Removed {enrichment_cache.clear(sys.argv[2] if len(sys.argv) > 2 else None)} entries")
+    else:
+        for source, s in sorted(enrichment_cache.stats().items()):
+            print(f"{source:<7} entries {s['entries']:>6}  found {s['found']:>6}  expired {s['expired']:>6}  "
+                  f"hits {s['hits']:>7}  fetches {s['fetches']:>6}  hit rate {s['hit_rate'] * 100:5.1f}%")
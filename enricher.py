@@ -1,11 +1,16 @@
 import os
 import yaml
 import requests
-from db import Session, Lead
+from db import Session, Lead, UnitOfWork, STREAM_BATCH_SIZE
+from workqueue import EXPECTED_YIELD
 from datetime import datetime
 import time
 import re
 from urllib.parse import urlparse
+from respcache import response_cache
+from quota import metered, QuotaExceeded
+from enrichcache import enrichment_cache, domain_key
+from enrichment_agent import site_contacts
 
 with open('config.yaml') as f:
     config = yaml.safe_load(f)
@@ -28,24 +33,15 @@ def guess_email_from_name(name, domain):
         email = pattern.format(first=first, last=last, domain=domain)
         yield email
 
-def scrape_website_for_email(website_url):
+def scrape_website_for_email(website_url, hint_url=None):
     """
-    Scrape a website homepage for email addresses.
+    Crawl a website (homepage and likely contact pages, see contact_crawl.py) for an email address.
+    Shares the per-domain results of enrichment_agent.site_contacts, so a site is crawled once per TTL.
     """
     if not website_url:
         return None
     try:
-        resp = requests.get(website_url, timeout=config['enrich']['scrape_timeout'])
-        resp.raise_for_status()
-        html = resp.text
-        # Find email-like strings
-        emails = re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', html)
-        if emails:
-            # Return first found that looks like contact email
-            for email in emails:
-                if 'contact' in email or 'info' in email or 'hello' in email:
-                    return email
-            return emails[0]
+        return site_contacts(website_url, hint_url).get('email')
     except Exception as e:
         print(f"Scrape error {website_url}: {e}")
     return None
@@ -79,14 +75,26 @@ def find_email(lead):
         if not api_key or not domain:
             return None
         url = "https://api.hunter.io/v2/domain-search"
-        params = {"domain": domain, "api_key": api_key, "limit": 1}
-        try:
-            resp = requests.get(url, params=params, timeout=10)
+        # One Hunter search per registrable domain: branch subdomains and www share it
+        domain = domain_key(domain) or domain
+        params = {"domain": domain, "limit": 1}
+
+        def fetch():
+            resp = requests.get(url, params=dict(params, api_key=api_key), timeout=10)
             resp.raise_for_status()
-            data = resp.json()
+            return resp.json()
+
+        def lookup():
+            # Cached per domain (without the key); misses spend the monthly Hunter budget
+            data = response_cache.fetch('hunter', params, metered('hunter', fetch))
             emails = data.get('data', {}).get('emails', [])
-            if emails:
-                return emails[0].get('value')
+            email = emails[0].get('value') if emails else None
+            return {'email': email}, {'method': 'hunter', 'domain': domain,
+                                      'confidence': emails[0].get('confidence') if emails else None}
+        try:
+            return enrichment_cache.lookup('hunter', domain, lookup).get('email')
+        except QuotaExceeded as e:
+            print(f"Skipping Hunter lookup for {domain}: {e}")
         except Exception as e:
             print(f"Hunter error for {domain}: {e}")
         return None
@@ -101,21 +109,25 @@ def find_email(lead):
 
     elif ENRICH_METHOD == 'scrape':
         if source and source.startswith('http'):
-            return scrape_website_for_email(source)
+            return scrape_website_for_email(source, lead.contact_page)
         return None
     else:
         return None
 
 def enrich_leads():
     session = Session()
-    leads = session.query(Lead).filter_by(email=None).all()
-    for lead in leads:
-        email = find_email(lead)
-        if email:
-            lead.email = email
-            print(f"Enriched lead {lead.id} with email {email}")
-        time.sleep(1)  # be polite
-    session.commit()
+    # Stream instead of loading every lead without an email
+    # Leads with a website first: they are the likeliest to yield an email per paid lookup
+    leads = (session.query(Lead).filter_by(email=None)
+             .order_by(EXPECTED_YIELD['enrich'](), Lead.id).yield_per(STREAM_BATCH_SIZE))
+    # Found emails go out as one batched UPDATE when the scan is done
+    with UnitOfWork() as uow:
+        for lead in leads:
+            email = find_email(lead)
+            if email:
+                uow.update(Lead, lead.id, email=email)
+                print(f"Enriched lead {lead.id} with email {email}")
+            time.sleep(1)  # be polite
     session.close()
 
 if __name__ == '__main__':
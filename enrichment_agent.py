@@ -4,18 +4,26 @@ Finds correct email, phone, and verifies address using web search and website sc
 """
 import os
 import yaml
-import re
 import requests
 from db import Session, Lead
+from workqueue import drain_pool
+from ratelimit import domain_throttle, host_of
+from contact_crawl import crawl_contacts, extract_contacts
+import contact_extract
+from browser_pool import browser_pool, BrowserUnavailable
+from respcache import response_cache
+from enrichcache import enrichment_cache, domain_key, name_key
+from quota import metered, QuotaExceeded
 from datetime import datetime
 from urllib.parse import urlparse
-import time
 
 with open('config.yaml') as f:
     config = yaml.safe_load(f)
 
 BRAVE_API_KEY = os.getenv('BRAVE_API_KEY')
 PATTERNS = config['enrich']['patterns']
+# Leads enriched at once; each site still gets one request per enrich.politeness.interval
+CONCURRENCY = config['enrich'].get('concurrency', 8)
 
 def guess_email_from_name(name, domain):
     """
@@ -26,15 +34,7 @@ def guess_email_from_name(name, domain):
     yield  # unreachable
 
 def extract_phone_from_text(text):
-    phones = re.findall(r'(?:\+?91)?[6-9]\d{9}', text)
-    if phones:
-        seen = set()
-        for p in phones:
-            p_clean = re.sub(r'[^\d+]', '', p)
-            if p_clean not in seen:
-                seen.add(p_clean)
-                return p_clean
-    return None
+    return contact_extract.best(text)[1]
 
 def search_brave_for_contact(business_name, location_hint=None):
     """
@@ -52,146 +52,158 @@ def search_brave_for_contact(business_name, location_hint=None):
         "X-Subscription-Token": BRAVE_API_KEY
     }
     params = {"q": query, "count": 10}
-    try:
+
+    def fetch():
+        domain_throttle.wait(url)
         resp = requests.get(url, headers=headers, params=params, timeout=10)
         resp.raise_for_status()
-        data = resp.json()
-        email = None
-        phone = None
-        address = None
-        for result in data.get('web', {}).get('results', []):
-            snippet = result.get('description', '')
-            # Extract email
-            if not email:
-                emails = re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', snippet)
-                if emails:
-                    for e in emails:
-                        if 'contact' in e or 'info' in e or 'hello' in e:
-                            email = e
-                            break
-                    if not email:
-                        email = emails[0]
-            # Extract phone
-            if not phone:
-                phone = extract_phone_from_text(snippet)
-            # Extract address (simple heuristic: lines with digits and city/state keywords)
-            if not address:
-                # Look for a line that looks like an address
-                lines = snippet.split(',')
-                for line in lines:
-                    if re.search(r'\d{1,5} [\w\s]+ (street|st|road|rd|avenue|ave|lane|ln|block|sector|phase)', line, re.IGNORECASE):
-                        address = line.strip()
-                        break
-            if email and phone and address:
-                break
-        return email, phone, address
+        return resp.json()
+
+    def lookup():
+        # Spends the monthly Brave budget only on cache misses
+        data = response_cache.fetch('brave', params, metered('brave', fetch))
+        # All snippets in one pass; a value repeated across results ranks higher
+        snippets = '\n'.join(result.get('description', '') for result in data.get('web', {}).get('results', []))
+        email, phone, address, _ = contact_extract.best(snippets)
+        return {'email': email, 'phone': phone, 'address': address}, {'method': 'brave', 'query': query}
+    try:
+        # Branches searched under the same name and location share one lookup
+        found = enrichment_cache.lookup('brave', name_key(business_name, location_hint), lookup)
+        return found.get('email'), found.get('phone'), found.get('address')
+    except QuotaExceeded as e:
+        print(f"Skipping Brave lookup for {business_name}: {e}")
+        return None, None, None
     except Exception as e:
         print(f"Brave search error: {e}")
         return None, None, None
 
-def scrape_website(url):
+class SiteUnreachable(Exception):
+    """A website found nothing because it could not be fetched; worth another try soon."""
+
+def scrape_website(url, hint_url=None):
     """
-    Scrape a website for email and phone.
-    Tries simple requests first; if that fails or yields no contact info, uses Playwright (headless Chromium).
+    Scrape a website for email and phone. Returns (email, phone, page they came from).
+    Crawls the homepage and its likeliest contact pages within the enrich.crawl
+    budget (contact_crawl.py), starting at hint_url if given. If that finds
+    nothing, renders the page in the shared headless Chromium (browser_pool.py).
+    Raises SiteUnreachable if nothing was found and some pages could not be
+    fetched, so an outage is not taken for a site without contact details.
     """
-    # First try simple requests
-    try:
-        resp = requests.get(url, timeout=10)
-        if resp.status_code == 200:
-            html = resp.text
-            emails = re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', html)
-            phone = extract_phone_from_text(html)
-            email = None
-            if emails:
-                for e in emails:
-                    if 'contact' in e or 'info' in e or 'hello' in e:
-                        email = e
-                        break
-                if not email:
-                    email = emails[0]
-            if email or phone:
-                return email, phone
-    except Exception:
-        pass
+    result = crawl_contacts(url, hint_url)
+    if result.email or result.phone:
+        return result.email, result.phone, result.email_page or result.phone_page
 
-    # Fallback to Playwright for JS-rendered pages
+    # Fallback to headless Chromium for JS-rendered pages (a pooled browser, see browser_pool.py)
     try:
-        from playwright.sync_api import sync_playwright
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(url, timeout=15000)
-            html = page.content()
-            browser.close()
-        emails = re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', html)
-        phone = extract_phone_from_text(html)
-        email = None
-        if emails:
-            for e in emails:
-                if 'contact' in e or 'info' in e or 'hello' in e:
-                    email = e
-                    break
-            if not email:
-                email = emails[0]
-        return email, phone
-    except Exception:
+        domain_throttle.wait(url)
+        html = browser_pool.render(url)
+        email, phone, _ = extract_contacts(html, host_of(url))
+        return email, phone, url if email or phone else None
+    except BrowserUnavailable:
         pass
-    return None, None
+    except Exception as e:
+        print(f"Browser fetch failed for {url}: {e}")
+        raise SiteUnreachable(f"{url}: {e}") from e
+    if result.errors:
+        raise SiteUnreachable(f"{url}: {result.errors} of {result.errors + result.pages} pages failed")
+    return None, None, None
 
-def enrich_lead(lead):
-    updated = False
+def site_contacts(url, hint_url=None):
+    """
+    Contacts on a business website as a dict (email, phone, contact_page).
+    Sites are crawled once per registrable domain per enrich.cache.ttl
+    (enrichcache.py), so the branches of a chain share one crawl. Raises
+    SiteUnreachable (nothing is cached) when the site could not be fetched.
+    """
+    def fetch():
+        email, phone, page = scrape_website(url, hint_url)
+        return ({'email': email, 'phone': phone, 'contact_page': page},
+                {'method': 'crawl', 'url': url, 'contact_page': page})
+    return enrichment_cache.lookup('site', domain_key(url), fetch)
+
+def find_contacts(lead):
+    """
+    Look up missing contact details for a lead (a dict of column values).
+    Returns the fields found that the lead does not have yet. Makes network
+    calls only, so it can run on any thread.
+    """
+    found = {}
     # If we have a website, scrape it first
-    if lead.source_url and lead.source_url.startswith('http'):
-        email, phone = scrape_website(lead.source_url)
-        if email and not lead.email:
-            lead.email = email
-            updated = True
-        if phone and not lead.phone:
-            lead.phone = phone
-            updated = True
+    source_url = lead.get('source_url')
+    if source_url and source_url.startswith('http'):
+        try:
+            site = site_contacts(source_url, lead.get('contact_page'))
+        except SiteUnreachable as e:
+            # Not cached; the next enrichment of the lead tries the site again
+            print(f"Site unreachable for lead {lead.get('id')}: {e}")
+            site = {}
+        if site.get('email') and not lead.get('email'):
+            found['email'] = site['email']
+        if site.get('phone') and not lead.get('phone'):
+            found['phone'] = site['phone']
+        if site.get('contact_page'):
+            found['contact_page'] = site['contact_page']
 
     # If still missing info, use Brave Search with business name and address/location hint
-    if not lead.email or not lead.phone:
+    if not (lead.get('email') or found.get('email')) or not (lead.get('phone') or found.get('phone')):
         location_hint = None
-        if lead.address:
+        if lead.get('address'):
             # Extract city/region from address (simple: take last 2 comma parts)
-            parts = lead.address.split(',')
+            parts = lead['address'].split(',')
             if len(parts) >= 2:
                 location_hint = parts[-2].strip() + ' ' + parts[-1].strip()
-        email, phone, addr = search_brave_for_contact(lead.name, location_hint)
-        if email and not lead.email:
-            lead.email = email
-            updated = True
-        if phone and not lead.phone:
-            lead.phone = phone
-            updated = True
-        if addr and not lead.address:
-            lead.address = addr
-            updated = True
+        email, phone, addr = search_brave_for_contact(lead.get('name'), location_hint)
+        if email and not (lead.get('email') or found.get('email')):
+            found['email'] = email
+        if phone and not (lead.get('phone') or found.get('phone')):
+            found['phone'] = phone
+        if addr and not lead.get('address'):
+            found['address'] = addr
 
     # Do NOT guess emails. Only use verified ones from scraping or search.
+    return found
+
+def apply_contacts(lead, found):
+    """Set the found fields that the lead is still missing; True if any was set."""
+    updated = False
+    for field in ('email', 'phone', 'address'):
+        value = found.get(field)
+        if value and not getattr(lead, field):
+            setattr(lead, field, value)
+            updated = True
+    if found.get('contact_page'):
+        # Where the site's details were; the next enrichment starts there
+        lead.contact_page = found['contact_page']
     return updated
 
-def enrich_pending_leads():
-    session = Session()
-    leads = session.query(Lead).filter(
-        (Lead.email.is_(None)) | (Lead.phone.is_(None))
-    ).filter(
-        Lead.status.in_(['new', 'emailed', 'replied_yes', 'in_conversation', 'prototype_sent'])
-    ).all()
-    for lead in leads:
-        try:
-            updated = enrich_lead(lead)
-            if updated:
-                print(f"Enriched lead {lead.id}: email={lead.email}, phone={lead.phone}, address={lead.address}")
-            else:
-                print(f"No enrichment found for lead {lead.id}")
-        except Exception as e:
-            print(f"Error enriching lead {lead.id}: {e}")
-        time.sleep(2)  # be polite
-    session.commit()
-    session.close()
-    return len(leads)
+def enrich_lead(lead):
+    return apply_contacts(lead, find_contacts(lead.to_dict()))
+
+def _apply_enrichment(session, lead, found):
+    email = found.get('email')
+    if email and session.query(Lead.id).filter(Lead.email == email, Lead.id != lead.id).first():
+        # Branches of one business share a site; the address belongs to the lead that has it
+        found = {k: v for k, v in found.items() if k != 'email'}
+    updated = apply_contacts(lead, found)
+    if updated:
+        print(f"Enriched lead {lead.id}: email={lead.email}, phone={lead.phone}, address={lead.address}")
+    else:
+        print(f"No enrichment found for lead {lead.id}")
+    return updated
+
+def enrich_pending_leads(worker_id=None, concurrency=None):
+    """
+    Enrich leads missing an email or phone. Leads are claimed in leased
+    batches (see workqueue.py), so several workers can split the backlog;
+    leads with nothing found are held back until the next retry window.
+    Up to `concurrency` leads are looked up at once; requests to the same
+    site are spaced out per host (ratelimit.domain_throttle) rather than
+    by a global sleep.
+    """
+    count = drain_pool('enrich', find_contacts, _apply_enrichment, worker_id=worker_id,
+                       concurrency=concurrency or CONCURRENCY)
+    print(f"Enrichment cache: {enrichment_cache.summary()}")
+    return count
 
 def run():
     count = enrich_pending_leads()
@@ -0,0 +1,136 @@
+"""
+Geohash encoding and radius queries over lead coordinates.
+Leads store lat/lon plus a geohash (GEOHASH_PRECISION characters, ~5 m).
+A radius query covers the circle's bounding box with a few geohash cells
+and turns each cell into a range scan on the indexed geohash column
+(every point inside a cell shares the cell's prefix). The candidates are
+then filtered by exact haversine distance, so only rows near the circle
+are ever read.
+"""
+import math
+from sqlalchemy import select, or_, and_
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+GEOHASH_PRECISION = 9
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Prefix ranges per query; more cells hug the circle tighter but add range scans
+MAX_CELLS = 16
+# Keep IN (...) lists under SQLite's bound-parameter limit
+LOAD_CHUNK = 500
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = value = 0
+    even = True  # geohash bits alternate lon, lat, starting with lon
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = value * 2 + 1
+                lon_lo = mid
+            else:
+                value *= 2
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = value * 2 + 1
+                lat_lo = mid
+            else:
+                value *= 2
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(lat degrees, lon degrees) of a geohash cell."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(lat, lon, km, max_cells=MAX_CELLS):
+    """
+    Geohash prefixes whose cells cover the circle's bounding box, at the
+    finest precision that needs at most max_cells cells.
+    """
+    dlat = km / KM_PER_DEGREE
+    dlon = min(km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01)), 180.0)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    west, east = lon - dlon, lon + dlon
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(north / height) - math.floor(south / height) + 1
+        cols = math.floor(east / width) - math.floor(west / width) + 1
+        if rows * cols <= max_cells or precision == 1:
+            break
+    cells = set()
+    for i in range(rows):
+        cell_lat = min((math.floor(south / height) + i + 0.5) * height, 89.999999)
+        for j in range(cols):
+            cell_lon = (math.floor(west / width) + j + 0.5) * width
+            cell_lon = (cell_lon + 180.0) % 360.0 - 180.0  # wrap across the antimeridian
+            cells.add(encode(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def place_point(place):
+    """(lat, lon) from a place dict's location (Nominatim lat/lon or Yelp latitude/longitude)."""
+    location = place.get('location') or {}
+    lat = location.get('lat', location.get('latitude'))
+    lon = location.get('lon', location.get('longitude'))
+    if lat is None or lon is None:
+        return None, None
+    return float(lat), float(lon)
+
+
+def near_clause(column, lat, lon, km, max_cells=MAX_CELLS):
+    """OR of geohash range conditions covering a circle (each is an index range scan)."""
+    # '{' sorts right after 'z', the last geohash character
+    return or_(*[and_(column >= cell, column < cell + '{') for cell in covering_cells(lat, lon, km, max_cells)])
+
+
+def ids_near(session, lat, lon, km, niche=None):
+    """(lead id, distance_km) pairs within km of (lat, lon), nearest first."""
+    from db import Lead
+    # Only index columns are read: (geohash, lat, lon) covers the scan
+    statement = select(Lead.id, Lead.lat, Lead.lon).where(near_clause(Lead.geohash, lat, lon, km))
+    if niche:
+        statement = statement.where(Lead.niche == niche)
+    results = []
+    for lead_id, plat, plon in session.execute(statement):
+        distance = haversine_km(lat, lon, plat, plon)
+        if distance <= km:
+            results.append((lead_id, distance))
+    results.sort(key=lambda r: r[1])
+    return results
+
+
+def leads_near(session, lat, lon, km, limit=None, niche=None):
+    """Leads within km of (lat, lon), nearest first, as (lead, distance_km) pairs."""
+    from db import Lead
+    nearest = ids_near(session, lat, lon, km, niche)[:limit]
+    # Full rows only for the leads returned
+    ids = [lead_id for lead_id, _ in nearest]
+    leads = {}
+    for start in range(0, len(ids), LOAD_CHUNK):
+        for lead in session.execute(select(Lead).where(Lead.id.in_(ids[start:start + LOAD_CHUNK]))).scalars():
+            leads[lead.id] = lead
+    return [(leads[lead_id], distance) for lead_id, distance in nearest if lead_id in leads]
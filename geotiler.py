@@ -0,0 +1,122 @@
+"""
+Adaptive geographic tiling for exhaustive area searches.
+Providers cap the results of one query (Nominatim returns at most `limit`
+places per viewbox), so one query over a whole city returns the same top
+results every time. TileSearch splits the area into a grid and searches each
+tile. A tile whose results hit the cap is split into four quadrants and
+searched again, quadtree style, until results fit or max_depth is reached.
+Places are deduplicated across tiles and calls are reported per depth.
+"""
+import asyncio
+import math
+from collections import namedtuple
+
+KM_PER_DEGREE = 111.32
+
+
+class Tile(namedtuple('Tile', ['south', 'west', 'north', 'east', 'depth'])):
+    __slots__ = ()
+
+    def viewbox(self):
+        """Nominatim viewbox: lon1,lat1,lon2,lat2."""
+        return f"{self.west},{self.north},{self.east},{self.south}"
+
+    def split(self):
+        mid_lat = (self.south + self.north) / 2
+        mid_lon = (self.west + self.east) / 2
+        depth = self.depth + 1
+        return [
+            Tile(self.south, self.west, mid_lat, mid_lon, depth),
+            Tile(self.south, mid_lon, mid_lat, self.east, depth),
+            Tile(mid_lat, self.west, self.north, mid_lon, depth),
+            Tile(mid_lat, mid_lon, self.north, self.east, depth),
+        ]
+
+
+def bbox_around(lat, lon, radius_km):
+    """Tile covering a radius around a point."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    return Tile(lat - dlat, lon - dlon, lat + dlat, lon + dlon, 0)
+
+
+def grid(bbox, size):
+    """Split a bbox into size x size depth-0 tiles."""
+    dlat = (bbox.north - bbox.south) / size
+    dlon = (bbox.east - bbox.west) / size
+    return [Tile(bbox.south + i * dlat, bbox.west + j * dlon,
+                 bbox.south + (i + 1) * dlat, bbox.west + (j + 1) * dlon, 0)
+            for i in range(size) for j in range(size)]
+
+
+def place_key(place):
+    return place.get('place_id') or (place.get('name'), place.get('address'))
+
+
+class TileSearch:
+    """
+    Search a bbox tile by tile. fetch_tile(tile) is an async callable returning
+    the provider's places for that tile; `cap` is the provider's per-query
+    result limit. run() yields the new places of each tile as it finishes;
+    report holds calls, places, new places and split tiles per depth.
+    """
+
+    def __init__(self, fetch_tile, bbox, cap, grid_size=2, max_depth=4):
+        self.fetch_tile = fetch_tile
+        self.bbox = bbox
+        self.cap = cap
+        self.grid_size = grid_size
+        self.max_depth = max_depth
+        self.seen = set()
+        self.report = {}
+
+    def _stats(self, depth):
+        return self.report.setdefault(depth, {'calls': 0, 'places': 0, 'new': 0, 'split': 0})
+
+    async def _fetch(self, tile):
+        try:
+            return tile, await self.fetch_tile(tile)
+        except Exception as e:
+            print(f"Tile {tile.viewbox()} failed: {e}")
+            return tile, []
+
+    async def run(self):
+        # Capped tiles are split as soon as their results are in; the
+        # provider's bucket paces the requests
+        pending = {asyncio.ensure_future(self._fetch(tile)) for tile in grid(self.bbox, self.grid_size)}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    tile, places = future.result()
+                    stats = self._stats(tile.depth)
+                    stats['calls'] += 1
+                    stats['places'] += len(places)
+                    new = []
+                    for place in places:
+                        key = place_key(place)
+                        if key not in self.seen:
+                            self.seen.add(key)
+                            new.append(place)
+                    stats['new'] += len(new)
+                    if len(places) >= self.cap and tile.depth < self.max_depth:
+                        # Capped: there may be more places here than one query returns
+                        stats['split'] += 1
+                        pending.update(asyncio.ensure_future(self._fetch(child)) for child in tile.split())
+                    if new:
+                        yield new
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @property
+    def calls(self):
+        return sum(stats['calls'] for stats in self.report.values())
+
+    def format_report(self):
+        lines = [f"{'depth':>5} {'calls':>6} {'places':>7} {'new':>6} {'split':>6}"]
+        for depth in sorted(self.report):
+            s = self.report[depth]
+            lines.append(f"{depth:>5} {s['calls']:>6} {s['places']:>7} {s['new']:>6} {s['split']:>6}")
+        lines.append(f"{len(self.seen)} unique places in {self.calls} calls")
+        return '\n'.join(lines)
@@ -0,0 +1,190 @@
+"""
+Set-based ingest of discovery results.
+Resolves duplicates for a whole batch with one fingerprint query and inserts
+the new rows with a single executemany (on Postgres: COPY into a temp table,
+then one INSERT ... SELECT ... ON CONFLICT DO NOTHING).
+"""
+import io
+import json
+from datetime import date, datetime
+from sqlalchemy import JSON, insert, select
+from db import Lead
+from dedup import lead_fingerprint
+import geo
+
+# Keep IN (...) lists under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+
+def _insert_ignore(table, dialect_name):
+    """INSERT that skips rows violating a unique constraint (fingerprint or email)."""
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+
+def _apply_defaults(table, row):
+    """Fill Python-side column defaults, which COPY does not run."""
+    for column in table.columns:
+        if column.name in row or column.default is None or column.primary_key:
+            continue
+        if column.default.is_scalar:
+            row[column.name] = column.default.arg
+        elif column.default.is_callable:
+            row[column.name] = column.default.arg(None)
+    return row
+
+
+def _copy_value(column, value):
+    """Encode one value for COPY ... FROM STDIN text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(column.type, JSON):
+        value = json.dumps(value)
+    elif isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_insert(session, table, rows):
+    """
+    Postgres bulk insert: COPY rows into a temp table, then insert them with
+    ON CONFLICT DO NOTHING so concurrent ingests cannot create duplicates.
+    Works with psycopg (3) and psycopg2. Returns the number of rows inserted.
+    """
+    rows = [_apply_defaults(table, dict(row)) for row in rows]
+    columns = [c for c in table.columns if any(c.name in row for row in rows)]
+    names = ', '.join(c.name for c in columns)
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(_copy_value(c, row.get(c.name)) for c in columns) + '\n')
+    raw = session.connection().connection.driver_connection
+    with raw.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE _ingest_{table.name} ON COMMIT DROP AS "
+                       f"SELECT {names} FROM {table.name} WITH NO DATA")
+        copy_sql = f"COPY _ingest_{table.name} ({names}) FROM STDIN"
+        if hasattr(cursor, 'copy'):  # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buf.getvalue())
+        else:  # psycopg2
+            buf.seek(0)
+            cursor.copy_expert(copy_sql, buf)
+        cursor.execute(f"INSERT INTO {table.name} ({names}) SELECT {names} FROM _ingest_{table.name} "
+                       f"ON CONFLICT DO NOTHING")
+        return cursor.rowcount
+
+
+def _existing_values(session, column, values):
+    values = list(values)
+    found = set()
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        chunk = values[start:start + LOOKUP_CHUNK]
+        found.update(session.execute(select(column).where(column.in_(chunk))).scalars())
+    return found
+
+
+def existing_fingerprints(session, fingerprints, table=None):
+    """Return the subset of fingerprints already stored."""
+    if table is None:
+        table = Lead.__table__
+    return _existing_values(session, table.c.fingerprint, fingerprints)
+
+
+def existing_emails(session, emails, table=None):
+    """Return the subset of emails already stored."""
+    if table is None:
+        table = Lead.__table__
+    return _existing_values(session, table.c.email, emails)
+
+
+def ref_fingerprint(row):
+    """
+    The place-ref fingerprint of a row that has an address, or None.
+    Leads stored before discovery recorded addresses (place_finder) carry
+    this one instead of the address-based fingerprint.
+    """
+    ref = row.get('source_url') or row.get('website_url')
+    if not row.get('address') or not ref:
+        return None
+    return lead_fingerprint(row.get('name'), None, ref)
+
+
+def known_fingerprints(session, rows, table=None):
+    """
+    Return the subset of the rows' fingerprints whose lead is already stored,
+    under that fingerprint or under the row's ref_fingerprint.
+    """
+    aliases = {row['fingerprint']: ref_fingerprint(row) for row in rows if row.get('fingerprint')}
+    stored = existing_fingerprints(session, set(aliases) | set(filter(None, aliases.values())), table)
+    return {fingerprint for fingerprint, alias in aliases.items() if fingerprint in stored or alias in stored}
+
+
+def row_fingerprint(row):
+    """The row's fingerprint, else one from name/address/source_url (None without a name)."""
+    return row.get('fingerprint') or lead_fingerprint(
+        row.get('name'), row.get('address'), row.get('source_url') or row.get('website_url'))
+
+
+def ingest_leads(session, rows, table=None):
+    """
+    Insert lead rows (dicts of column values) that are not in the database yet,
+    by fingerprint (see known_fingerprints) or by email. Rows without a
+    fingerprint get one from name/address/source_url; nameless rows have none
+    and are deduplicated on their email alone, and skipped without one. Rows
+    with lat/lon but no geohash get one.
+    Commits and returns the number of rows actually inserted: rows another
+    process inserted in the meantime are skipped by ON CONFLICT DO NOTHING
+    and not counted.
+    """
+    if table is None:
+        table = Lead.__table__
+    batch = {}
+    nameless = []  # no fingerprint, identified by their email
+    emails = set()
+    for row in rows:
+        row = dict(row)
+        row['fingerprint'] = row_fingerprint(row)
+        if row.get('lat') is not None and row.get('lon') is not None and not row.get('geohash'):
+            row['geohash'] = geo.encode(row['lat'], row['lon'])
+        email = row.get('email')
+        if (email and email in emails) or (row['fingerprint'] and row['fingerprint'] in batch):
+            continue
+        if row['fingerprint']:
+            batch[row['fingerprint']] = row
+        elif email:
+            nameless.append(row)
+        else:
+            continue
+        if email:
+            emails.add(email)
+    if not batch and not nameless:
+        return 0
+    known = known_fingerprints(session, batch.values(), table) if batch else set()
+    known_emails = existing_emails(session, emails, table) if emails else set()
+    new_rows = [row for fingerprint, row in batch.items()
+                if fingerprint not in known and row.get('email') not in known_emails]
+    new_rows += [row for row in nameless if row['email'] not in known_emails]
+    if not new_rows:
+        return 0
+    if session.get_bind().dialect.name == 'postgresql':
+        inserted = copy_insert(session, table, new_rows)
+        session.commit()
+        return inserted
+    # executemany needs every row to carry the same keys; callers normally
+    # build uniform rows so this is a single statement
+    groups = {}
+    for row in new_rows:
+        groups.setdefault(frozenset(row), []).append(row)
+    stmt = _insert_ignore(table, session.get_bind().dialect.name)
+    inserted = 0
+    for group in groups.values():
+        inserted += session.execute(stmt, group).rowcount
+    session.commit()
+    return inserted
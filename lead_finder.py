@@ -1,8 +1,7 @@
 import requests
 import yaml
-import time
-from db import Session, Lead
-from datetime import datetime
+from discovery import Query, discover_leads
+from respcache import response_cache
 
 with open('config.yaml') as f:
     config = yaml.safe_load(f)
@@ -28,10 +27,13 @@ def search_osm(query, lat=None, lon=None, radius=10000):
         params["viewbox"] = f"{lon-0.1},{lat-0.1},{lon+0.1},{lat+0.1}"
         params["bounded"] = 1
     headers = {"User-Agent": OSM_USER_AGENT}
-    try:
+
+    def fetch():
         resp = requests.get(url, params=params, headers=headers, timeout=10)
         resp.raise_for_status()
-        data = resp.json()
+        return resp.json()
+    try:
+        data = response_cache.fetch('osm', params, fetch)
     except Exception as e:
         print(f"OSM request failed: {e}")
         return []
@@ -55,44 +57,16 @@ def search_osm(query, lat=None, lon=None, radius=10000):
     return results
 
 def find_leads():
-    session = Session()
     # Build queries: if search.queries is empty, generate from niche + location
     base_queries = config['search'].get('queries', [])
     location = config.get('location')
     niche = config['niche']
-    if not base_queries:
-        if location:
-            base_queries = [f"{niche} in {location}"]
-        else:
-            base_queries = [niche]
-    queries = base_queries
-    for q in queries:
-        print(f"Finding leads for: {q}")
-        try:
-            results = search_osm(q)
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            results = []
-        print(f"Found {len(results)} results")
-        for r in results:
-            # Avoid duplicates by name+address or source_url
-            existing = session.query(Lead).filter_by(name=r['name'], address=r['address']).first()
-            if not existing:
-                lead = Lead(
-                    name=r['name'],
-                    email=None,
-                    phone=None,
-                    address=r['address'],
-                    source_url=r.get('website') or '',
-                    niche=niche,
-                    status='new',
-                    created_at=datetime.utcnow()
-                )
-                session.add(lead)
-        session.commit()
-        time.sleep(1)  # be polite to OSM
-    session.close()
+    if base_queries:
+        queries = [Query(niche, None, q) for q in base_queries]
+    else:
+        queries = [Query(niche, location)]
+    # Runs concurrently; pacing per provider comes from discovery.rate_limits
+    discover_leads(queries, provider='osm')
     print("Lead finding complete.")
 
 if __name__ == '__main__':
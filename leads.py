@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Streaming bulk import/export of leads (CSV, JSONL, Parquet).
+Rows move in fixed-size chunks, so memory stays bounded whatever the file or
+table size. Imports are deduplicated against the fingerprint and email
+indexes (see ingest.py) and record a checkpoint after every committed chunk,
+so an interrupted import resumes where it stopped.
+
+Usage:
+  python leads.py import leads.csv [--format csv|jsonl|parquet] [--chunk-size 5000] [--niche NICHE] [--restart]
+  python leads.py export leads.jsonl [--format ...] [--fields name,email,...] [--status new] [--niche NICHE]
+Parquet needs pyarrow (pip install pyarrow).
+"""
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from datetime import date, datetime
+from sqlalchemy import Boolean, DateTime, Integer, JSON, select
+from db import Session, Lead
+from ingest import ingest_leads, row_fingerprint
+
+CHUNK_SIZE = 5000
+COLUMNS = {c.name: c for c in Lead.__table__.columns}
+# Internal bookkeeping that is never imported
+SKIP_ON_IMPORT = {'id', 'claimed_by', 'claim_token', 'claim_expires_at'}
+DEFAULT_EXPORT_FIELDS = [
+    'id', 'name', 'business_name', 'email', 'phone', 'address', 'location', 'source_url',
+    'website_url', 'niche', 'business_type', 'status', 'notes', 'created_at', 'updated_at'
+]
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext in ('csv', 'jsonl', 'parquet'):
+        return ext
+    if ext in ('ndjson', 'json'):
+        return 'jsonl'
+    raise ValueError(f"Cannot tell the format of {path}; pass --format")
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise SystemExit("Parquet support needs pyarrow: pip install pyarrow")
+
+# ============= IMPORT =============
+
+def read_records(path, fmt):
+    """Yield one dict per input record, streaming."""
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            for record in csv.DictReader(f):
+                yield record
+    elif fmt == 'jsonl':
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == 'parquet':
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=CHUNK_SIZE):
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+def _convert(column, value):
+    """Coerce a raw file value to the column's Python type."""
+    if value is None or value == '':
+        return None
+    if isinstance(column.type, DateTime) and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Boolean) and isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 't', 'yes', 'y')
+    if isinstance(column.type, Integer) and not isinstance(value, int):
+        return int(value)
+    if isinstance(column.type, JSON) and isinstance(value, str):
+        return json.loads(value)
+    return value
+
+def to_row(record, niche=None):
+    row = {}
+    for key, value in record.items():
+        column = COLUMNS.get(key)
+        if column is None or key in SKIP_ON_IMPORT:
+            continue
+        row[key] = _convert(column, value)
+    if not row.get('name') and row.get('business_name'):
+        row['name'] = row['business_name']
+    if niche and not row.get('niche'):
+        row['niche'] = niche
+    row.setdefault('status', 'new')
+    row.setdefault('created_at', datetime.utcnow())
+    return row
+
+def _checkpoint_path(path):
+    return path + '.checkpoint'
+
+def load_checkpoint(path):
+    try:
+        with open(_checkpoint_path(path)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_checkpoint(path, state):
+    tmp = _checkpoint_path(path) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, _checkpoint_path(path))
+
+def import_leads(path, fmt=None, chunk_size=CHUNK_SIZE, niche=None, restart=False):
+    """
+    Import a file in chunks. Resumes from <path>.checkpoint unless restart;
+    the checkpoint is removed once the whole file is in. Rows with neither a
+    name (or business_name) nor an email cannot be deduplicated; they are
+    skipped and counted.
+    """
+    fmt = detect_format(path, fmt)
+    state = {} if restart else load_checkpoint(path)
+    skip = state.get('rows_done', 0)
+    if skip:
+        print(f"Resuming {path} after {skip} rows ({state.get('inserted', 0)} inserted so far)")
+    rows_done = skip
+    inserted = state.get('inserted', 0)
+    skipped = state.get('skipped', 0)
+    started = time.monotonic()
+    session = Session()
+    try:
+        chunk = []
+        for i, record in enumerate(read_records(path, fmt)):
+            if i < skip:
+                continue
+            row = to_row(record, niche)
+            if row_fingerprint(row) or row.get('email'):
+                chunk.append(row)
+            else:
+                skipped += 1
+            rows_done = i + 1
+            if len(chunk) >= chunk_size:
+                inserted += ingest_leads(session, chunk)
+                chunk = []
+                save_checkpoint(path, {'rows_done': rows_done, 'inserted': inserted, 'skipped': skipped,
+                                       'format': fmt})
+                rate = (rows_done - skip) / max(time.monotonic() - started, 1e-9)
+                print(f"  {rows_done} rows read, {inserted} new, {skipped} skipped, {rate:,.0f} rows/s")
+        if chunk:
+            inserted += ingest_leads(session, chunk)
+    finally:
+        session.close()
+    elapsed = time.monotonic() - started
+    if os.path.exists(_checkpoint_path(path)):
+        os.remove(_checkpoint_path(path))
+    rate = (rows_done - skip) / max(elapsed, 1e-9)
+    print(f"Imported {path}: {rows_done} rows, {inserted} new leads, {skipped} skipped without a name or email "
+          f"in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+    return inserted
+
+# ============= EXPORT =============
+
+def iter_lead_chunks(fields, chunk_size=CHUNK_SIZE, status=None, niche=None):
+    """Yield lists of row dicts, one keyset page on id at a time."""
+    columns = [COLUMNS[f] for f in fields]
+    if 'id' not in fields:
+        columns.insert(0, COLUMNS['id'])
+    last_id = 0
+    session = Session()
+    try:
+        while True:
+            query = select(*columns).where(Lead.id > last_id)
+            if status:
+                query = query.where(Lead.status == status)
+            if niche:
+                query = query.where(Lead.niche == niche)
+            rows = session.execute(query.order_by(Lead.id).limit(chunk_size)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            yield [{f: getattr(row, f) for f in fields} for row in rows]
+    finally:
+        session.close()
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def export_leads(path, fmt=None, fields=None, chunk_size=CHUNK_SIZE, status=None, niche=None):
+    fmt = detect_format(path, fmt)
+    fields = fields or DEFAULT_EXPORT_FIELDS
+    unknown = [f for f in fields if f not in COLUMNS]
+    if unknown:
+        raise SystemExit(f"Unknown fields: {', '.join(unknown)}")
+    started = time.monotonic()
+    count = 0
+    chunks = iter_lead_chunks(fields, chunk_size, status, niche)
+    if fmt == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for chunk in chunks:
+                for row in chunk:
+                    writer.writerow({k: json.dumps(v) if isinstance(v, (list, dict)) else _plain(v)
+                                     for k, v in row.items()})
+                count += len(chunk)
+    elif fmt == 'jsonl':
+        with open(path, 'w', encoding='utf-8') as f:
+            for chunk in chunks:
+                for row in chunk:
+                    f.write(json.dumps({k: _plain(v) for k, v in row.items()}) + '\n')
+                count += len(chunk)
+    elif fmt == 'parquet':
+        _require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pylist([
+                    {k: json.dumps(v) if isinstance(v, (list, dict)) else v for k, v in row.items()}
+                    for row in chunk
+                ])
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                else:
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+                count += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+    elapsed = time.monotonic() - started
+    print(f"Exported {count} leads to {path} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming bulk import/export of leads.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_import = sub.add_parser('import', help="import leads from a file")
+    p_import.add_argument('path')
+    p_import.add_argument('--format', choices=['csv', 'jsonl', 'parquet'])
+    p_import.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    p_import.add_argument('--niche', help="niche for rows that have none")
+    p_import.add_argument('--restart', action='store_true', help="ignore an existing checkpoint")
+    p_export = sub.add_parser('export', help="export leads to a file")
+    p_export.add_argument('path')
+    p_export.add_argument('--format', choices=['csv', 'jsonl', 'parquet'])
+    p_export.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    p_export.add_argument('--fields', help="comma separated columns")
+    p_export.add_argument('--status')
+    p_export.add_argument('--niche')
+    args = parser.parse_args(argv)
+    if args.command == 'import':
+        import_leads(args.path, args.format, args.chunk_size, args.niche, args.restart)
+    else:
+        fields = args.fields.split(',') if args.fields else None
+        export_leads(args.path, args.format, fields, args.chunk_size, args.status, args.niche)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import os
+os.environ.setdefault('LEAD_DB_ROLE', 'scheduler')  # read by dbengine when db is imported
 import time
 import yaml
 import schedule
@@ -8,6 +10,7 @@ from emailer import email_leads
 from reply_monitor import check_replies
 from prototype import build_prototypes
 from conversation import handle_conversation
+from resolve import resolve_leads
 
 with open('config.yaml') as f:
     config = yaml.safe_load(f)
@@ -31,6 +34,7 @@ def main():
     schedule.every(config['intervals']['check_replies']).seconds.do(check_replies)
     schedule.every(config['intervals']['generate_prototype']).seconds.do(build_prototypes)
     schedule.every(config['intervals']['converse']).seconds.do(handle_conversation)
+    schedule.every(config['intervals'].get('resolve_leads', 86400)).seconds.do(resolve_leads)
     print("Lead automation scheduler started.")
     while True:
         schedule.run_pending()
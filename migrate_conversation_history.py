@@ -0,0 +1,60 @@
+"""
+Move Lead.conversation_history JSON into the conversation_messages table.
+Adds last_message_role/last_message_at to leads, copies each history into
+(lead_id, seq) rows and fills the denormalized columns. Leads that already
+have message rows are skipped, so the script can be re-run safely.
+"""
+import json
+from db import engine, init_db, create_missing_indexes
+from sqlalchemy import text, inspect
+
+BATCH_SIZE = 1000
+
+init_db()  # creates conversation_messages
+
+with engine.connect() as conn:
+    columns = [col['name'] for col in inspect(conn).get_columns('leads')]
+    for column, column_type in (('last_message_role', 'VARCHAR'), ('last_message_at', 'DATETIME')):
+        if column not in columns:
+            conn.execute(text(f"ALTER TABLE leads ADD COLUMN {column} {column_type}"))
+            print(f"Added column {column}.")
+    conn.commit()
+
+    last_id = 0
+    migrated = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, conversation_history, created_at FROM leads "
+                 "WHERE id > :last_id AND conversation_history IS NOT NULL ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        ids = [row.id for row in rows]
+        done = set(conn.execute(
+            text("SELECT DISTINCT lead_id FROM conversation_messages WHERE lead_id IN (%s)"
+                 % ','.join(str(i) for i in ids))
+        ).scalars())
+        messages = []
+        last = []
+        for row in rows:
+            history = row.conversation_history
+            if isinstance(history, str):
+                history = json.loads(history)
+            if not history or row.id in done:
+                continue
+            for seq, message in enumerate(history, start=1):
+                messages.append({"lead_id": row.id, "seq": seq, "role": message.get('role'),
+                                 "content": message.get('content'), "created_at": row.created_at})
+            last.append({"id": row.id, "role": history[-1].get('role'), "at": row.created_at})
+        if messages:
+            conn.execute(text("INSERT INTO conversation_messages (lead_id, seq, role, content, created_at) "
+                              "VALUES (:lead_id, :seq, :role, :content, :created_at)"), messages)
+            conn.execute(text("UPDATE leads SET last_message_role = :role, last_message_at = :at WHERE id = :id"), last)
+            conn.commit()
+            migrated += len(last)
+    print(f"Migrated conversations for {migrated} leads.")
+
+create_missing_indexes()
+print("Ensured lead indexes.")
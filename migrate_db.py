@@ -14,6 +14,11 @@ with open('config.yaml') as f:
 OLD_DB_URL = config['database']['url']
 NEW_DB_URL = 'sqlite:///leads.db'
 
+if not OLD_DB_URL.startswith('sqlite'):
+    # Only for moving an old SQLite file; never point a Postgres setup back at SQLite
+    print(f"database.url is not SQLite ({OLD_DB_URL.split(':')[0]}); nothing to migrate.")
+    raise SystemExit(0)
+
 # Create new engine
 new_engine = create_engine(NEW_DB_URL)
 Base = declarative_base()
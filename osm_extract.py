@@ -0,0 +1,330 @@
+"""
+Offline business discovery from a local OpenStreetMap extract.
+Streams a .osm.pbf (needs pyosmium: pip install osmium), a GeoJSON
+FeatureCollection or line-delimited GeoJSON (.geojsonl/.geojsonseq) and keeps
+the POIs tagged amenity/shop/healthcare/craft/office, with their
+website/phone/email tags, in a local SQLite file with an R-tree index
+(osm_extract.index_path). Localities (place=city/town/...) are indexed too,
+so a location name resolves without a geocoder. Radius queries for a niche
+then run in milliseconds with no network.
+
+Usage:
+  python osm_extract.py build india-latest.osm.pbf [--index data/poi_index.db]
+  python osm_extract.py find "dental clinics" "Mumbai" [--km 5]
+"""
+import os
+import sys
+import json
+import math
+import time
+import sqlite3
+import argparse
+import threading
+from dbengine import ROOT_DIR, config
+from dedup import normalize_text
+from geo import haversine_km
+
+EXTRACT_CONFIG = config.get('osm_extract', {})
+INDEX_PATH = EXTRACT_CONFIG.get('index_path', 'data/poi_index.db')
+# Tag keys that make an OSM object a business POI; the first one present is its category
+CATEGORY_KEYS = ('amenity', 'shop', 'healthcare', 'craft', 'office')
+LOCALITY_RANKS = {'city': 0, 'town': 1, 'suburb': 2, 'village': 3, 'neighbourhood': 4}
+# niche -> categories ("key=value"); niches not listed match on words of the category and name
+NICHE_TAGS = EXTRACT_CONFIG.get('niche_tags', {})
+CHUNK_SIZE = 5000
+
+
+def _tag(tags, *keys):
+    for key in keys:
+        if tags.get(key):
+            return tags[key]
+    return None
+
+
+def poi_from_tags(osm_id, tags, lat, lon):
+    """POI record for a tagged OSM object, or None if it is not a named business."""
+    name = tags.get('name')
+    key = next((k for k in CATEGORY_KEYS if tags.get(k)), None)
+    if not name or key is None or lat is None or lon is None:
+        return None
+    street = ' '.join(filter(None, [tags.get('addr:housenumber'), tags.get('addr:street')]))
+    address = ', '.join(filter(None, [street, tags.get('addr:suburb'), tags.get('addr:city'),
+                                      tags.get('addr:postcode')])) or None
+    return {
+        'osm_id': str(osm_id),
+        'name': name,
+        'category': f"{key}={tags[key]}",
+        'lat': float(lat),
+        'lon': float(lon),
+        'website': _tag(tags, 'website', 'contact:website', 'url'),
+        'phone': _tag(tags, 'phone', 'contact:phone', 'contact:mobile'),
+        'email': _tag(tags, 'email', 'contact:email'),
+        'address': address,
+    }
+
+
+def locality_from_tags(tags, lat, lon):
+    if tags.get('place') in LOCALITY_RANKS and tags.get('name') and lat is not None:
+        return {'name': tags['name'], 'rank': LOCALITY_RANKS[tags['place']], 'lat': float(lat), 'lon': float(lon)}
+    return None
+
+
+# ============= READERS =============
+# Each yields (osm_id, tags, lat, lon); areas are reduced to the mean of their outer ring.
+
+def _centroid(geometry):
+    kind = geometry.get('type')
+    coords = geometry.get('coordinates')
+    if kind == 'Point':
+        return coords[1], coords[0]
+    if kind == 'Polygon':
+        ring = coords[0]
+    elif kind == 'MultiPolygon':
+        ring = coords[0][0]
+    elif kind == 'LineString':
+        ring = coords
+    else:
+        return None, None
+    return sum(c[1] for c in ring) / len(ring), sum(c[0] for c in ring) / len(ring)
+
+
+def _feature_record(feature):
+    props = feature.get('properties') or {}
+    tags = props.get('tags', props)
+    osm_id = feature.get('id') or props.get('@id') or props.get('osm_id')
+    lat, lon = _centroid(feature.get('geometry') or {})
+    return osm_id, tags, lat, lon
+
+
+def iter_geojson_lines(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip().lstrip('\x1e')  # GeoJSON text sequences prefix records with RS
+            if line:
+                yield _feature_record(json.loads(line))
+
+
+def iter_geojson_collection(path, chunk_chars=1 << 20):
+    """Stream the features of a FeatureCollection without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buf = ''
+        # Find the start of the features array
+        while True:
+            chunk = f.read(chunk_chars)
+            if not chunk:
+                return
+            buf += chunk
+            marker = buf.find('"features"')
+            if marker != -1 and '[' in buf[marker:]:
+                buf = buf[buf.index('[', marker) + 1:]
+                break
+        pos = 0
+        eof = False
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if buf.startswith(']', pos):
+                return
+            try:
+                feature, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                # Incomplete feature: drop what was consumed and read on
+                chunk = f.read(chunk_chars)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            yield _feature_record(feature)
+            pos = end
+
+
+def iter_pbf(path):
+    try:
+        import osmium
+    except ImportError:
+        raise SystemExit("Reading .osm.pbf needs pyosmium: pip install osmium")
+    # Node locations are needed to place ways (buildings tagged as businesses)
+    for obj in osmium.FileProcessor(path).with_locations():
+        tags = dict(obj.tags)
+        if not tags.get('name') or not (tags.get('place') or any(k in tags for k in CATEGORY_KEYS)):
+            continue
+        if obj.is_node():
+            if obj.location.valid():
+                yield f"node/{obj.id}", tags, obj.location.lat, obj.location.lon
+        elif obj.is_way():
+            points = [(n.lat, n.lon) for n in obj.nodes if n.location.valid()]
+            if points:
+                yield (f"way/{obj.id}", tags, sum(p[0] for p in points) / len(points),
+                       sum(p[1] for p in points) / len(points))
+
+
+def iter_extract(path):
+    lower = path.lower()
+    if lower.endswith('.pbf'):
+        return iter_pbf(path)
+    if lower.endswith(('.geojsonl', '.geojsonseq', '.ndjson', '.jsonl')):
+        return iter_geojson_lines(path)
+    if lower.endswith(('.geojson', '.json')):
+        return iter_geojson_collection(path)
+    raise ValueError(f"Unknown extract format: {path}")
+
+
+# ============= INDEX =============
+
+class POIIndex:
+    def __init__(self, path=None):
+        path = path or INDEX_PATH
+        self.path = path if os.path.isabs(path) else os.path.join(ROOT_DIR, path)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Shared by the threads of one process (queries take _lock)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=wal")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS pois (
+                    id INTEGER PRIMARY KEY, osm_id TEXT UNIQUE, name TEXT, category TEXT,
+                    lat REAL, lon REAL, website TEXT, phone TEXT, email TEXT, address TEXT);
+                CREATE INDEX IF NOT EXISTS ix_pois_category ON pois (category);
+                CREATE VIRTUAL TABLE IF NOT EXISTS pois_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+                CREATE TABLE IF NOT EXISTS localities (
+                    name_norm TEXT, name TEXT, rank INTEGER, lat REAL, lon REAL, UNIQUE (name_norm, rank, lat, lon));
+            """)
+            self._conn = conn
+        return self._conn
+
+    def build(self, path, chunk_size=CHUNK_SIZE):
+        """Stream an extract into the index in chunks; re-running replaces known POIs."""
+        conn = self.connect()
+        started = time.monotonic()
+        read = pois = localities = 0
+        poi_chunk, locality_chunk = [], []
+
+        def flush():
+            with conn:
+                conn.executemany(
+                    "INSERT INTO pois (osm_id, name, category, lat, lon, website, phone, email, address) "
+                    "VALUES (:osm_id, :name, :category, :lat, :lon, :website, :phone, :email, :address) "
+                    "ON CONFLICT (osm_id) DO UPDATE SET name = excluded.name, category = excluded.category, "
+                    "lat = excluded.lat, lon = excluded.lon, website = excluded.website, "
+                    "phone = excluded.phone, email = excluded.email, address = excluded.address", poi_chunk)
+                conn.executemany("INSERT OR REPLACE INTO pois_rtree SELECT id, lat, lat, lon, lon FROM pois "
+                                 "WHERE osm_id = ?", [(poi['osm_id'],) for poi in poi_chunk])
+                conn.executemany("INSERT OR IGNORE INTO localities VALUES (:name_norm, :name, :rank, :lat, :lon)",
+                                 locality_chunk)
+            poi_chunk.clear()
+            locality_chunk.clear()
+
+        for osm_id, tags, lat, lon in iter_extract(path):
+            read += 1
+            poi = poi_from_tags(osm_id, tags, lat, lon)
+            if poi:
+                poi_chunk.append(poi)
+                pois += 1
+            locality = locality_from_tags(tags, lat, lon)
+            if locality:
+                locality['name_norm'] = normalize_text(locality['name'])
+                locality_chunk.append(locality)
+                localities += 1
+            if len(poi_chunk) >= chunk_size:
+                flush()
+                rate = read / max(time.monotonic() - started, 1e-9)
+                print(f"  {read} objects read, {pois} POIs, {rate:,.0f} objects/s")
+        flush()
+        elapsed = time.monotonic() - started
+        print(f"Indexed {pois} POIs and {localities} localities from {path} in {elapsed:.1f}s")
+        return pois
+
+    def locate(self, location):
+        """(lat, lon) for "lat,lon" or a locality name in the extract, else None."""
+        parts = [p.strip() for p in location.split(',')]
+        if len(parts) == 2:
+            try:
+                return float(parts[0]), float(parts[1])
+            except ValueError:
+                pass
+        with self._lock:
+            row = self.connect().execute(
+                "SELECT lat, lon FROM localities WHERE name_norm = ? ORDER BY rank LIMIT 1",
+                (normalize_text(parts[0]),)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def near(self, niche, lat, lon, radius_km, limit=None):
+        """POIs matching a niche within radius_km, nearest first."""
+        dlat = radius_km / 111.32
+        dlon = radius_km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+        query = ("SELECT p.osm_id, p.name, p.category, p.lat, p.lon, p.website, p.phone, p.email, p.address "
+                 # CROSS JOIN keeps the R-tree as the outer loop (not the category index)
+                 "FROM pois_rtree r CROSS JOIN pois p ON p.id = r.id "
+                 "WHERE r.min_lat >= ? AND r.max_lat <= ? AND r.min_lon >= ? AND r.max_lon <= ?")
+        params = [lat - dlat, lat + dlat, lon - dlon, lon + dlon]
+        categories = NICHE_TAGS.get(niche)
+        if categories:
+            query += f" AND p.category IN ({', '.join('?' * len(categories))})"
+            params += categories
+        words = _niche_words(niche)
+        with self._lock:
+            rows = self.connect().execute(query, params).fetchall()
+        results = []
+        for row in rows:
+            osm_id, name, category, plat, plon, website, phone, email, address = row
+            if not categories and not words & _niche_words(f"{category.split('=')[1]} {name}"):
+                continue
+            distance = haversine_km(lat, lon, plat, plon)
+            if distance <= radius_km:
+                results.append((distance, row))
+        results.sort(key=lambda r: r[0])
+        return [{
+            'name': name,
+            'address': address,
+            'website': website,
+            'phone': phone,
+            'email': email,
+            'place_id': osm_id,
+            'category': category,
+            'location': {'lat': plat, 'lon': plon},
+            'distance_km': round(distance, 3),
+        } for distance, (osm_id, name, category, plat, plon, website, phone, email, address) in results[:limit]]
+
+
+def _niche_words(text):
+    """Lowercase words with a plural 's' dropped ("dental clinics" -> {"dental", "clinic"})."""
+    words = set()
+    for word in normalize_text(text).replace('_', ' ').split():
+        words.add(word[:-1] if len(word) > 3 and word.endswith('s') else word)
+    return words
+
+
+poi_index = POIIndex()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Index a local OSM extract and query it offline.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_build = sub.add_parser('build', help="stream an extract into the index")
+    p_build.add_argument('path')
+    p_build.add_argument('--index')
+    p_find = sub.add_parser('find', help="POIs for a niche near a location")
+    p_find.add_argument('niche')
+    p_find.add_argument('location', help='"lat,lon" or a locality name in the extract')
+    p_find.add_argument('--km', type=float, default=5)
+    p_find.add_argument('--index')
+    args = parser.parse_args(sys.argv[1:])
+    index = POIIndex(args.index)
+    if args.command == 'build':
+        index.build(args.path)
+    else:
+        point = index.locate(args.location)
+        if point is None:
+            raise SystemExit(f"{args.location} is not a locality in the extract; pass lat,lon")
+        started = time.perf_counter()
+        places = index.near(args.niche, point[0], point[1], args.km)
+        elapsed = (time.perf_counter() - started) * 1000
+        for place in places:
+            print(f"{place['distance_km']:6.2f} km  {place['name']}  {place['website'] or ''}  {place['phone'] or ''}")
+        print(f"{len(places)} places within {args.km:g} km in {elapsed:.1f} ms")
@@ -1,57 +1,177 @@
 import os
 import yaml
+import asyncio
+import httpx
 import requests
-from db import Session, Lead
+from db import Session
+from dedup import lead_fingerprint
+from geo import place_point
+from ingest import known_fingerprints
+from ratelimit import make_bucket, RateLimitedClient
+from respcache import response_cache
+from quota import ametered, QuotaExceeded
 from datetime import datetime
-import time
-from urllib.parse import quote_plus
 
 with open('config.yaml') as f:
     config = yaml.safe_load(f)
 
 PROVIDER = config['places']['provider']
+YELP_SEARCH_URL = "https://api.yelp.com/v3/businesses/search"
+NOMINATIM_SEARCH_URL = "https://nominatim.openstreetmap.org/search"
+YELP_PAGE_SIZE = 50  # Yelp max per request
+YELP_MAX_RESULTS = 1000  # Yelp rejects offset + limit beyond this
+YELP_PAGES_IN_FLIGHT = config['places']['yelp'].get('pages_in_flight', 4)
+YELP_SATURATED_PAGES = 2
 
-def find_places_yelp(niche, location, radius=None, max_results=None):
-    """
-    Find businesses using Yelp Fusion API (free tier 5000/day).
-    Requires YELP_API_KEY env var.
-    """
-    api_key = os.getenv('YELP_API_KEY')
+def yelp_place(biz):
+    """Place dict from one Yelp Fusion business."""
+    return {
+        'name': biz.get('name'),
+        'address': ' '.join(biz.get('location', {}).get('display_address', [])),
+        'website': biz.get('url'),  # Yelp provides a Yelp URL, not business website
+        'phone': biz.get('phone') or None,
+        'place_id': biz.get('id'),
+        'location': biz.get('coordinates')
+    }
+
+def osm_place(r):
+    """Place dict from one Nominatim search result."""
+    name = r.get('name') or r.get('display_name', '').split(',')[0] or 'Unknown'
+    website = phone = None  # only present when extratags were requested
+    if isinstance(r.get('extratags'), dict):
+        website = r['extratags'].get('website')
+        phone = r['extratags'].get('phone') or r['extratags'].get('contact:phone')
+    lat = r.get('lat')
+    lon = r.get('lon')
+    return {
+        'name': name,
+        'address': r.get('display_name', ''),
+        'website': website,
+        'phone': phone,
+        'place_id': str(r.get('osm_id')),
+        'location': {'lat': float(lat) if lat else None, 'lon': float(lon) if lon else None}
+    }
+
+def place_rows(places, niche, location=None):
+    """Lead rows for ingest_leads from place dicts."""
+    now = datetime.utcnow()
+    rows = []
+    for p in places:
+        source_url = p['website'] or p['place_id']
+        lat, lon = place_point(p)
+        rows.append({
+            'name': p['name'],
+            'email': p.get('email'),  # OSM extract tags carry contact details
+            'phone': p.get('phone'),
+            'address': p.get('address') or None,
+            'source_url': source_url,
+            'niche': niche,
+            'location': location,
+            'status': 'new',
+            # ingest also matches leads stored under the place ref (ingest.ref_fingerprint)
+            'fingerprint': lead_fingerprint(p['name'], p.get('address'), source_url),
+            'lat': lat,  # ingest_leads derives the geohash
+            'lon': lon,
+            'created_at': now
+        })
+    return rows
+
+def _yelp_api_key():
+    api_key = os.getenv(config['places']['yelp'].get('api_key_env', 'YELP_API_KEY'))
     if not api_key:
         raise ValueError("YELP_API_KEY not set")
-    if radius is None:
-        radius = config['places']['yelp']['radius']
-    if max_results is None:
-        max_results = config['places']['yelp']['max_results']
-    url = "https://api.yelp.com/v3/businesses/search"
-    headers = {"Authorization": f"Bearer {api_key}"}
-    params = {
-        "term": niche,
-        "location": location,
-        "radius": radius,
-        "limit": min(max_results, 50)  # Yelp max per page
-    }
-    places = []
-    try:
-        resp = requests.get(url, headers=headers, params=params, timeout=10)
+    return api_key
+
+async def _yelp_page(client, params, headers):
+    async def fetch():
+        resp = await client.get(YELP_SEARCH_URL, params=params, headers=headers)
+        if resp.status_code == 400:
+            raise ValueError(f"Invalid location or parameters: {resp.text}")
         resp.raise_for_status()
-        data = resp.json()
-        for biz in data.get('businesses', []):
-            places.append({
-                'name': biz.get('name'),
-                'address': ' '.join(biz.get('location', {}).get('display_address', [])),
-                'website': biz.get('url'),  # Yelp provides a Yelp URL, not business website
-                'place_id': biz.get('id'),
-                'location': biz.get('coordinates')
-            })
-            if len(places) >= max_results:
+        return resp.json()
+    # Cache hits are free; misses spend the daily Yelp budget (quota.py)
+    return await response_cache.afetch('yelp', params, ametered('yelp', fetch))
+
+def _stored_fingerprints(rows):
+    session = Session()
+    try:
+        return known_fingerprints(session, rows)
+    finally:
+        session.close()
+
+async def iter_yelp_pages(client, niche, location, radius=None, max_results=None, saturation=None):
+    """
+    Page through a Yelp Fusion search, yielding each page's places as it lands.
+    client is an (ideally rate limited, see ratelimit.RateLimitedClient) async
+    HTTP client. The first page gives the total; the remaining offsets are
+    fetched YELP_PAGES_IN_FLIGHT at a time. Stops after max_results places,
+    at Yelp's offset cap, or once YELP_SATURATED_PAGES pages in a row are
+    mostly (>= saturation) businesses already stored or seen in this search.
+    """
+    headers = {"Authorization": f"Bearer {_yelp_api_key()}"}
+    yelp_config = config['places']['yelp']
+    radius = radius or yelp_config['radius']
+    max_results = max_results or yelp_config['max_results']
+    saturation = saturation if saturation is not None else yelp_config.get('duplicate_saturation', 0.8)
+    base = {"term": niche, "location": location, "radius": radius}
+
+    first = await _yelp_page(client, dict(base, limit=min(max_results, YELP_PAGE_SIZE), offset=0), headers)
+    total = min(first.get('total', 0), max_results, YELP_MAX_RESULTS)
+    seen = set()
+    yielded = 0
+
+    async def consume(data):
+        """Trim a page to what is new and wanted; returns (places, saturated)."""
+        nonlocal yielded
+        places = [yelp_place(biz) for biz in data.get('businesses', [])]
+        if not places:
+            return [], True
+        rows = place_rows(places, niche)
+        stored = await asyncio.to_thread(_stored_fingerprints, rows)
+        duplicates = sum(1 for p, r in zip(places, rows) if p['place_id'] in seen or r['fingerprint'] in stored)
+        seen.update(p['place_id'] for p in places)
+        places = places[:max_results - yielded]
+        yielded += len(places)
+        return places, duplicates >= saturation * len(rows)
+
+    places, saturated = await consume(first)
+    streak = 1 if saturated else 0
+    if places:
+        yield places
+    offsets = iter(range(YELP_PAGE_SIZE, total, YELP_PAGE_SIZE))
+    pending = set()
+    try:
+        while streak < YELP_SATURATED_PAGES and yielded < max_results:
+            for offset in offsets:
+                limit = min(YELP_PAGE_SIZE, total - offset)
+                pending.add(asyncio.ensure_future(_yelp_page(client, dict(base, limit=limit, offset=offset), headers)))
+                if len(pending) >= YELP_PAGES_IN_FLIGHT:
+                    break
+            if not pending:
                 break
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 400:
-            raise ValueError(f"Invalid location or parameters: {e.response.text}")
-        else:
-            raise
-    return places
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                places, saturated = await consume(task.result())
+                streak = streak + 1 if saturated else 0
+                if places:
+                    yield places
+    finally:
+        for task in pending:
+            task.cancel()
+
+def find_places_yelp(niche, location, radius=None, max_results=None):
+    """
+    Find businesses using Yelp Fusion API (free tier 5000/day), paging past
+    the 50-per-request cap. Requires YELP_API_KEY env var.
+    """
+    async def collect():
+        async with httpx.AsyncClient(timeout=config['places']['osm'].get('timeout', 10)) as client:
+            limited = RateLimitedClient(client, make_bucket('yelp'))
+            places = []
+            async for page in iter_yelp_pages(limited, niche, location, radius, max_results):
+                places.extend(page)
+            return places
+    return asyncio.run(collect())
 
 def find_places_osm(niche, location, radius=None, max_results=None):
     """
@@ -60,7 +180,7 @@ def find_places_osm(niche, location, radius=None, max_results=None):
     """
     if max_results is None:
         max_results = config['places']['osm']['max_results']
-    nominatim_url = "https://nominatim.openstreetmap.org/search"
+    nominatim_url = NOMINATIM_SEARCH_URL
     query = f"{niche} in {location}"
     params = {
         "q": query,
@@ -69,63 +189,59 @@ def find_places_osm(niche, location, radius=None, max_results=None):
         "addressdetails": 1
     }
     headers = {"User-Agent": config['places']['osm']['user_agent']}
-    resp = requests.get(nominatim_url, params=params, headers=headers, timeout=10)
-    resp.raise_for_status()
-    results = resp.json()
+
+    def fetch():
+        resp = requests.get(nominatim_url, params=params, headers=headers, timeout=10)
+        resp.raise_for_status()
+        return resp.json()
+    results = response_cache.fetch('osm', params, fetch)
     places = []
     for r in results:
-        # Extract name, address, website, and coordinates
-        name = r.get('name') or r.get('display_name', '').split(',')[0]
-        address = r.get('display_name', '')
-        website = None  # Nominatim doesn't provide website; we could enrich later
-        place_id = r.get('osm_id')
-        lat = r.get('lat')
-        lon = r.get('lon')
-        places.append({
-            'name': name,
-            'address': address,
-            'website': website,
-            'place_id': str(place_id),
-            'location': {'lat': float(lat) if lat else None, 'lon': float(lon) if lon else None}
-        })
+        places.append(osm_place(r))
         if len(places) >= max_results:
             break
     return places
 
+def find_places_extract(niche, location, radius=None, max_results=None):
+    """
+    Find businesses in the local OSM extract index (osm_extract.py), no network.
+    location is "lat,lon" or a locality name present in the extract; radius in meters.
+    """
+    from osm_extract import poi_index
+    point = poi_index.locate(location)
+    if point is None:
+        raise ValueError(f"{location} is not a locality in the OSM extract index")
+    radius = radius or config.get('osm_extract', {}).get('radius', 5000)
+    return poi_index.near(niche, point[0], point[1], radius / 1000, max_results)
+
 def find_places(niche, location, radius=None, max_results=None):
     if PROVIDER == 'yelp':
         try:
             return find_places_yelp(niche, location, radius, max_results)
-        except ValueError as e:
-            # If Yelp returns a pattern error, try OSM as fallback if configured? For now, re-raise.
-            raise
+        except QuotaExceeded as e:
+            fallback = config.get('quotas', {}).get('fallback', {}).get('yelp')
+            if fallback not in ('osm', 'extract'):
+                raise
+            print(f"{e}; searching {fallback} instead")
+            if fallback == 'extract':
+                return find_places_extract(niche, location, radius, max_results)
+            return find_places_osm(niche, location, radius, max_results)
     elif PROVIDER == 'osm':
         return find_places_osm(niche, location, radius, max_results)
+    elif PROVIDER == 'extract':
+        return find_places_extract(niche, location, radius, max_results)
     else:
         raise ValueError(f"Unknown places provider: {PROVIDER}")
 
 def find_leads_by_location(niche, location):
-    session = Session()
-    places = find_places(niche, location)
-    for p in places:
-        existing = session.query(Lead).filter(
-            (Lead.source_url == p['website']) |
-            (Lead.source_url == p['place_id'])
-        ).first()
-        if not existing:
-            lead = Lead(
-                name=p['name'],
-                email=None,
-                source_url=p['website'] or p['place_id'],
-                niche=niche,
-                status='new',
-                created_at=datetime.utcnow()
-            )
-            session.add(lead)
-    session.commit()
-    session.close()
-    print(f"Added {len(places)} leads for {niche} near {location}")
-    return len(places)
+    if PROVIDER not in ('yelp', 'osm', 'extract'):
+        raise ValueError(f"Unknown places provider: {PROVIDER}")
+    # discovery builds on this module, so import it here
+    from discovery import Query, discover
+    # Pages are ingested as they arrive
+    found, added = asyncio.run(discover([Query(niche, location)], PROVIDER))
+    print(f"Added {added} new leads ({found} found) for {niche} near {location}")
+    return found
 
 if __name__ == '__main__':
     import sys
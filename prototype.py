@@ -2,8 +2,7 @@ import os
 import yaml
 import shutil
 import subprocess
-from db import Session, Lead
-from datetime import datetime
+from workqueue import drain
 
 with open('config.yaml') as f:
     config = yaml.safe_load(f)
@@ -73,29 +72,22 @@ def generate_prototype(lead):
         url = f"https://raghav-agent.github.io/lead-automation/lead_{lead.id}/"
     return url
 
-def build_prototypes():
-    session = Session()
-    leads = session.query(Lead).filter_by(status='replied_yes').filter(Lead.prototype_url.is_(None)).all()
-    if not leads:
-        print("No leads need prototypes.")
-        session.close()
-        return
+def _build_claimed(session, lead):
+    url = generate_prototype(lead)
+    lead.prototype_url = url
+    lead.status = 'prototype_sent'
+    print(f"Prototype for lead {lead.id} ready: {url}")
+    return True
 
+def build_prototypes(worker_id=None):
     # Ensure docs dir exists
     os.makedirs(DOCS_DIR, exist_ok=True)
-
-    for lead in leads:
-        try:
-            url = generate_prototype(lead)
-            lead.prototype_url = url
-            lead.status = 'prototype_sent'
-            session.commit()
-            print(f"Prototype for lead {lead.id} ready: {url}")
-        except Exception as e:
-            print(f"Failed for lead {lead.id}: {e}")
-            session.rollback()
-
-    session.close()
+    # Leads are claimed in leased batches (see workqueue.py), so parallel
+    # workers never build the same prototype twice
+    built = drain('prototype', _build_claimed, worker_id=worker_id)
+    if not built:
+        print("No leads need prototypes.")
+        return 0
 
     # Commit and push to GitHub
     try:
@@ -106,6 +98,7 @@ def build_prototypes():
         print("Prototypes committed and pushed. GitHub Pages will update shortly.")
     except subprocess.CalledProcessError as e:
         print("Git push failed:", e)
+    return built
 
 if __name__ == '__main__':
     build_prototypes()
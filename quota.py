@@ -0,0 +1,145 @@
+"""
+Quota budgets for metered provider APIs (Yelp, Brave, Hunter).
+Every paid call is recorded in the provider_quota table, one row per provider
+and budget period (day:YYYY-MM-DD, month:YYYY-MM, UTC), so usage survives
+restarts and is shared by every process on the database. Budgets come from
+quotas in config.yaml. A call is only made if a conditional UPDATE can take
+it from every period's budget; otherwise QuotaExceeded is raised. Cached
+responses never spend quota: metered() wraps the fetch the cache calls on a
+miss, and the cache falls back to an expired entry when the quota is gone.
+
+Usage: python quota.py
+"""
+import asyncio
+from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from db import engine, config, ProviderQuota
+from respcache import ProviderUnavailable
+
+QUOTA_CONFIG = config.get('quotas', {})
+PERIODS = {'daily': ('day', '%Y-%m-%d'), 'monthly': ('month', '%Y-%m')}
+
+
+class QuotaExceeded(ProviderUnavailable):
+    """A provider's daily or monthly budget is used up."""
+
+
+class _OverBudget(Exception):
+    pass
+
+
+def period_keys(now=None):
+    now = now or datetime.utcnow()
+    return {budget: f"{name}:{now.strftime(fmt)}" for budget, (name, fmt) in PERIODS.items()}
+
+
+class QuotaLedger:
+    def __init__(self, budgets=None):
+        self.budgets = budgets if budgets is not None else QUOTA_CONFIG.get('budgets', {})
+        self._ready = False
+
+    def _limits(self, provider):
+        """(period key, budget) for each budget configured for the provider."""
+        keys = period_keys()
+        budgets = self.budgets.get(provider, {})
+        return [(keys[budget], budgets[budget]) for budget in PERIODS if budgets.get(budget) is not None]
+
+    def _ensure_table(self):
+        if not self._ready:
+            ProviderQuota.__table__.create(engine, checkfirst=True)
+            self._ready = True
+
+    def _ensure_rows(self, conn, provider, periods):
+        table = ProviderQuota.__table__
+        rows = [{'provider': provider, 'period': period, 'used': 0} for period in periods]
+        if engine.dialect.name in ('sqlite', 'postgresql'):
+            # Rows another process already created are left alone
+            dialect_insert = sqlite_insert if engine.dialect.name == 'sqlite' else pg_insert
+            conn.execute(dialect_insert(table).on_conflict_do_nothing(), rows)
+            return
+        existing = set(conn.execute(select(table.c.period).where(table.c.provider == provider)).scalars())
+        missing = [row for row in rows if row['period'] not in existing]
+        if missing:
+            conn.execute(table.insert(), missing)
+
+    def spend(self, provider, n=1):
+        """Take n calls from every budget of the provider; False (nothing taken) if any is short."""
+        limits = self._limits(provider)
+        if not limits:
+            return True  # not metered
+        self._ensure_table()
+        try:
+            with engine.begin() as conn:
+                self._ensure_rows(conn, provider, [period for period, _ in limits])
+                for period, budget in limits:
+                    taken = conn.execute(
+                        update(ProviderQuota)
+                        .where(ProviderQuota.provider == provider, ProviderQuota.period == period,
+                               ProviderQuota.used + n <= budget)
+                        .values(used=ProviderQuota.used + n)
+                    ).rowcount
+                    if not taken:
+                        # Undo what the other periods took
+                        raise _OverBudget
+        except _OverBudget:
+            return False
+        return True
+
+    def acquire(self, provider, n=1):
+        if not self.spend(provider, n):
+            raise QuotaExceeded(f"{provider} quota exhausted")
+
+    def remaining(self, provider):
+        """Calls left in the tightest budget, or None if the provider is not metered."""
+        limits = self._limits(provider)
+        if not limits:
+            return None
+        used = self.usage(provider)
+        return min(budget - used.get(period, 0) for period, budget in limits)
+
+    def exhausted(self, provider):
+        remaining = self.remaining(provider)
+        return remaining is not None and remaining <= 0
+
+    def usage(self, provider=None):
+        """{period: used} for a provider, or {provider: {period: used}} for all."""
+        self._ensure_table()
+        statement = select(ProviderQuota.provider, ProviderQuota.period, ProviderQuota.used)
+        if provider:
+            statement = statement.where(ProviderQuota.provider == provider)
+        result = {}
+        with engine.connect() as conn:
+            for name, period, used in conn.execute(statement):
+                result.setdefault(name, {})[period] = used
+        return result.get(provider, {}) if provider else result
+
+
+def metered(provider, fetch):
+    """Wrap a (sync) fetch so it takes a call from the provider's budget first."""
+    def call():
+        ledger.acquire(provider)
+        return fetch()
+    return call
+
+
+def ametered(provider, fetch):
+    """metered() for async fetches; the ledger write runs off the event loop."""
+    async def call():
+        if not await asyncio.to_thread(ledger.spend, provider):
+            raise QuotaExceeded(f"{provider} quota exhausted")
+        return await fetch()
+    return call
+
+
+# Process-wide ledger used by the providers
+ledger = QuotaLedger()
+
+if __name__ == '__main__':
+    keys = period_keys()
+    for provider, budgets in sorted(ledger.budgets.items()):
+        used = ledger.usage(provider)
+        parts = [f"{budget} {used.get(keys[budget], 0)}/{budgets[budget]}"
+                 for budget in PERIODS if budgets.get(budget) is not None]
+        print(f"{provider:<8} {'  '.join(parts)}")
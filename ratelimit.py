@@ -0,0 +1,151 @@
+"""
+Per-provider rate limiting for discovery requests.
+TokenBucket paces the requests of one process. SharedTokenBucket keeps its
+state in the provider_slots table, so every process on the same database
+shares one budget (Nominatim allows 1 request/s per application, not per
+process). Limits come from discovery.rate_limits in config.yaml.
+DomainThrottle spaces out requests to each host for threaded scrapers
+(enrich.politeness), so many sites can be fetched at once while each one
+still sees at most one request per interval.
+"""
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError
+from db import engine, config, ProviderSlot
+
+RATE_LIMITS = config.get('discovery', {}).get('rate_limits', {})
+DEFAULT_LIMIT = {'rate': 1, 'burst': 1, 'shared': False}
+POLITENESS = config.get('enrich', {}).get('politeness', {})
+
+
+class TokenBucket:
+    """`rate` requests per second with up to `burst` requests banked."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SharedTokenBucket:
+    """
+    Token bucket shared across processes through the database (GCRA: one row
+    per provider holds the theoretical arrival time of the next request).
+    Each acquire is a single UPDATE ... RETURNING, so concurrent processes
+    never hand out the same slot.
+    """
+
+    def __init__(self, provider, rate, burst=1):
+        self.provider = provider
+        self.interval = 1.0 / float(rate)
+        self.burst = max(float(burst), 1.0)
+        self._ready = False
+
+    def _ensure_row(self):
+        ProviderSlot.__table__.create(engine, checkfirst=True)
+        try:
+            with engine.begin() as conn:
+                conn.execute(ProviderSlot.__table__.insert().values(provider=self.provider, next_at=0))
+        except IntegrityError:
+            pass  # another process created it
+        self._ready = True
+
+    def reserve(self):
+        """Reserve the next slot; returns how many seconds to wait before using it."""
+        if not self._ready:
+            self._ensure_row()
+        now = time.time()
+        with engine.begin() as conn:
+            next_at = conn.execute(
+                update(ProviderSlot)
+                .where(ProviderSlot.provider == self.provider)
+                .values(next_at=case((ProviderSlot.next_at > now, ProviderSlot.next_at), else_=now) + self.interval)
+                .returning(ProviderSlot.next_at)
+            ).scalar()
+        return max(0.0, next_at - now - self.burst * self.interval)
+
+    async def acquire(self):
+        wait = await asyncio.to_thread(self.reserve)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class RateLimitedClient:
+    """Wraps an httpx.AsyncClient so every request first takes a token from a bucket."""
+
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    async def get(self, url, **kwargs):
+        await self.bucket.acquire()
+        return await self.client.get(url, **kwargs)
+
+
+def make_bucket(provider, limits=None):
+    """Bucket for a provider from discovery.rate_limits (or the given limits dict)."""
+    settings = dict(DEFAULT_LIMIT)
+    settings.update(limits if limits is not None else RATE_LIMITS.get(provider, {}))
+    if settings.get('shared'):
+        return SharedTokenBucket(provider, settings['rate'], settings['burst'])
+    return TokenBucket(settings['rate'], settings['burst'])
+
+
+def host_of(url):
+    """Lowercase host of a URL without a leading www."""
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class DomainThrottle:
+    """
+    At most one request per `interval` seconds to each host, across threads.
+    Each caller reserves the host's next slot under a lock and sleeps outside
+    it, so waiting on one host never holds up requests to another.
+    """
+
+    def __init__(self, interval=2.0, hosts=None):
+        self.interval = float(interval)
+        self.hosts = {host.lower(): float(seconds) for host, seconds in (hosts or {}).items()}
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, url):
+        """Reserve the next slot for the URL's host; returns how many seconds to wait."""
+        host = host_of(url)
+        if not host:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            if len(self._next) > 10000:
+                # Forget hosts whose slot has passed
+                self._next = {h: at for h, at in self._next.items() if at > now}
+            at = max(now, self._next.get(host, 0.0))
+            self._next[host] = at + self.hosts.get(host, self.interval)
+        return at - now
+
+    def wait(self, url):
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+
+# Shared by every enrichment thread in the process
+domain_throttle = DomainThrottle(POLITENESS.get('interval', 2.0), POLITENESS.get('hosts'))
@@ -0,0 +1,385 @@
+"""
+Entity resolution across lead sources.
+Fingerprints only catch exact (name, address) repeats; a Brave page title
+("Smile Dental Clinic - Home") and the OSM place ("Smile Dental Clinic")
+slip through and both get emailed. Resolution works in four steps:
+
+1. Normalize: strip page-title boilerplate, legal suffixes and stopwords
+   from names; reduce phones to digits and websites to their domain.
+2. Block: records are only compared within a block (geohash cell of
+   BLOCK_PRECISION; search location plus first name token; niche plus first
+   name token for records missing coordinates or a location). Shared phone,
+   email or website domain link records directly.
+3. Candidates: within a block, MinHash signatures of name trigrams go
+   through LSH banding (BANDS x ROWS), so only near-duplicate names are
+   compared. Small blocks are compared pairwise.
+4. Verify and merge: candidates must pass name similarity and must not be
+   far apart; each cluster keeps its richest record and fills the
+   survivor's empty fields from the others.
+
+Usage: python resolve.py [--dry-run]
+"""
+import re
+import sys
+import time
+import argparse
+from collections import defaultdict
+from urllib.parse import urlparse
+from dedup import normalize_text
+from geo import haversine_km
+
+BANDS, ROWS = 8, 5  # candidate when names agree on all ROWS values of any band (~0.65 Jaccard)
+NAME_THRESHOLD = 0.7  # trigram Jaccard for a verified match
+STRONG_NAME_THRESHOLD = 0.3  # enough when phone, email or website domain also match
+MAX_DISTANCE_KM = 1.0  # records with coordinates further apart are different businesses
+BLOCK_PRECISION = 5  # geohash cell ~4.9 x 4.9 km
+PAIRWISE_BLOCK = 24  # blocks up to this size are compared pairwise
+SIGNATURE_SIZE = BANDS * ROWS
+
+_TITLE_SPLIT_RE = re.compile(r'\s+-\s+|\s*[|:–—·•]\s*')
+# Page-title segments that are not the business name
+BOILERPLATE = {
+    'home', 'homepage', 'home page', 'welcome', 'official site', 'official website', 'website',
+    'contact', 'contact us', 'about', 'about us', 'services', 'our services', 'book appointment',
+    'book an appointment', 'appointments', 'reviews', 'location', 'locations', 'index',
+}
+NAME_STOPWORDS = {'the', 'and', 'of', 'a', 'an', 'pvt', 'private', 'ltd', 'limited', 'llc', 'inc', 'co'}
+# Websites that list many businesses; a shared listing domain says nothing
+LISTING_DOMAINS = {
+    'yelp.com', 'facebook.com', 'instagram.com', 'google.com', 'justdial.com', 'practo.com',
+    'tripadvisor.com', 'linkedin.com', 'twitter.com', 'x.com', 'youtube.com', 'sulekha.com',
+    'openstreetmap.org', 'yellowpages.com', 'wikipedia.org',
+}
+# Fields the merge fills in and that make a record "richer"
+MERGE_FIELDS = ('email', 'phone', 'website_url', 'source_url', 'address', 'lat', 'lon', 'geohash', 'location',
+                'business_name', 'business_type')
+
+
+def clean_name(name):
+    """Business name without page-title boilerplate ("Home - Smile Dental | Mumbai" -> "Smile Dental")."""
+    segments = [s for s in _TITLE_SPLIT_RE.split(name or '') if s.strip()]
+    for segment in segments:
+        if normalize_text(segment) not in BOILERPLATE:
+            return segment.strip()
+    return (name or '').strip()
+
+
+def name_tokens(name):
+    return [t for t in normalize_text(clean_name(name)).split() if t not in NAME_STOPWORDS]
+
+
+def text_shingles(text):
+    """Character trigrams of a normalized name."""
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def signature(shingles):
+    """
+    MinHash signature by one-permutation hashing: each shingle is hashed once
+    and the hash picks the bin it competes for, instead of one hash function
+    per signature value. Empty bins borrow the next filled bin's value, tagged
+    with the distance (densification), so short names still fill every bin.
+    hash() is salted per process, which is fine: signatures never leave the run.
+    """
+    bins = [None] * SIGNATURE_SIZE
+    for shingle in shingles:
+        h = hash(shingle) & 0xFFFFFFFFFFFFFFFF
+        index, value = h % SIGNATURE_SIZE, h // SIGNATURE_SIZE
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    if None not in bins:
+        return bins
+    dense = list(bins)
+    source = None
+    # Right to left over the bins twice, so the last bins can borrow from the first
+    for b in range(2 * SIGNATURE_SIZE - 1, -1, -1):
+        index = b % SIGNATURE_SIZE
+        if bins[index] is not None:
+            source = index
+        elif b < SIGNATURE_SIZE and source is not None:
+            dense[index] = (bins[source], (source - index) % SIGNATURE_SIZE)
+    return dense
+
+
+def band_keys(shingles):
+    """LSH bucket keys: the signature cut into BANDS bands of ROWS values."""
+    values = signature(shingles)
+    return tuple(hash((band, *values[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def website_domain(url):
+    if not url or '://' not in url:
+        return None
+    host = urlparse(url).netloc.lower().split(':')[0]
+    host = host[4:] if host.startswith('www.') else host
+    if not host or any(host == d or host.endswith('.' + d) for d in LISTING_DOMAINS):
+        return None
+    return host
+
+
+def phone_key(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def strong_keys(record):
+    keys = []
+    if record.get('email'):
+        keys.append('email:' + record['email'].strip().lower())
+    phone = phone_key(record.get('phone'))
+    if phone:
+        keys.append('phone:' + phone)
+    for field in ('website_url', 'source_url'):
+        domain = website_domain(record.get(field))
+        if domain:
+            keys.append('domain:' + domain)
+            break
+    return keys
+
+
+def richness(record):
+    score = sum(1 for field in MERGE_FIELDS if record.get(field) not in (None, ''))
+    # Contacted leads stay canonical so their history is kept
+    if record.get('status') not in (None, 'new'):
+        score += 100
+    return score
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while parent.get(x, x) != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, x, y):
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            root = min(rx, ry)
+            self.parent.setdefault(root, root)
+            self.parent[max(rx, ry)] = root
+
+
+class Resolver:
+    """
+    Clusters duplicate records (dicts with lead columns). cluster() returns
+    lists of record indices with more than one member; stats counts blocks,
+    candidate pairs and verified matches.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        # Normalized once per record: cleaned name and location
+        self.names = [' '.join(name_tokens(r.get('name'))) for r in records]
+        self.locations = [normalize_text(r.get('location')) or None for r in records]
+        self._shingles = {}
+        self._bands = {}
+        self.stats = {'records': len(records), 'blocks': 0, 'candidates': 0, 'matches': 0}
+
+    def shingles(self, i):
+        shingles = self._shingles.get(i)
+        if shingles is None:
+            shingles = self._shingles[i] = text_shingles(self.names[i])
+        return shingles
+
+    def block_keys(self, i):
+        record = self.records[i]
+        if not self.names[i]:
+            return []
+        first = self.names[i].split()[0]
+        keys = []
+        if record.get('geohash'):
+            keys.append('geo:' + record['geohash'][:BLOCK_PRECISION])
+        if self.locations[i]:
+            keys.append(f"loc:{self.locations[i]}:{first}")
+        if len(keys) < 2:
+            # A record without coordinates (web results) or without a location
+            # still needs a block it shares with the other kind
+            keys.append(f"name:{normalize_text(record.get('niche'))}:{first}")
+        return keys
+
+    def _place(self, i):
+        record = self.records[i]
+        point = (record['lat'], record['lon']) if record.get('lat') is not None and record.get('lon') is not None else None
+        return point, self.locations[i]
+
+    def same(self, i, j, threshold=NAME_THRESHOLD):
+        return jaccard(self.shingles(i), self.shingles(j)) >= threshold
+
+    def _link(self, uf, places, i, j, threshold):
+        """Union i and j if their names match and their clusters are not in different places."""
+        self.stats['candidates'] += 1
+        ri, rj = uf.find(i), uf.find(j)
+        if ri == rj:
+            return
+        # A cluster's place is the first point and location known for any
+        # member, so records without them cannot chain distant businesses
+        (pi, li), (pj, lj) = places.get(ri) or self._place(i), places.get(rj) or self._place(j)
+        if pi and pj and haversine_km(*pi, *pj) > MAX_DISTANCE_KM:
+            return
+        if li and lj and li != lj:
+            return
+        if self.same(i, j, threshold):
+            self.stats['matches'] += 1
+            uf.union(ri, rj)
+            places[uf.find(ri)] = (pi or pj, li or lj)
+
+    def _candidates(self, members):
+        if len(members) <= PAIRWISE_BLOCK:
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    yield members[x], members[y]
+            return
+        buckets = defaultdict(list)
+        for i in members:
+            keys = self._bands.get(i)
+            if keys is None:
+                shingles = self.shingles(i)
+                # Signatures are reused when the record shows up in another block
+                keys = self._bands[i] = band_keys(shingles) if shingles else ()
+            for key in keys:
+                buckets[key].append(i)
+        seen = set()
+        for bucket in buckets.values():
+            for x in range(len(bucket)):
+                for y in range(x + 1, len(bucket)):
+                    pair = (bucket[x], bucket[y])
+                    if pair not in seen:
+                        seen.add(pair)
+                        yield pair
+
+    def cluster(self):
+        uf = _UnionFind()
+        places = {}
+        blocks = defaultdict(list)
+        linked = defaultdict(list)
+        for i, record in enumerate(self.records):
+            for key in self.block_keys(i):
+                blocks[key].append(i)
+            for key in strong_keys(record):
+                linked[key].append(i)
+        self.stats['blocks'] = len(blocks)
+        for members in blocks.values():
+            if len(members) < 2:
+                continue
+            for i, j in self._candidates(members):
+                self._link(uf, places, i, j, NAME_THRESHOLD)
+            # Shingles are only needed while the block is compared
+            self._shingles.clear()
+        for members in linked.values():
+            first = members[0]
+            for j in members[1:]:
+                self._link(uf, places, first, j, STRONG_NAME_THRESHOLD)
+            self._shingles.clear()
+        clusters = defaultdict(list)
+        for i in uf.parent:
+            clusters[uf.find(i)].append(i)
+        return [sorted(members) for members in clusters.values() if len(members) > 1]
+
+
+def merge(records):
+    """(survivor, values): the richest record and the empty fields it gains from the others."""
+    ranked = sorted(records, key=richness, reverse=True)
+    survivor = ranked[0]
+    values = {}
+    if clean_name(survivor['name']) != survivor['name']:
+        # A page title; prefer a member's plain business name
+        values['name'] = next((r['name'] for r in ranked[1:] if r.get('name') and clean_name(r['name']) == r['name']),
+                              clean_name(survivor['name']))
+    for field in MERGE_FIELDS:
+        if survivor.get(field) not in (None, ''):
+            continue
+        for other in ranked[1:]:
+            if other.get(field) not in (None, ''):
+                values[field] = other[field]
+                break
+    # Coordinates travel together
+    if 'lat' in values or 'lon' in values:
+        source = next(r for r in ranked[1:] if r.get('lat') is not None)
+        values.update(lat=source['lat'], lon=source['lon'], geohash=source.get('geohash'))
+    return survivor, values
+
+
+def dedupe_rows(rows):
+    """Collapse duplicate lead rows of one batch into their merged survivors."""
+    resolver = Resolver(rows)
+    dropped = set()
+    merged = {}
+    for members in resolver.cluster():
+        survivor, values = merge([rows[i] for i in members])
+        index = next(i for i in members if rows[i] is survivor)
+        merged[index] = {**survivor, **values}
+        dropped.update(i for i in members if i != index)
+    return [merged.get(i, row) for i, row in enumerate(rows) if i not in dropped]
+
+
+def resolve_leads(session=None, dry_run=False):
+    """
+    Resolve the leads table: each cluster's survivor gains the empty fields of
+    its duplicates, and duplicates still in status 'new' become status
+    'duplicate' with duplicate_of set. Returns the number of leads marked.
+    """
+    from sqlalchemy import select
+    from db import Lead, UnitOfWork, STREAM_BATCH_SIZE
+    columns = [Lead.id, Lead.name, Lead.status, Lead.niche] + [getattr(Lead, f) for f in MERGE_FIELDS]
+    started = time.monotonic()
+    with UnitOfWork(session) as uow:
+        records = [dict(row._mapping) for row in uow.session.execute(
+            select(*columns).where(Lead.status != 'duplicate').execution_options(yield_per=STREAM_BATCH_SIZE))]
+        resolver = Resolver(records)
+        clusters = resolver.cluster()
+        marked = 0
+        survivors = []
+        for members in clusters:
+            survivor, values = merge([records[i] for i in members])
+            donors = sorted((records[i] for i in members if records[i] is not survivor), key=richness, reverse=True)
+            if values.get('email') and any(r['status'] != 'new' and r['email'] == values['email'] for r in donors):
+                # A lead that is not marked keeps its email, which is unique; take one a duplicate lets go of
+                email = next((r['email'] for r in donors if r['status'] == 'new' and r['email']), None)
+                if email:
+                    values['email'] = email
+                else:
+                    del values['email']
+            for i in members:
+                record = records[i]
+                if record is survivor or record['status'] != 'new':
+                    continue
+                marked += 1
+                if not dry_run:
+                    moved = {'email': None} if values.get('email') == record['email'] else {}
+                    uow.update(Lead, record['id'], status='duplicate', duplicate_of=survivor['id'], **moved)
+            if values:
+                survivors.append((survivor['id'], values))
+        if not dry_run:
+            # Duplicates first: an email moves to the survivor only after its old row lets go of it
+            uow.flush()
+            for lead_id, values in survivors:
+                uow.update(Lead, lead_id, **values)
+        else:
+            uow.session.rollback()
+    s = resolver.stats
+    print(f"Resolved {s['records']} leads in {time.monotonic() - started:.1f}s: {s['blocks']} blocks, "
+          f"{s['candidates']} candidate pairs, {len(clusters)} clusters, {marked} duplicates"
+          f"{' (dry run)' if dry_run else ''}")
+    return marked
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Merge duplicate leads across sources.")
+    parser.add_argument('--dry-run', action='store_true', help="report clusters without writing")
+    args = parser.parse_args(sys.argv[1:])
+    resolve_leads(dry_run=args.dry_run)
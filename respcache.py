@@ -0,0 +1,220 @@
+"""
+Persistent cache for provider responses (geocoding, places searches).
+Entries are keyed by provider plus normalized request parameters and live in
+a local SQLite file (cache.path), independent of the leads database. Each
+provider has its own TTL; the file is kept under cache.max_mb by evicting the
+least recently used entries. Hit/miss counters are kept per provider.
+
+Offline mode (cache.offline or LEAD_CACHE_OFFLINE=1) serves cached entries,
+expired or not, and raises CacheMiss instead of calling a provider, so a run
+can be replayed without network. When a fetch raises ProviderUnavailable
+(e.g. quota.QuotaExceeded), an expired entry is served instead if there is one.
+
+Usage: python respcache.py stats | clear [provider]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from dbengine import ROOT_DIR, config
+
+CACHE_CONFIG = config.get('cache', {})
+DEFAULT_TTL = 86400
+MISSING = object()
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode when a response is not cached."""
+
+
+class ProviderUnavailable(Exception):
+    """Raised by a fetch that must not call its provider now; stale entries may stand in."""
+
+
+def normalize_params(params):
+    """Canonical form of request parameters: sorted keys, trimmed lowercase strings, no Nones."""
+    normalized = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = ' '.join(value.lower().split())
+        normalized[str(key)] = value
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+def cache_key(provider, params):
+    return hashlib.sha1(f"{provider}|{normalize_params(params)}".encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=None, max_mb=None, ttl=None, offline=None):
+        path = path or CACHE_CONFIG.get('path', 'data/response_cache.db')
+        self.path = path if path == ':memory:' or os.path.isabs(path) else os.path.join(ROOT_DIR, path)
+        self.max_bytes = int((max_mb or CACHE_CONFIG.get('max_mb', 200)) * 1024 * 1024)
+        self.ttl = ttl if ttl is not None else CACHE_CONFIG.get('ttl', {})
+        if offline is None:
+            offline = CACHE_CONFIG.get('offline', False) or os.getenv('LEAD_CACHE_OFFLINE', '') in ('1', 'true')
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+
+    def _connect(self):
+        if self._conn is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Shared by the threads of one process (guarded by _lock); WAL for other processes
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=wal")
+            conn.execute("PRAGMA synchronous=normal")
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, provider TEXT NOT NULL, params TEXT NOT NULL, value TEXT NOT NULL,
+                size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS cache_stats (
+                provider TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0,
+                evictions INTEGER NOT NULL DEFAULT 0)""")
+            self._conn = conn
+        return self._conn
+
+    def ttl_for(self, provider):
+        return self.ttl.get(provider, DEFAULT_TTL)
+
+    def _count(self, conn, provider, column, n=1):
+        conn.execute(f"INSERT INTO cache_stats (provider, {column}) VALUES (?, ?) "
+                     f"ON CONFLICT (provider) DO UPDATE SET {column} = {column} + excluded.{column}", (provider, n))
+
+    def get(self, provider, params, stale=False):
+        """Cached value, or MISSING. Expired entries count as misses unless offline or stale=True."""
+        key = cache_key(provider, params)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            fresh = row is not None and (self.offline or stale or now - row[1] < self.ttl_for(provider))
+            conn.execute("BEGIN")
+            if fresh:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._count(conn, provider, 'hits' if fresh else 'misses')
+            conn.execute("COMMIT")
+        return json.loads(row[0]) if fresh else MISSING
+
+    def set(self, provider, params, value):
+        key = cache_key(provider, params)
+        data = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO responses (key, provider, params, value, size, created_at, last_access) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, provider, normalize_params(params), data, len(data), now, now))
+            self._writes += 1
+            if self._writes % 100 == 1:
+                self._evict(conn)
+
+    def _evict(self, conn):
+        """Drop least recently used entries until the cache is back under 90% of max_bytes."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for key, provider, size in conn.execute("SELECT key, provider, size FROM responses ORDER BY last_access"):
+            victims.append((key, provider))
+            freed += size
+            if freed >= target:
+                break
+        conn.execute("BEGIN")
+        conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key, _ in victims])
+        per_provider = {}
+        for _, provider in victims:
+            per_provider[provider] = per_provider.get(provider, 0) + 1
+        for provider, n in per_provider.items():
+            self._count(conn, provider, 'evictions', n)
+        conn.execute("COMMIT")
+
+    def fetch(self, provider, params, fetch):
+        """Return the cached response for (provider, params), calling fetch() on a miss."""
+        value = self.get(provider, params)
+        if value is not MISSING:
+            return value
+        if self.offline:
+            raise CacheMiss(f"{provider} {normalize_params(params)} not cached (offline mode)")
+        try:
+            value = fetch()
+        except ProviderUnavailable:
+            value = self._stale(provider, params)
+            if value is MISSING:
+                raise
+            return value
+        self.set(provider, params, value)
+        return value
+
+    async def afetch(self, provider, params, fetch):
+        """
+        fetch() for coroutines: fetch is an async callable. The SQLite reads
+        and writes (which may evict) run on a worker thread, off the event loop.
+        """
+        value = await asyncio.to_thread(self.get, provider, params)
+        if value is not MISSING:
+            return value
+        if self.offline:
+            raise CacheMiss(f"{provider} {normalize_params(params)} not cached (offline mode)")
+        try:
+            value = await fetch()
+        except ProviderUnavailable:
+            value = await asyncio.to_thread(self._stale, provider, params)
+            if value is MISSING:
+                raise
+            return value
+        await asyncio.to_thread(self.set, provider, params, value)
+        return value
+
+    def _stale(self, provider, params):
+        """Expired entry for a provider that cannot be called, or MISSING."""
+        value = self.get(provider, params, stale=True)
+        if value is not MISSING:
+            print(f"{provider} unavailable, serving expired cache entry")
+        return value
+
+    def stats(self):
+        """Per-provider hits, misses, evictions, entries and bytes."""
+        with self._lock:
+            conn = self._connect()
+            result = {provider: {'hits': hits, 'misses': misses, 'evictions': evictions, 'entries': 0, 'bytes': 0}
+                      for provider, hits, misses, evictions in conn.execute("SELECT * FROM cache_stats")}
+            for provider, entries, size in conn.execute(
+                    "SELECT provider, COUNT(*), SUM(size) FROM responses GROUP BY provider"):
+                result.setdefault(provider, {'hits': 0, 'misses': 0, 'evictions': 0})
+                result[provider].update(entries=entries, bytes=size)
+        return result
+
+    def clear(self, provider=None):
+        with self._lock:
+            conn = self._connect()
+            if provider:
+                conn.execute("DELETE FROM responses WHERE provider = ?", (provider,))
+            else:
+                conn.execute("DELETE FROM responses")
+
+
+# Process-wide cache used by the providers
+response_cache = ResponseCache()
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    if command == 'clear':
+        response_cache.clear(sys.argv[2] if len(sys.argv) > 2 else None)
+        print("Cache cleared.")
+    else:
+        for provider, s in sorted(response_cache.stats().items()):
+            lookups = s['hits'] + s['misses']
+            rate = s['hits'] / lookups * 100 if lookups else 0
+            print(f"{provider:<10} hits {s['hits']:>7}  misses {s['misses']:>7}  hit rate {rate:5.1f}%  "
+                  f"entries {s['entries']:>6}  {s['bytes'] / 1024:,.0f} KiB  evicted {s['evictions']}")
@@ -1,18 +1,19 @@
 import yaml
-import os
-from db import Session, Lead
-from datetime import datetime
+from db import Lead
 from place_finder import find_leads_by_location
 from enricher import enrich_leads
 from emailer import send_initial_email
+from workqueue import drain
 import time
 
 with open('config.yaml') as f:
     config = yaml.safe_load(f)
 
-def run_sales_campaign(niche, location):
+def run_sales_campaign(niche, location, worker_id=None):
     """
     Full workflow: find leads by location, enrich emails, send personalized sales emails.
+    Emails go out through the leased 'email' stage (see workqueue.py), like
+    emailer.email_leads, so a lead is never emailed by two workers.
     """
     print(f"Starting sales campaign for {niche} near {location}")
     # 1. Find leads
@@ -21,27 +22,15 @@ def run_sales_campaign(niche, location):
     # 2. Enrich emails
     enrich_leads()
     # 3. Send emails to new leads with email
-    session = Session()
-    leads = session.query(Lead).filter(
-        Lead.niche == niche,
-        Lead.email.isnot(None),
-        Lead.status == 'new'
-    ).all()
-    print(f"Sending emails to {len(leads)} leads")
-    for lead in leads:
-        # Use emailer's AI to generate personalized sales email
-        from emailer import generate_personalized_email
-        subject, body = generate_personalized_email(lead, niche)
-        # Send
-        from emailer import send_email
-        success = send_email(lead.email, subject, body)
-        if success:
-            lead.status = 'emailed'
-            lead.last_contacted = datetime.utcnow()
-            session.commit()
+    print(f"Sending emails to new {niche} leads")
+
+    def send(session, lead):
+        sent = send_initial_email(lead, niche)
+        if sent:
             print(f"Sent to {lead.email}")
         time.sleep(1)
-    session.close()
+        return sent
+    drain('email', send, worker_id=worker_id, where=Lead.niche == niche)
     print("Campaign complete")
 
 if __name__ == '__main__':
@@ -0,0 +1,121 @@
+"""
+Search history for incremental re-discovery.
+Every discovery query that completes is recorded in the search_history table,
+keyed by provider and normalized query: when it ran, how many places it found,
+how many new leads it produced, and a digest of the places returned. A query
+is only run again once its refresh interval has passed. Queries that produce
+new leads are refreshed every min_interval; each run that produces nothing and
+returns the same places as last time doubles the interval (backoff), up to
+max_interval. A run that returns different places without new leads keeps
+the current interval.
+
+Usage: python search_history.py [--due] | reset [provider]
+"""
+import sys
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
+from db import engine, config, Session, SearchHistory
+from respcache import normalize_params
+
+REFRESH_CONFIG = config.get('discovery', {}).get('refresh', {})
+MIN_INTERVAL = REFRESH_CONFIG.get('min_interval', 86400)
+MAX_INTERVAL = REFRESH_CONFIG.get('max_interval', 30 * 86400)
+BACKOFF = REFRESH_CONFIG.get('backoff', 2)
+
+_ready = False
+
+
+def _ensure_table():
+    global _ready
+    if not _ready:
+        SearchHistory.__table__.create(engine, checkfirst=True)
+        _ready = True
+
+
+def query_key(provider, query):
+    """Stable key for a (provider, query): case and whitespace do not matter."""
+    params = {'niche': query.niche, 'location': query.location, 'term': query.term or query.niche}
+    return hashlib.sha1(f"{provider}|{normalize_params(params)}".encode()).hexdigest()
+
+
+def result_digest(fingerprints):
+    """Digest of the places a query returned, independent of their order."""
+    return hashlib.sha1('\n'.join(sorted(set(fingerprints))).encode()).hexdigest()
+
+
+def refresh_interval(unproductive_runs):
+    """Seconds until the next run after this many unproductive runs in a row."""
+    return min(MIN_INTERVAL * BACKOFF ** unproductive_runs, MAX_INTERVAL)
+
+
+def due_queries(session, provider, queries, now=None):
+    """The queries whose refresh time has come (or that never ran), in their original order."""
+    _ensure_table()
+    now = now or datetime.utcnow()
+    keys = {query_key(provider, q): q for q in queries}
+    not_due = set(session.execute(
+        select(SearchHistory.key).where(SearchHistory.key.in_(keys), SearchHistory.next_run_at > now)
+    ).scalars())
+    return [q for q in queries if query_key(provider, q) not in not_due]
+
+
+def record_run(session, provider, query, found, new, digest, now=None):
+    """Record a completed run and schedule the next one. Commits; returns the next run time."""
+    _ensure_table()
+    now = now or datetime.utcnow()
+    key = query_key(provider, query)
+    entry = session.get(SearchHistory, key)
+    if entry is None:
+        entry = SearchHistory(key=key, provider=provider, niche=query.niche, location=query.location,
+                              term=query.term, runs=0, unproductive_runs=0)
+        session.add(entry)
+    if new:
+        entry.unproductive_runs = 0
+    elif digest == entry.digest:
+        entry.unproductive_runs += 1
+    entry.runs += 1
+    entry.last_run_at = now
+    entry.last_found = found
+    entry.last_new = new
+    entry.digest = digest
+    entry.next_run_at = now + timedelta(seconds=refresh_interval(entry.unproductive_runs))
+    session.commit()
+    return entry.next_run_at
+
+
+def reset(session, provider=None):
+    """Forget the history (of one provider), so every query runs next time."""
+    _ensure_table()
+    statement = delete(SearchHistory)
+    if provider:
+        statement = statement.where(SearchHistory.provider == provider)
+    count = session.execute(statement).rowcount
+    session.commit()
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show or reset the discovery search history.")
+    parser.add_argument('command', nargs='?', choices=['show', 'reset'], default='show')
+    parser.add_argument('provider', nargs='?')
+    parser.add_argument('--due', action='store_true', help="only queries that will run next time")
+    args = parser.parse_args(sys.argv[1:])
+    _ensure_table()
+    session = Session()
+    try:
+        if args.command == 'reset':
+            print(f"Removed {reset(session, args.provider)} entries")
+            sys.exit(0)
+        statement = select(SearchHistory).order_by(SearchHistory.next_run_at)
+        if args.provider:
+            statement = statement.where(SearchHistory.provider == args.provider)
+        if args.due:
+            statement = statement.where(SearchHistory.next_run_at <= datetime.utcnow())
+        for entry in session.execute(statement).scalars():
+            text = f"{entry.term or entry.niche} in {entry.location}" if entry.location else entry.term or entry.niche
+            print(f"{entry.provider:<9} {text[:50]:<50} runs {entry.runs:>4}  last {entry.last_new}/{entry.last_found} new"
+                  f"  next {entry.next_run_at:%Y-%m-%d %H:%M}")
+    finally:
+        session.close()
@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
-from flask import Flask, send_from_directory, jsonify, render_template
-from db import Session, Lead, init_db
+import os
+os.environ.setdefault('LEAD_DB_ROLE', 'web')  # read by dbengine when db is imported
+from flask import Flask, Response, request, send_from_directory, jsonify, render_template
+from db import Session, Lead, init_db, get_table_version
 from lead_finder import find_leads
 from emailer import email_leads
 from reply_monitor import check_replies
 from prototype import build_prototypes
 from conversation import handle_conversation
-import os
+from datetime import datetime
+from urllib.parse import urlencode
+import hashlib
 import yaml
 
 with open('config.yaml') as f:
@@ -21,22 +25,82 @@ init_db()
 def index():
     return render_template('index.html')
 
+# Columns the dashboard may request with ?fields=
+LEAD_FIELDS = {
+    'id', 'name', 'email', 'phone', 'address', 'source_url', 'niche', 'business_type',
+    'business_name', 'location', 'website_url', 'status', 'prototype_url', 'notes',
+    'last_contacted', 'reply_count', 'last_message_role', 'last_message_at',
+    'created_at', 'updated_at'
+}
+DEFAULT_LEAD_FIELDS = ['id', 'name', 'email', 'status', 'prototype_url', 'last_contacted']
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
 @app.route('/leads')
 def list_leads():
+    """
+    List leads one keyset page at a time.
+    Query params: cursor (last id seen), limit, fields (comma separated),
+    status and niche (comma separated). The next page's cursor is returned in
+    the X-Next-Cursor and Link headers. Responses carry an ETag built from the
+    leads change counter, so an unchanged poll costs a single lookup.
+    """
+    fields = request.args.get('fields')
+    fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(DEFAULT_LEAD_FIELDS)
+    unknown = [f for f in fields if f not in LEAD_FIELDS]
+    if unknown:
+        return jsonify({'error': f"unknown fields: {', '.join(unknown)}"}), 400
+    if 'id' not in fields:
+        fields.insert(0, 'id')  # needed for the cursor
+    try:
+        cursor = int(request.args.get('cursor', 0))
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'cursor and limit must be integers'}), 400
+    statuses = [v for v in request.args.get('status', '').split(',') if v]
+    niches = [v for v in request.args.get('niche', '').split(',') if v]
+
     session = Session()
-    leads = session.query(Lead).all()
+    try:
+        version = get_table_version(session, 'leads')
+        etag = None
+        if version is not None:
+            key = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+            etag = f"leads-{version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"
+            if request.if_none_match.contains(etag):
+                resp = Response(status=304)
+                resp.set_etag(etag)
+                return resp
+
+        query = session.query(*[getattr(Lead, f) for f in fields]).filter(Lead.id > cursor)
+        if statuses:
+            query = query.filter(Lead.status.in_(statuses))
+        if niches:
+            query = query.filter(Lead.niche.in_(niches))
+        rows = query.order_by(Lead.id).limit(limit + 1).all()
+    finally:
+        session.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     result = []
-    for l in leads:
-        result.append({
-            'id': l.id,
-            'name': l.name,
-            'email': l.email,
-            'status': l.status,
-            'prototype_url': l.prototype_url,
-            'last_contacted': l.last_contacted.isoformat() if l.last_contacted else None
-        })
-    session.close()
-    return jsonify(result)
+    for row in rows:
+        item = {}
+        for f in fields:
+            value = getattr(row, f)
+            item[f] = value.isoformat() if isinstance(value, datetime) else value
+        result.append(item)
+    resp = jsonify(result)
+    if has_more:
+        next_cursor = rows[-1].id
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        resp.headers['X-Next-Cursor'] = str(next_cursor)
+        resp.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    if etag:
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'no-cache'  # always revalidate; 304 when unchanged
+    return resp
 
 @app.route('/health')
 def health():
@@ -0,0 +1,174 @@
+"""
+Dashboard statistics for the leads table.
+Counts are GROUP BY aggregates; optionally (database.stat_counters in config.yaml)
+triggers keep per-status counters and per-day funnel counts up to date on every
+status transition, so the dashboard reads O(number of statuses) rows.
+"""
+from datetime import date, timedelta
+from sqlalchemy import Column, Integer, String, Date, func, case, text
+from db import Base, engine, config
+
+STAT_COUNTERS = config['database'].get('stat_counters', False)
+
+# Funnel stage reached when a lead enters a status
+FUNNEL_STAGES = {
+    'emailed': 'emailed',
+    'contacted': 'emailed',
+    'replied_yes': 'replied',
+    'replied_no': 'replied',
+    'prototype_sent': 'prototyped',
+    'website_created': 'prototyped',
+}
+FUNNEL_ORDER = ['discovered', 'enriched', 'emailed', 'replied', 'prototyped']
+# Statuses a lead can only be in after it was emailed / got a prototype
+EMAILED_STATUSES = {'emailed', 'contacted', 'replied_yes', 'replied_no', 'prototype_sent',
+                    'in_conversation', 'website_created'}
+PROTOTYPED_STATUSES = {'prototype_sent', 'in_conversation', 'website_created'}
+
+class LeadStatusCount(Base):
+    __tablename__ = 'lead_status_counts'
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class LeadFunnelDaily(Base):
+    __tablename__ = 'lead_funnel_daily'
+    day = Column(Date, primary_key=True)
+    stage = Column(String, primary_key=True)  # one of FUNNEL_ORDER
+    count = Column(Integer, nullable=False, default=0)
+
+def _stage_case(column):
+    whens = ' '.join(f"WHEN '{status}' THEN '{stage}'" for status, stage in FUNNEL_STAGES.items())
+    return f"CASE {column} {whens} END"
+
+_SQLITE_TRIGGERS = {
+    'trg_leads_stats_insert': """
+        CREATE TRIGGER IF NOT EXISTS trg_leads_stats_insert AFTER INSERT ON leads BEGIN
+            INSERT INTO lead_status_counts (status, count) VALUES (COALESCE(NEW.status, 'unknown'), 1)
+                ON CONFLICT (status) DO UPDATE SET count = count + 1;
+            INSERT INTO lead_funnel_daily (day, stage, count) VALUES (date('now'), 'discovered', 1)
+                ON CONFLICT (day, stage) DO UPDATE SET count = count + 1;
+        END""",
+    'trg_leads_stats_status': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leads_stats_status AFTER UPDATE OF status ON leads
+        WHEN OLD.status IS NOT NEW.status BEGIN
+            UPDATE lead_status_counts SET count = count - 1 WHERE status = COALESCE(OLD.status, 'unknown');
+            INSERT INTO lead_status_counts (status, count) VALUES (COALESCE(NEW.status, 'unknown'), 1)
+                ON CONFLICT (status) DO UPDATE SET count = count + 1;
+            INSERT INTO lead_funnel_daily (day, stage, count)
+                SELECT date('now'), stage, 1 FROM (SELECT {_stage_case('NEW.status')} AS stage) WHERE stage IS NOT NULL
+                ON CONFLICT (day, stage) DO UPDATE SET count = count + 1;
+        END""",
+    'trg_leads_stats_enriched': """
+        CREATE TRIGGER IF NOT EXISTS trg_leads_stats_enriched AFTER UPDATE OF email ON leads
+        WHEN OLD.email IS NULL AND NEW.email IS NOT NULL BEGIN
+            INSERT INTO lead_funnel_daily (day, stage, count) VALUES (date('now'), 'enriched', 1)
+                ON CONFLICT (day, stage) DO UPDATE SET count = count + 1;
+        END""",
+    'trg_leads_stats_delete': """
+        CREATE TRIGGER IF NOT EXISTS trg_leads_stats_delete AFTER DELETE ON leads BEGIN
+            UPDATE lead_status_counts SET count = count - 1 WHERE status = COALESCE(OLD.status, 'unknown');
+        END""",
+}
+
+_PG_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION leads_stats_counters() RETURNS trigger AS $$
+DECLARE
+    funnel_stage text;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND (TG_OP = 'DELETE' OR OLD.status IS DISTINCT FROM NEW.status) THEN
+        UPDATE lead_status_counts SET count = count - 1 WHERE status = COALESCE(OLD.status, 'unknown');
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM NEW.status THEN
+        INSERT INTO lead_status_counts (status, count) VALUES (COALESCE(NEW.status, 'unknown'), 1)
+            ON CONFLICT (status) DO UPDATE SET count = lead_status_counts.count + 1;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        funnel_stage := 'discovered';
+    ELSIF OLD.status IS DISTINCT FROM NEW.status THEN
+        funnel_stage := {_stage_case('NEW.status')};
+    END IF;
+    IF funnel_stage IS NOT NULL THEN
+        INSERT INTO lead_funnel_daily (day, stage, count) VALUES (CURRENT_DATE, funnel_stage, 1)
+            ON CONFLICT (day, stage) DO UPDATE SET count = lead_funnel_daily.count + 1;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.email IS NULL AND NEW.email IS NOT NULL THEN
+        INSERT INTO lead_funnel_daily (day, stage, count) VALUES (CURRENT_DATE, 'enriched', 1)
+            ON CONFLICT (day, stage) DO UPDATE SET count = lead_funnel_daily.count + 1;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql
+"""
+
+def install_stat_counters():
+    """Create the counter triggers and seed lead_status_counts from the current table."""
+    with engine.begin() as conn:
+        if engine.dialect.name == 'sqlite':
+            for ddl in _SQLITE_TRIGGERS.values():
+                conn.execute(text(ddl))
+        elif engine.dialect.name == 'postgresql':
+            conn.execute(text(_PG_FUNCTION))
+            conn.execute(text("DROP TRIGGER IF EXISTS trg_leads_stats ON leads"))
+            conn.execute(text(
+                "CREATE TRIGGER trg_leads_stats AFTER INSERT OR UPDATE OR DELETE ON leads "
+                "FOR EACH ROW EXECUTE FUNCTION leads_stats_counters()"
+            ))
+        else:
+            return
+        seeded = conn.execute(text("SELECT COUNT(*) FROM lead_status_counts")).scalar()
+        if not seeded:
+            rebuild_status_counts(conn)
+
+def rebuild_status_counts(conn):
+    """Recompute lead_status_counts from a GROUP BY over leads (repair/seed)."""
+    conn.execute(text("DELETE FROM lead_status_counts"))
+    conn.execute(text(
+        "INSERT INTO lead_status_counts (status, count) "
+        "SELECT COALESCE(status, 'unknown'), COUNT(*) FROM leads GROUP BY COALESCE(status, 'unknown')"
+    ))
+
+def aggregate_stats(session, model):
+    """
+    Dashboard totals as one GROUP BY over a lead model with status,
+    email_sent and prototype_created columns.
+    """
+    rows = session.query(
+        model.status,
+        func.count(),
+        func.sum(case((model.email_sent == True, 1), else_=0)),
+        func.sum(case((model.prototype_created == True, 1), else_=0)),
+    ).group_by(model.status).all()
+    status_counts = {status: count for status, count, _, _ in rows}
+    return {
+        "total_leads": sum(status_counts.values()),
+        "emails_sent": sum(sent or 0 for _, _, sent, _ in rows),
+        "websites_created": sum(created or 0 for _, _, _, created in rows),
+        "status_breakdown": status_counts,
+    }
+
+def counter_stats(session):
+    """
+    Dashboard totals from the trigger-maintained counters: reads one row per status.
+    emails_sent/websites_created are derived from the statuses leads are in.
+    """
+    rows = session.query(LeadStatusCount.status, LeadStatusCount.count).filter(LeadStatusCount.count > 0).all()
+    status_counts = {status: count for status, count in rows}
+    return {
+        "total_leads": sum(status_counts.values()),
+        "emails_sent": sum(c for s, c in status_counts.items() if s in EMAILED_STATUSES),
+        "websites_created": sum(c for s, c in status_counts.items() if s in PROTOTYPED_STATUSES),
+        "status_breakdown": status_counts,
+    }
+
+def funnel_counts(session, days=30):
+    """Per-day funnel counts for the last `days` days, newest first."""
+    since = date.today() - timedelta(days=days - 1)
+    rows = session.query(LeadFunnelDaily.day, LeadFunnelDaily.stage, LeadFunnelDaily.count).filter(
+        LeadFunnelDaily.day >= since
+    ).all()
+    by_day = {}
+    for day, stage, count in rows:
+        by_day.setdefault(day, {s: 0 for s in FUNNEL_ORDER})[stage] = count
+    return [dict(day=day.isoformat(), **counts) for day, counts in sorted(by_day.items(), reverse=True)]
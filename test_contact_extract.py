@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Contact extraction cases that must (not) yield an email.
+python test_contact_extract.py (or pytest test_contact_extract.py)
+"""
+from contact_extract import best, normalize_email
+
+
+def test_obfuscated_emails():
+    assert best("Email: info [at] smile [dot] co [dot] in")[0] == 'info@smile.co.in'
+    assert best("Write to dr dot raj at clinic dot com")[0] == 'dr.raj@clinic.com'
+
+
+def test_prose_is_not_an_email():
+    # "at" and "dot" in ordinary sentences; the last label is no TLD
+    assert best("We are open at 10 dot 30 daily")[0] is None
+    assert normalize_email('open@10.30') is None
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Re-discovered places must not come back as new leads, whichever fingerprint
+the stored lead was given. Runs on an in-memory database:
+python test_place_rows.py (or pytest test_place_rows.py)
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db import Base, Lead
+from dedup import lead_fingerprint
+from ingest import ingest_leads
+from place_finder import osm_place, place_rows
+
+RESULT = {
+    'osm_id': 123456, 'name': 'Smile Dental', 'lat': '19.07', 'lon': '72.87',
+    'display_name': 'Smile Dental, Linking Road, Bandra West, Mumbai',
+    'extratags': {'website': 'https://smiledental.in'},
+}
+
+
+def make_session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def store(session, fingerprint, address):
+    session.add(Lead(name='Smile Dental', address=address, source_url='https://smiledental.in',
+                     status='contacted', fingerprint=fingerprint))
+    session.commit()
+
+
+def test_address_fingerprinted_lead_is_not_ingested_again():
+    # Stored by lead_finder, or backfilled by add_fingerprint_column.py
+    session = make_session()
+    store(session, lead_fingerprint('Smile Dental', RESULT['display_name'], 'https://smiledental.in'),
+          RESULT['display_name'])
+    assert ingest_leads(session, place_rows([osm_place(RESULT)], 'dentist')) == 0
+    assert session.query(Lead).count() == 1
+
+
+def test_ref_fingerprinted_lead_is_not_ingested_again():
+    # Stored by place_finder before discovery recorded addresses
+    session = make_session()
+    store(session, lead_fingerprint('Smile Dental', None, 'https://smiledental.in'), None)
+    assert ingest_leads(session, place_rows([osm_place(RESULT)], 'dentist')) == 0
+    assert session.query(Lead).count() == 1
+
+
+def test_new_place_is_ingested():
+    session = make_session()
+    assert ingest_leads(session, place_rows([osm_place(RESULT)], 'dentist')) == 1
+    assert ingest_leads(session, place_rows([osm_place(RESULT)], 'dentist')) == 0
+    assert session.query(Lead).count() == 1
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Run one pipeline stage as a queue worker until its backlog is drained.
+Start several copies to split a stage's backlog; leads are claimed with
+leases (see workqueue.py) so none is processed twice.
+
+Usage: python worker.py <email|enrich|prototype> [--worker-id ID] [--loop SECONDS] [--concurrency N]
+"""
+import os
+os.environ.setdefault('LEAD_DB_ROLE', 'worker')  # read by dbengine when db is imported
+import time
+import argparse
+from workqueue import STAGES, default_worker_id
+
+def run_stage(stage, worker_id, concurrency=None):
+    if stage == 'email':
+        from emailer import email_leads
+        return email_leads(worker_id=worker_id)
+    elif stage == 'enrich':
+        from enrichment_agent import enrich_pending_leads
+        return enrich_pending_leads(worker_id=worker_id, concurrency=concurrency)
+    elif stage == 'prototype':
+        from prototype import build_prototypes
+        return build_prototypes(worker_id=worker_id)
+
+def main():
+    parser = argparse.ArgumentParser(description="Drain a pipeline stage as a queue worker.")
+    parser.add_argument('stage', choices=sorted(STAGES))
+    parser.add_argument('--worker-id', default=default_worker_id())
+    parser.add_argument('--loop', type=float, default=0,
+                        help="keep polling every N seconds instead of exiting when drained")
+    parser.add_argument('--concurrency', type=int, help="leads in flight (enrich; default enrich.concurrency)")
+    args = parser.parse_args()
+    while True:
+        count = run_stage(args.stage, args.worker_id, args.concurrency)
+        print(f"[{args.worker_id}] {args.stage}: processed {count or 0} leads")
+        if not args.loop:
+            break
+        time.sleep(args.loop)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Lease-based work claiming on the leads table.
+A worker atomically claims a batch of leads for a stage, extends the lease
+while it works (heartbeat) and releases the batch when done. Expired leases
+are reclaimed by other workers, so several processes can drain a stage's
+backlog without processing a lead twice.
+Postgres claims with FOR UPDATE SKIP LOCKED; SQLite serializes writers, so the
+same conditional UPDATE is atomic there.
+drain_pool() runs a stage's network-bound part on a thread pool, with the
+database work kept on the claiming thread.
+"""
+import os
+import socket
+import time
+import uuid
+import yaml
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, case, select, update
+from db import Session, Lead
+
+with open('config.yaml') as f:
+    config = yaml.safe_load(f)
+
+QUEUE_CONFIG = config.get('workqueue', {})
+BATCH_SIZE = QUEUE_CONFIG.get('batch_size', 10)
+LEASE_SECONDS = QUEUE_CONFIG.get('lease_seconds', 300)
+RETRY_AFTER = QUEUE_CONFIG.get('retry_after', 3600)
+COMMIT_EVERY = QUEUE_CONFIG.get('commit_every', 20)
+PROGRESS_EVERY = QUEUE_CONFIG.get('progress_every', 100)
+
+ENRICH_STATUSES = ['new', 'emailed', 'replied_yes', 'in_conversation', 'prototype_sent']
+
+# Which leads each stage works on
+STAGES = {
+    'email': lambda: and_(Lead.status == 'new', Lead.email.isnot(None)),
+    'enrich': lambda: and_(
+        or_(Lead.email.is_(None), Lead.phone.is_(None)),
+        Lead.status.in_(ENRICH_STATUSES)
+    ),
+    'prototype': lambda: and_(Lead.status == 'replied_yes', Lead.prototype_url.is_(None)),
+}
+
+# Claim order per stage, most promising leads first (default: oldest first)
+EXPECTED_YIELD = {
+    # A website can be scraped for free and gives paid lookups a domain to work with
+    'enrich': lambda: case((or_(Lead.website_url.like('http%'), Lead.source_url.like('http%')), 0), else_=1),
+}
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _lease_free(now):
+    return or_(Lead.claim_expires_at.is_(None), Lead.claim_expires_at < now)
+
+def claim_batch(session, stage, worker_id, limit=BATCH_SIZE, lease_seconds=LEASE_SECONDS, where=None):
+    """
+    Claim up to `limit` unleased leads for a stage, narrowed by the optional
+    `where` condition (e.g. Lead.niche == niche). Commits and returns
+    (token, ids); the token must be passed to heartbeat/release.
+    """
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    order = [EXPECTED_YIELD[stage](), Lead.id] if stage in EXPECTED_YIELD else [Lead.id]
+    candidates = select(Lead.id).where(STAGES[stage](), _lease_free(now))
+    if where is not None:
+        candidates = candidates.where(where)
+    candidates = candidates.order_by(*order).limit(limit)
+    if session.get_bind().dialect.name == 'postgresql':
+        candidates = candidates.with_for_update(skip_locked=True)
+    session.execute(
+        update(Lead)
+        .where(Lead.id.in_(candidates.scalar_subquery()), _lease_free(now))
+        .values(claimed_by=worker_id, claim_token=token,
+                claim_expires_at=now + timedelta(seconds=lease_seconds)),
+        execution_options={'synchronize_session': False}
+    )
+    session.commit()
+    ids = session.execute(select(Lead.id).where(Lead.claim_token == token)).scalars().all()
+    return token, ids
+
+def heartbeat(session, ids, token, lease_seconds=LEASE_SECONDS):
+    """Extend the lease on claimed leads. Returns how many are still held."""
+    result = session.execute(
+        update(Lead)
+        .where(Lead.id.in_(ids), Lead.claim_token == token)
+        .values(claim_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds)),
+        execution_options={'synchronize_session': False}
+    )
+    session.commit()
+    return result.rowcount
+
+def release(session, ids, token, retry_after=None):
+    """
+    Release claimed leads. With retry_after (seconds) the leads stay leased,
+    unowned, until then, so a lead that could not be processed is not picked
+    up again immediately.
+    """
+    if not ids:
+        return
+    expires = datetime.utcnow() + timedelta(seconds=retry_after) if retry_after else None
+    session.execute(
+        update(Lead)
+        .where(Lead.id.in_(ids), Lead.claim_token == token)
+        .values(claimed_by=None, claim_token=None, claim_expires_at=expires),
+        execution_options={'synchronize_session': False}
+    )
+    session.commit()
+
+def keep_lease(session, ids, token, lease_seconds=LEASE_SECONDS):
+    """Heartbeat a batch; False if any of its leads was reclaimed by another worker (lease lost)."""
+    return heartbeat(session, ids, token, lease_seconds) >= len(ids)
+
+def finish_batch(session, stage, token, processed, failed, retry_after=RETRY_AFTER):
+    """
+    Release a claimed batch. Leads that failed, and leads the stage finished
+    with that still match its predicate (e.g. enriched with an email but no
+    phone), are held back for retry_after seconds; without that they would be
+    claimed again in the very next batch. Unprocessed leads are released
+    now. `processed` is every lead of the batch the stage got to.
+    """
+    failed = set(failed)
+    done = [i for i in processed if i not in failed]
+    if done:
+        failed.update(session.execute(
+            select(Lead.id).where(Lead.id.in_(done), Lead.claim_token == token, STAGES[stage]())
+        ).scalars())
+    release(session, [i for i in processed if i not in failed], token)
+    release(session, list(failed), token, retry_after=retry_after)
+    # The rest of the batch (after a lost lease), as far as this worker still holds it
+    session.execute(
+        update(Lead).where(Lead.claim_token == token)
+        .values(claimed_by=None, claim_token=None, claim_expires_at=None),
+        execution_options={'synchronize_session': False}
+    )
+    session.commit()
+
+def drain(stage, handler, worker_id=None, batch_size=BATCH_SIZE, lease_seconds=LEASE_SECONDS,
+          retry_after=RETRY_AFTER, max_batches=None, where=None):
+    """
+    Claim and process batches for a stage until its backlog (narrowed by
+    `where`, see claim_batch) is empty.
+    handler(session, lead) returns True when the lead is done; leads it
+    returns False for (or raises on) are held back for retry_after seconds,
+    as are done leads that still match the stage (see finish_batch). If the
+    lease is lost, the rest of the batch is left to the worker that has it.
+    Returns the number of leads processed.
+    """
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    batches = 0
+    session = Session()
+    try:
+        while max_batches is None or batches < max_batches:
+            token, ids = claim_batch(session, stage, worker_id, batch_size, lease_seconds, where)
+            if not ids:
+                break
+            batches += 1
+            handled, failed = [], []
+            last_beat = time.monotonic()
+            for lead in session.query(Lead).filter(Lead.id.in_(ids)).order_by(Lead.id).all():
+                if time.monotonic() - last_beat > lease_seconds / 3:
+                    if not keep_lease(session, ids, token, lease_seconds):
+                        # Another worker has (part of) the batch; handling more could e.g. send twice
+                        print(f"[{worker_id}] {stage}: lease lost, abandoning the rest of the batch")
+                        break
+                    last_beat = time.monotonic()
+                try:
+                    done = handler(session, lead)
+                    session.commit()
+                except Exception as e:
+                    print(f"[{worker_id}] {stage} failed for lead {lead.id}: {e}")
+                    session.rollback()
+                    done = False
+                handled.append(lead.id)
+                if not done:
+                    failed.append(lead.id)
+                processed += 1
+            finish_batch(session, stage, token, handled, failed, retry_after)
+    finally:
+        session.close()
+    return processed
+
+def drain_pool(stage, fetch, apply, worker_id=None, concurrency=4, batch_size=None,
+               lease_seconds=LEASE_SECONDS, retry_after=RETRY_AFTER, commit_every=COMMIT_EVERY,
+               max_batches=None):
+    """
+    drain() for stages that spend their time waiting on the network.
+    fetch(data) runs on a pool of `concurrency` threads with the lead's column
+    values (a dict; no session), and apply(session, lead, result) runs on the
+    calling thread and returns True when the lead is done. Results are
+    committed every `commit_every` leads (every lead on SQLite, whose single
+    write lock must not be held while the threads wait on the network), and
+    progress is printed as it goes.
+    The lease is extended on time even while every thread is still waiting.
+    Returns the number of leads processed.
+    """
+    worker_id = worker_id or default_worker_id()
+    # Enough claimed leads to keep every thread busy
+    batch_size = batch_size or max(BATCH_SIZE, concurrency * 4)
+    processed = updated = 0
+    batches = 0
+    started = time.monotonic()
+    session = Session()
+    if session.get_bind().dialect.name == 'sqlite':
+        # pysqlite starts no transaction before a SAVEPOINT, so a released savepoint is
+        # committed at once, and one rolled back leaves a transaction open; commit per lead
+        commit_every = 1
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while max_batches is None or batches < max_batches:
+                token, ids = claim_batch(session, stage, worker_id, batch_size, lease_seconds)
+                if not ids:
+                    break
+                batches += 1
+                leads = {lead.id: lead for lead in session.query(Lead).filter(Lead.id.in_(ids)).all()}
+                futures = {pool.submit(fetch, lead.to_dict()): lead_id for lead_id, lead in leads.items()}
+                handled, failed = [], []
+                pending = 0  # done since the last commit
+                last_beat = time.monotonic()
+                waiting = set(futures)
+                lost = False
+                while waiting and not lost:
+                    completed, waiting = wait(waiting, timeout=lease_seconds / 3, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        lead = leads[futures[future]]
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"[{worker_id}] {stage} failed for lead {lead.id}: {e}")
+                            done = False
+                        else:
+                            try:
+                                # A savepoint per lead: a failed write (e.g. an email another lead
+                                # already has) is undone without losing the others in the transaction
+                                with session.begin_nested():
+                                    done = apply(session, lead, result)
+                            except Exception as e:
+                                print(f"[{worker_id}] {stage} failed for lead {lead.id}: {e}")
+                                done = False
+                        handled.append(lead.id)
+                        if done:
+                            updated += 1
+                        else:
+                            failed.append(lead.id)
+                        processed += 1
+                        pending += 1
+                        if pending >= commit_every:
+                            session.commit()
+                            pending = 0
+                        if processed % PROGRESS_EVERY == 0:
+                            elapsed = time.monotonic() - started
+                            print(f"[{worker_id}] {stage}: {processed} leads ({updated} done) "
+                                  f"in {elapsed:.0f}s, {processed / elapsed:.1f}/s")
+                    if time.monotonic() - last_beat > lease_seconds / 3:
+                        session.commit()
+                        pending = 0
+                        if not keep_lease(session, ids, token, lease_seconds):
+                            print(f"[{worker_id}] {stage}: lease lost, abandoning the rest of the batch")
+                            for future in waiting:
+                                future.cancel()
+                            lost = True
+                        last_beat = time.monotonic()
+                session.commit()
+                finish_batch(session, stage, token, handled, failed, retry_after)
+    finally:
+        session.close()
+    return processed